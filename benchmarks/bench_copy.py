@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.12"
+# dependencies = ["pyyaml"]
+# ///
+"""Benchmark copy_bios_rom_files.py against a synthetic ROM library.
+
+Builds a library shaped like source_config.yaml (many tiny cartridge ROMs,
+mid-size disc images, a few very large images), then copies it to a fresh
+local destination for every frontend and copy mode, followed by a second,
+no-change run into the same destination. Every run is offline: the source is
+either read as a local path or through benchmarks/fake_ssh, a loopback
+stand-in for ssh.
+
+Each run records wall time, bytes copied (from the script's --report JSON) and,
+when strace is installed, the number of system calls made by the script and
+all of its rsync processes.
+
+    ./benchmarks/bench_copy.py --frontends onion batocera --modes per-system batch
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import TypedDict
+
+import yaml
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+SCRIPT = REPO_DIR / "copy_bios_rom_files.py"
+FAKE_SSH_DIR = Path(__file__).resolve().parent
+
+sys.path.insert(0, str(REPO_DIR))
+
+from copy_bios_rom_files import (  # noqa: E402
+    Batocera,
+    EsDe,
+    FrontendFactory,
+    SourceConfig,
+    System,
+)
+
+# Extra command line options for each copy mode.
+COPY_MODES: dict[str, list[str]] = {
+    "per-system": [],
+    "rsync": ["--use-rsync"],
+    "jobs-4": ["--jobs", "4"],
+    "batch": ["--batch"],
+    "verify-bios": ["--verify-bios"],
+}
+
+# (file count, minimum size, maximum size) per system at scale 1.
+_TINY = (400, 16 * 1024, 1024 * 1024)
+_MID = (40, 50 * 1024 * 1024, 700 * 1024 * 1024)
+_HUGE = (4, 1024 * 1024 * 1024, 8 * 1024 * 1024 * 1024)
+
+SYSTEM_PROFILES: dict[System, tuple[int, int, int]] = {
+    System.NEC_TURBOGRAFX_CD: _MID,
+    System.NINTENDO_3DS: _HUGE,
+    System.NINTENDO_64: (60, 8 * 1024 * 1024, 64 * 1024 * 1024),
+    System.NINTENDO_DS: (60, 8 * 1024 * 1024, 256 * 1024 * 1024),
+    System.NINTENDO_GAMECUBE: _HUGE,
+    System.NINTENDO_SWITCH: _HUGE,
+    System.NINTENDO_WII: _HUGE,
+    System.NINTENDO_WIIU: _HUGE,
+    System.SEGA_CD: _MID,
+    System.SEGA_DREAMCAST: _MID,
+    System.SEGA_SATURN: _MID,
+    System.SNK_NEO_GEO_CD: _MID,
+    System.SONY_PLAYSTATION: _MID,
+    System.SONY_PLAYSTATION_2: _HUGE,
+    System.SONY_PLAYSTATION_3: _HUGE,
+    System.SONY_PLAYSTATION_PORTABLE: _MID,
+    System.SONY_PLAYSTATION_VITA: _HUGE,
+}
+
+_BIOS_FILES_PER_SYSTEM = 3
+_MEDIA_TYPES = {"batocera": ["images", "videos"], "esde": ["covers", "screenshots", "videos"]}
+
+
+class SyntheticLibrary:
+    """Deterministic library tree with the layout of a source configuration."""
+
+    def __init__(self, root: Path, source_config: SourceConfig, scale: float, count_scale: float):
+        self._root = root
+        self._source_config = source_config
+        self._scale = scale
+        self._count_scale = count_scale
+        self._random = random.Random(0)
+        self._block = self._random.randbytes(1024 * 1024)
+
+    def build(self) -> Path:
+        """Create the library and return the path of its source configuration file."""
+        bios_dir = self._root / "bios"
+        roms_dir = self._root / "roms"
+        batocera_dir = self._root / "artwork" / "batocera"
+        esde_dir = self._root / "artwork" / "esde"
+
+        for system, subdir in self._source_config.bios_subdirs.items():
+            for index in range(_BIOS_FILES_PER_SYSTEM):
+                size = self._random.randint(256, 512 * 1024)
+                self._write(bios_dir / subdir / f"{system.value}_{index}.bin", size)
+
+        for system, subdir in self._source_config.roms_subdirs.items():
+            count, minimum, maximum = SYSTEM_PROFILES.get(system, _TINY)
+            names = [f"{system.value} game {index:04d}" for index in range(self._count(count))]
+            for name in names:
+                size = int(self._random.randint(minimum, maximum) * self._scale)
+                self._write(roms_dir / subdir / f"{name}.bin", max(size, 1))
+
+            for artwork_dir, subdirs, kind in (
+                (batocera_dir, Batocera.ROMS_SUBDIRS, "batocera"),
+                (esde_dir, EsDe.ROMS_SUBDIRS, "esde"),
+            ):
+                if system not in subdirs:
+                    continue
+                for media_type in _MEDIA_TYPES[kind]:
+                    for name in names:
+                        size = self._random.randint(20 * 1024, 400 * 1024)
+                        self._write(artwork_dir / subdirs[system] / media_type / f"{name}.png", size)
+
+        config_path = self._root / "source_config.yaml"
+        config = {
+            "source_bios_dir": str(bios_dir),
+            "source_roms_dir": str(roms_dir),
+            "source_batocera_artwork_dir": str(batocera_dir),
+            "source_esde_artwork_dir": str(esde_dir),
+            "remote_hostname": "localhost",
+            "bios_subdirs": {k.value: v for k, v in self._source_config.bios_subdirs.items()},
+            "roms_subdirs": {k.value: v for k, v in self._source_config.roms_subdirs.items()},
+        }
+        with open(config_path, "w") as f:
+            yaml.safe_dump(config, f, allow_unicode=True)
+        return config_path
+
+    def _count(self, count: int) -> int:
+        return max(1, round(count * self._count_scale))
+
+    def _write(self, path: Path, size: int) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            remaining = size
+            offset = self._random.randrange(len(self._block))
+            while remaining > 0:
+                chunk = self._block[offset:offset + remaining]
+                f.write(chunk)
+                remaining -= len(chunk)
+                offset = 0
+
+
+class Measurement(TypedDict):
+    """One run of the script against a destination."""
+
+    frontend: str
+    mode: str
+    phase: str
+    exit_code: int
+    wall_seconds: float
+    files_transferred: int
+    bytes_transferred: int
+    rsync_runs: int
+    syscalls: int | None
+    stderr: str
+
+
+class BenchmarkRunner:
+    """Runs copy_bios_rom_files.py for each frontend and mode and collects measurements."""
+
+    def __init__(self, config_path: Path, work_dir: Path, level: str, source: str):
+        self._config_path = config_path
+        self._work_dir = work_dir
+        self._level = level
+        self._source = source
+        self._strace = shutil.which("strace")
+
+    def run(self, frontend: str, mode: str) -> list[Measurement]:
+        """Copy to a fresh destination, then again with no changes, and return both results."""
+        destination = self._work_dir / "destinations" / f"{frontend}-{mode}"
+        shutil.rmtree(destination, ignore_errors=True)
+        destination.mkdir(parents=True)
+
+        results = []
+        for phase in ("initial", "no-change"):
+            results.append(self._measure(frontend, mode, phase, destination))
+        shutil.rmtree(destination, ignore_errors=True)
+        return results
+
+    def _measure(self, frontend: str, mode: str, phase: str, destination: Path) -> Measurement:
+        report_path = self._work_dir / "report.json"
+        strace_path = self._work_dir / "strace.txt"
+        report_path.unlink(missing_ok=True)
+
+        command = [
+            sys.executable,
+            str(SCRIPT),
+            frontend,
+            str(destination),
+            self._level,
+            "--config",
+            str(self._config_path),
+            "--report",
+            str(report_path),
+            *COPY_MODES[mode],
+        ]
+        if self._source == "local":
+            command.append("--local-source")
+        if self._strace:
+            command = [self._strace, "-f", "-c", "-o", str(strace_path), *command]
+
+        env = dict(os.environ)
+        if self._source == "ssh":
+            shutil.copy(FAKE_SSH_DIR / "fake_ssh", self._work_dir / "ssh")
+            (self._work_dir / "ssh").chmod(0o755)
+            env["PATH"] = f"{self._work_dir}{os.pathsep}{env['PATH']}"
+
+        start = time.monotonic()
+        result = subprocess.run(
+            command, check=False, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+        elapsed = time.monotonic() - start
+
+        stages: dict[str, dict[str, float]] = {}
+        if report_path.exists():
+            stages = json.loads(report_path.read_text())["stages"]
+
+        return Measurement(
+            frontend=frontend,
+            mode=mode,
+            phase=phase,
+            exit_code=result.returncode,
+            wall_seconds=round(elapsed, 3),
+            files_transferred=sum(int(s["files_transferred"]) for s in stages.values()),
+            bytes_transferred=sum(int(s["bytes_transferred"]) for s in stages.values()),
+            rsync_runs=sum(int(s["transfers"]) for s in stages.values()),
+            syscalls=self._syscalls(strace_path) if self._strace else None,
+            stderr=result.stderr[-2000:] if result.returncode else "",
+        )
+
+    @staticmethod
+    def _syscalls(path: Path) -> int | None:
+        """Read the total call count from strace -c output."""
+        if not path.exists():
+            return None
+        lines = path.read_text().splitlines()
+        header = next((line for line in lines if "calls" in line and "syscall" in line), None)
+        total = next((line for line in reversed(lines) if line.rstrip().endswith("total")), None)
+        if not header or not total:
+            return None
+        # Columns are right-aligned under their headings.
+        end = header.index("calls") + len("calls")
+        field = total[:end].split()
+        return int(field[-1]) if field and field[-1].isdigit() else None
+
+
+def main() -> int:
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark copy modes against a synthetic library.")
+    parser.add_argument(
+        "--frontends",
+        nargs="+",
+        default=FrontendFactory.available_frontends(),
+        choices=FrontendFactory.available_frontends(),
+        help="Frontends to copy to (default: all)",
+    )
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        default=list(COPY_MODES),
+        choices=list(COPY_MODES),
+        help="Copy modes to run (default: all)",
+    )
+    parser.add_argument("--level", default="5", help="ROM pack level to copy (default: 5)")
+    parser.add_argument(
+        "--source",
+        choices=["local", "ssh"],
+        default="local",
+        help="Read the library as a local path or through the loopback ssh stand-in",
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=0.001,
+        help="Multiplier for file sizes; 1 builds full-size images (default: 0.001)",
+    )
+    parser.add_argument(
+        "--count-scale",
+        type=float,
+        default=0.1,
+        help="Multiplier for the number of files per system (default: 0.1)",
+    )
+    parser.add_argument("--work-dir", default=None, help="Directory for the library and destinations")
+    parser.add_argument("--output", default=None, help="Write all measurements to this JSON file")
+    args = parser.parse_args()
+
+    if not shutil.which("rsync"):
+        print("rsync is required to run the benchmarks.")
+        return 1
+
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="retro-bench-"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    source_config = SourceConfig.from_yaml(REPO_DIR / "source_config.yaml")
+
+    print(f"Building synthetic library in {work_dir / 'library'}...")
+    library = SyntheticLibrary(work_dir / "library", source_config, args.scale, args.count_scale)
+    config_path = library.build()
+
+    runner = BenchmarkRunner(config_path, work_dir, args.level, args.source)
+    measurements: list[Measurement] = []
+    header = f"{'Frontend':<10} {'Mode':<12} {'Phase':<10} {'Seconds':>8} {'Files':>7} {'MB':>9} {'rsyncs':>7} {'Syscalls':>10}"
+    print(header)
+    print("-" * len(header))
+    for frontend in args.frontends:
+        for mode in args.modes:
+            for m in runner.run(frontend, mode):
+                measurements.append(m)
+                syscalls = m["syscalls"] if m["syscalls"] is not None else "-"
+                status = "" if m["exit_code"] == 0 else f"  (exit {m['exit_code']})"
+                print(
+                    f"{frontend:<10} {mode:<12} {m['phase']:<10} {m['wall_seconds']:>8.2f} "
+                    f"{m['files_transferred']:>7} {m['bytes_transferred'] / 1_000_000:>9.1f} "
+                    f"{m['rsync_runs']:>7} {syscalls:>10}{status}"
+                )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {"scale": args.scale, "count_scale": args.count_scale, "source": args.source,
+                 "level": args.level, "measurements": measurements},
+                f,
+                indent=2,
+            )
+            f.write("\n")
+
+    return 0 if all(m["exit_code"] == 0 for m in measurements) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
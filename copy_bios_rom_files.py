@@ -6,14 +6,51 @@
 """Copy BIOS and ROM files to various emulation frontends and operating systems."""
 
 import argparse
+import asyncio
+import atexit
+import contextlib
+import contextvars
+import ctypes
+import ctypes.util
+import errno
+import fcntl
+import functools
+import hashlib
+import json
+import mmap
+import os
+import re
+import select
+import shlex
+import shutil
+import sqlite3
+import stat
+import struct
 import subprocess
 import sys
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
 from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import Awaitable, Callable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from enum import Enum
 from pathlib import Path, PurePosixPath
+from typing import TypeVar
 
 import yaml
 
+try:
+    from PIL import Image
+
+    PIL_AVAILABLE = True
+except ImportError:  # Pillow is optional; scraped media is copied unchanged without it.
+    PIL_AVAILABLE = False
+
 
 class System(Enum):
     """Gaming system identifiers."""
@@ -70,6 +107,20 @@ class System(Enum):
     SONY_PLAYSTATION = "sony_playstation"
 
 
+# Serializes buffered transfer output across every copier running in the process.
+_OUTPUT_LOCK = threading.Lock()
+
+T = TypeVar("T")
+
+
+def remote_host(path: str) -> str | None:
+    """Return the host of an rsync-style `host:path`, or None for a local path."""
+    host, separator, _ = path.partition(":")
+    if not separator or "/" in host:
+        return None
+    return host
+
+
 class SourceConfig:
     """Source directory configuration."""
 
@@ -111,6 +162,20 @@ class SourceConfig:
             roms_subdirs=roms_subdirs,
         )
 
+    def mirror(self, root: str | Path) -> "SourceConfig":
+        """Return a local configuration with the same subdirectories under a mirror root."""
+        base = PurePosixPath(root)
+        return SourceConfig(
+            source_bios_dir=str(base / "bios"),
+            source_roms_dir=str(base / "roms"),
+            source_batocera_artwork_dir=str(base / "artwork" / "batocera"),
+            source_esde_artwork_dir=str(base / "artwork" / "esde"),
+            remote_hostname=self.remote_hostname,
+            remote_source=False,
+            bios_subdirs=self.bios_subdirs,
+            roms_subdirs=self.roms_subdirs,
+        )
+
     def _prefix(self, path: str) -> str:
         if self._remote_source:
             return f"{self.remote_hostname}:{path}"
@@ -137,6 +202,23 @@ class SourceConfig:
         return self._prefix(self.source_esde_artwork_dir)
 
 
+class MediaProfile:
+    """Largest size and JPEG/WebP quality scraped images are converted to for a screen."""
+
+    def __init__(self, width: int, height: int, quality: int = 85):
+        self.width = width
+        self.height = height
+        self.quality = quality
+
+    @classmethod
+    def parse(cls, size: str) -> "MediaProfile":
+        """Parse a WIDTHxHEIGHT size such as 640x480."""
+        width, separator, height = size.lower().partition("x")
+        if not separator or not width.isdigit() or not height.isdigit():
+            raise ValueError(f"{size} is not a WIDTHxHEIGHT size.")
+        return cls(int(width), int(height))
+
+
 class Frontend(ABC):
     """Abstract base class for emulation frontends."""
 
@@ -148,6 +230,11 @@ class Frontend(ABC):
     def name(self) -> str:
         """Return the frontend name."""
 
+    @property
+    def destination_dir(self) -> str:
+        """Return the destination root directory."""
+        return self._destination_dir
+
     @abstractmethod
     def bios_directory(self, system: System) -> str | None:
         """Return the BIOS directory for a system."""
@@ -164,6 +251,11 @@ class Frontend(ABC):
     def destination_scraped_media_dir(self, system: System) -> str | None:
         """Return the destination scraped media directory for a system, or None if unsupported."""
 
+    @property
+    def media_profile(self) -> MediaProfile | None:
+        """Return what scraped images are resized to, or None to copy them unchanged."""
+        return None
+
     @property
     def supported_systems(self) -> list[System]:
         """Return list of supported systems."""
@@ -250,7 +342,7 @@ class Batocera(Frontend):
         subdir = self.ROMS_SUBDIRS.get(system)
         if not subdir:
             return None
-        return str(PurePosixPath(source_config.source_batocera_artwork_dir) / subdir)
+        return str(PurePosixPath(source_config.batocera_artwork_dir) / subdir)
 
     def destination_scraped_media_dir(self, system: System) -> str | None:
         subdir = self.ROMS_SUBDIRS.get(system)
@@ -270,6 +362,11 @@ class Knulli(Batocera):
     def name(self) -> str:
         return "Knulli"
 
+    @property
+    def media_profile(self) -> MediaProfile | None:
+        # Knulli runs on 640x480 handhelds.
+        return MediaProfile(640, 480, 80)
+
 
 class EmuDeck(Frontend):
     """EmuDeck frontend (https://emudeck.github.io)."""
@@ -786,271 +883,5343 @@ class Spruce(Frontend):
         return self.ROMS_SUBDIRS
 
 
-class FileCopier:
-    """Service for copying BIOS and ROM files to a frontend."""
+class SshConnectionPool:
+    """Shares one multiplexed SSH master connection per host for a whole run.
 
-    def __init__(
-        self,
-        frontend: Frontend,
-        source_config: SourceConfig,
-        dry_run: bool = False,
-    ):
-        self._frontend = frontend
-        self._source_config = source_config
-        self._dry_run = dry_run
+    The first remote command for a host starts a background ControlMaster
+    connection; every later ssh and rsync call for that host is routed through
+    it, so the handshake and authentication only happen once.
+    """
 
-    def copy_bios_files(self, systems: list[System]) -> None:
-        """Copy BIOS files for the given systems."""
-        for system in systems:
-            source_subdir = self._source_config.bios_subdirs.get(system)
-            if not source_subdir:
+    def __init__(self, dry_run: bool = False):
+        self._dry_run = dry_run
+        self._control_dir: str | None = None
+        self._masters: dict[str, str | None] = {}
+        self._sessions: dict[str, int] = {}
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def __enter__(self) -> "SshConnectionPool":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def ssh_command(self, host: str) -> list[str]:
+        """Return an ssh command prefix that reuses the master connection for a host."""
+        with self._lock:
+            if host not in self._masters:
+                self._masters[host] = self._start_master(host)
+            self._sessions[host] = self._sessions.get(host, 0) + 1
+            control_path = self._masters[host]
+
+        if control_path is None:
+            return ["ssh"]
+        return ["ssh", "-o", f"ControlPath={control_path}"]
+
+    def rsync_options(self, source: str, destination: str) -> list[str]:
+        """Return rsync options that route a remote transfer through the pool."""
+        host = remote_host(source) or remote_host(destination)
+        if not host:
+            return []
+        return ["-e", shlex.join(self.ssh_command(host))]
+
+    def close(self) -> None:
+        """Stop all master connections and report the handshakes saved."""
+        with self._lock:
+            masters, self._masters = self._masters, {}
+            sessions, self._sessions = self._sessions, {}
+
+        for host, control_path in masters.items():
+            if control_path is None:
                 continue
+            subprocess.run(
+                ["ssh", "-o", f"ControlPath={control_path}", "-O", "exit", host],
+                check=False,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            count = sessions.get(host, 0)
+            print(
+                f"SSH: {count} sessions to {host} shared 1 connection "
+                f"({count - 1} handshakes saved)."
+            )
+
+        if self._control_dir:
+            shutil.rmtree(self._control_dir, ignore_errors=True)
+            self._control_dir = None
+
+    def _start_master(self, host: str) -> str | None:
+        """Start a background master connection, returning its control path or None on failure."""
+        if self._dry_run:
+            return None
 
-            destination_dir = self._frontend.bios_directory(system)
-            if not destination_dir:
-                continue
+        if not self._control_dir:
+            # Unix socket paths are limited to ~104 bytes, so keep this short.
+            self._control_dir = tempfile.mkdtemp(prefix="rssh-", dir="/tmp")
+        control_path = str(Path(self._control_dir) / "%C")
+
+        result = subprocess.run(
+            [
+                "ssh",
+                "-M",
+                "-N",
+                "-f",
+                "-o", f"ControlPath={control_path}",
+                "-o", "ControlPersist=yes",
+                host,
+            ],
+            check=False,
+        )
+        if result.returncode != 0:
+            print(f"Could not open a shared SSH connection to {host}; using separate connections.")
+            return None
+        return control_path
 
-            source_path = str(PurePosixPath(self._source_config.bios_dir) / source_subdir) + "/"
-            destination_path = destination_dir + "/"
 
-            self._rsync(source_path, destination_path)
+class CommandResult:
+    """Exit code and output of a finished command."""
 
-    def copy_rom_files(
-        self, systems: list[System], copy_source_directory: bool = False
-    ) -> None:
-        """Copy ROM files for the given systems."""
-        for system in systems:
-            source_subdir = self._source_config.roms_subdirs.get(system)
+    def __init__(self, returncode: int, output: str):
+        self.returncode = returncode
+        self.output = output
 
-            if not source_subdir:
-                print(f"No source ROMS for {system.value}.")
-                continue
 
-            destination_dir = self._frontend.roms_directory(system)
+class CommandRunner:
+    """Runs external commands as asyncio subprocesses under concurrency limits.
 
-            if not destination_dir:
-                print(
-                    f"No destination directory for {system.value} on {self._frontend.name}."
-                )
-                continue
+    At most `jobs` commands run at once, at most `per_host` against any one
+    remote host and at most `per_device` writing to any one destination
+    device (a local filesystem or a remote host); None means no limit beyond
+    `jobs`. Each call to `run_all` drives one batch of tasks to completion
+    and returns their results in order. If the batch is interrupted, every
+    running child is terminated (and killed if it does not exit) and reaped
+    before the interrupt propagates, so no rsync keeps writing to a card
+    after Ctrl-C.
+    """
 
-            source_path = str(PurePosixPath(self._source_config.roms_dir) / source_subdir)
-            if not copy_source_directory:
-                source_path += "/"
-            destination_path = destination_dir
+    _OUTPUT_TAIL = 65536
+    _TERMINATE_TIMEOUT = 5
 
-            self._rsync(source_path, destination_path)
+    # Semaphores belong to an event loop, so each batch gets its own set,
+    # visible to the batch's tasks only.
+    _limits: contextvars.ContextVar[dict[str, asyncio.Semaphore]] = contextvars.ContextVar("limits")
 
-    def copy_scraped_media_files(self, systems: list[System]) -> None:
-        """Copy scraped media files for the given systems."""
-        for system in systems:
-            source_dir = self._frontend.source_scraped_media_dir(system, self._source_config)
-            if not source_dir:
-                continue
+    def __init__(self, jobs: int = 1, per_host: int | None = None, per_device: int | None = None):
+        self._jobs = max(1, jobs)
+        self._per_host = per_host
+        self._per_device = per_device
 
-            destination_dir = self._frontend.destination_scraped_media_dir(system)
-            if not destination_dir:
-                continue
+    def run_all(self, tasks: list[Callable[[], Awaitable[T]]]) -> list[T]:
+        """Run the task factories concurrently and return their results in order."""
 
-            source_path = source_dir + "/"
-            destination_path = destination_dir + "/"
+        async def main() -> list[T]:
+            self._limits.set({"jobs": asyncio.Semaphore(self._jobs)})
+            return await asyncio.gather(*(task() for task in tasks))
 
-            self._rsync(source_path, destination_path)
+        return asyncio.run(main())
 
-    def _rsync(self, source: str, destination: str) -> None:
-        """Execute rsync command."""
-        print(f'rsync -avP --size-only "{source}" "{destination}"')
+    async def run(
+        self,
+        command: list[str],
+        hosts: list[str] | None = None,
+        device: str | None = None,
+        stream: bool = False,
+        input: bytes | None = None,
+        on_start: Callable[[], Awaitable[None]] | None = None,
+    ) -> CommandResult:
+        """Run a command once its limits allow and return its exit code and output.
+
+        With `stream` the output goes to the terminal as it arrives and only
+        its last 64 KiB is returned. `on_start` is awaited once the command has
+        its slots, right before it is started. Input is written while the
+        output is read, so a command that answers before it has read all of
+        it cannot stall on a full pipe.
+        """
+        async with self._slots(hosts, device):
+            if on_start:
+                await on_start()
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+            )
+            try:
+                if input is None:
+                    output = await self._read_output(process, stream)
+                else:
+                    assert process.stdin
+                    output, _ = await asyncio.gather(
+                        self._read_output(process, stream), self._feed(process.stdin, input)
+                    )
+                return CommandResult(await process.wait(), output)
+            except asyncio.CancelledError:
+                await self._terminate(process)
+                raise
+
+    async def run_pipeline(
+        self,
+        producer: list[str],
+        consumer: list[str],
+        hosts: list[str] | None = None,
+        device: str | None = None,
+        stream: bool = False,
+        input: bytes | None = None,
+        on_start: Callable[[], Awaitable[None]] | None = None,
+    ) -> CommandResult:
+        """Run two commands with the first one's output piped into the second.
+
+        Output and `input`, which goes to the producer, are handled as with
+        `run`; the producer's error messages come first. The exit code is the
+        consumer's if it failed, since the producer then only dies of a broken
+        pipe, and the producer's otherwise.
+        """
+        async with self._slots(hosts, device):
+            if on_start:
+                await on_start()
+            read_end, write_end = os.pipe()
+            processes: list[asyncio.subprocess.Process] = []
+            try:
+                processes.append(await asyncio.create_subprocess_exec(
+                    *producer,
+                    stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                    stdout=write_end,
+                    stderr=subprocess.PIPE,
+                ))
+                processes.append(await asyncio.create_subprocess_exec(
+                    *consumer, stdin=read_end, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+                ))
+            except BaseException:
+                for process in processes:
+                    await self._terminate(process)
+                raise
+            finally:
+                os.close(read_end)
+                os.close(write_end)
+
+            producer_process, consumer_process = processes
+            try:
+                assert producer_process.stderr
+                feed = (
+                    self._feed(producer_process.stdin, input)
+                    if producer_process.stdin and input is not None
+                    else asyncio.sleep(0)
+                )
+                errors, output, _ = await asyncio.gather(
+                    producer_process.stderr.read(),
+                    self._read_output(consumer_process, stream),
+                    feed,
+                )
+                producer_code = await producer_process.wait()
+                consumer_code = await consumer_process.wait()
+            except asyncio.CancelledError:
+                for process in processes:
+                    await self._terminate(process)
+                raise
+            return CommandResult(
+                consumer_code or producer_code, errors.decode(errors="replace") + output
+            )
+
+    async def call(
+        self,
+        function: Callable[[], T],
+        hosts: list[str] | None = None,
+        device: str | None = None,
+        on_start: Callable[[], Awaitable[None]] | None = None,
+    ) -> T:
+        """Run a blocking function on a worker thread once its limits allow; return its result."""
+        async with self._slots(hosts, device):
+            if on_start:
+                await on_start()
+            return await asyncio.to_thread(function)
 
-        if self._dry_run:
-            return
+    @staticmethod
+    def device_of(path: str) -> str:
+        """Return a key identifying the device a local or `host:path` destination lives on."""
+        host = remote_host(path)
+        if host:
+            return host
+        current = Path(path)
+        while not current.exists() and current != current.parent:
+            current = current.parent
+        return str(current.stat().st_dev)
+
+    @contextlib.asynccontextmanager
+    async def _slots(self, hosts: list[str] | None, device: str | None):
+        limits = []
+        if device and self._per_device:
+            limits.append(self._limit(f"device:{device}", self._per_device))
+        for host in sorted(set(hosts or [])):
+            if self._per_host:
+                limits.append(self._limit(f"host:{host}", self._per_host))
+        # Take the global slot last so jobs waiting for a busy device do not hold one.
+        limits.append(self._limits.get()["jobs"])
+
+        async with contextlib.AsyncExitStack() as stack:
+            for limit in limits:
+                await stack.enter_async_context(limit)
+            yield
+
+    def _limit(self, key: str, value: int) -> asyncio.Semaphore:
+        limits = self._limits.get()
+        if key not in limits:
+            limits[key] = asyncio.Semaphore(value)
+        return limits[key]
 
-        subprocess.run(
-            ["rsync", "-avP", "--size-only", "--exclude=.DS_Store", source, destination], check=False
+    @staticmethod
+    async def _feed(stdin: asyncio.StreamWriter, data: bytes) -> None:
+        """Write a command's input and close its stdin; a command may exit before reading it all."""
+        try:
+            stdin.write(data)
+            await stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            stdin.close()
+
+    async def _read_output(self, process: asyncio.subprocess.Process, stream: bool) -> str:
+        assert process.stdout
+        output = bytearray()
+        while chunk := await process.stdout.read(65536):
+            output += chunk
+            if stream:
+                sys.stdout.buffer.write(chunk)
+                sys.stdout.buffer.flush()
+                # --stats is printed last, so the tail is all that needs keeping.
+                del output[:-self._OUTPUT_TAIL]
+        return output.decode(errors="replace")
+
+    async def _terminate(self, process: asyncio.subprocess.Process) -> None:
+        if process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), self._TERMINATE_TIMEOUT)
+        except TimeoutError:
+            process.kill()
+            await process.wait()
+
+
+class DirectoryListing:
+    """Directories and regular files under one root, as listed by the manifest agent.
+
+    Paths are absolute. Directories map to their mtime, files to their size,
+    mtime and MD5, or None if it was not requested. Directories in
+    `unlisted` matched a known mtime, so their files were left out. If
+    requested, `locations` maps files to a sort key for where their data
+    starts on disk.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.directories: dict[str, float] = {}
+        self.files: dict[str, tuple[int, float, str | None]] = {}
+        self.unlisted: set[str] = set()
+        self.locations: dict[str, tuple[int, int]] = {}
+
+
+class ManifestAgent:
+    """Lists source directories on a remote host in one round trip.
+
+    manifest_agent.py, next to this script, is piped to python3 on the host.
+    It walks every root in one pass with os.scandir and streams back
+    length-prefixed records of paths, sizes, mtimes and, optionally, MD5s.
+    The library manifest, media selection and verification read the same
+    kind of listing instead of each running find over ssh. Without a host
+    the agent runs as a local subprocess in place of the ssh hop. Given the
+    directory mtimes already known, the agent skips the files of
+    directories that did not change.
+    """
+
+    SCRIPT = Path(__file__).parent / "manifest_agent.py"
+    _RECORD = struct.Struct(">cHqqB")
+    # Reads the script from stdin and leaves the rest of stdin to it.
+    _LOADER = "import sys; exec(sys.stdin.buffer.read(int(sys.stdin.buffer.readline())))"
+
+    def __init__(self, ssh_pool: SshConnectionPool | None = None):
+        self._ssh_pool = ssh_pool
+
+    def scan(
+        self,
+        host: str | None,
+        roots: list[str],
+        hashes: bool = False,
+        jobs: int = 4,
+        known: dict[str, float] | None = None,
+        locations: bool = False,
+    ) -> dict[str, DirectoryListing] | None:
+        """Return the listing of each root that exists, or None if the agent did not finish.
+
+        Directories whose mtime matches `known` come back in `unlisted`, with no files.
+        """
+        arguments = ["--jobs", str(jobs), *(["--hash"] if hashes else [])]
+        if locations:
+            arguments.append("--locate")
+        if known is not None:
+            arguments.append("--known")
+        arguments += ["--", *roots]
+        if host:
+            ssh = self._ssh_pool.ssh_command(host) if self._ssh_pool else ["ssh"]
+            command = [*ssh, host, shlex.join(["python3", "-c", self._LOADER, *arguments])]
+        else:
+            command = [sys.executable, "-c", self._LOADER, *arguments]
+
+        script = self.SCRIPT.read_bytes()
+        payload = [f"{len(script)}\n".encode(), script]
+        if known is not None:
+            for path, mtime in known.items():
+                encoded = os.fsencode(path)
+                payload.append(self._RECORD.pack(b"D", len(encoded), 0, round(mtime * 1e9), 0))
+                payload.append(encoded)
+            payload.append(self._RECORD.pack(b"E", 0, 0, 0, 0))
+        result = subprocess.run(
+            command,
+            check=False,
+            input=b"".join(payload),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
         )
+        return self._parse(result.stdout)
 
+    @classmethod
+    def _parse(cls, data: bytes) -> dict[str, DirectoryListing] | None:
+        """Decode the agent's records; None if the end record is missing."""
+        listings: dict[str, DirectoryListing] = {}
+        current: DirectoryListing | None = None
+        last_file = ""
+        offset = 0
+        while offset + cls._RECORD.size <= len(data):
+            kind, length, size, mtime_ns, digest_length = cls._RECORD.unpack_from(data, offset)
+            offset += cls._RECORD.size
+            path = data[offset:offset + length].decode(errors="surrogateescape")
+            offset += length
+            digest = data[offset:offset + digest_length].hex() or None
+            offset += digest_length
+
+            if kind == b"E":
+                return listings
+            if kind == b"R":
+                current = listings[path] = DirectoryListing(path)
+            elif current is None:
+                return None
+            elif kind == b"D":
+                current.directories[path] = mtime_ns / 1e9
+            elif kind == b"U":
+                current.directories[path] = mtime_ns / 1e9
+                current.unlisted.add(path)
+            elif kind == b"F":
+                current.files[path] = (size, mtime_ns / 1e9, digest)
+                last_file = path
+            elif kind == b"L":
+                # The sort key of the file in the record before.
+                current.locations[last_file] = (size, mtime_ns)
+        return None
 
-class RomSizeDisplay:
-    """Utility for displaying ROM directory sizes."""
+
+class LibraryManifest:
+    """SQLite index of the source library, refreshed incrementally.
+
+    Directories are only re-listed when their mtime changed since the last
+    scan, which catches files being added, removed or renamed. A file that is
+    rewritten in place leaves its directory mtime alone, so pass `rescan=True`
+    after editing files directly. The index also remembers which sources were
+    last synced to which destination, so unchanged systems can be skipped
+    without starting rsync. Remote roots are listed by the manifest agent,
+    one run per host, which is sent the known directory mtimes and only
+    lists the files of changed directories. Hosts without python3 are
+    listed with find instead.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS directories (
+            path TEXT PRIMARY KEY,
+            mtime REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            directory TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime REAL NOT NULL,
+            hash TEXT
+        );
+        CREATE INDEX IF NOT EXISTS files_directory ON files (directory);
+        CREATE TABLE IF NOT EXISTS synced (
+            destination TEXT NOT NULL,
+            source TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            synced_at REAL NOT NULL,
+            PRIMARY KEY (destination, source)
+        );
+    """
+
+    # Keep remote find command lines well below ARG_MAX.
+    _REMOTE_BATCH_SIZE = 500
+
+    def __init__(
+        self,
+        path: str | Path,
+        ssh_pool: SshConnectionPool | None = None,
+        hash_files: bool = False,
+        rescan: bool = False,
+    ):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.executescript(self._SCHEMA)
+        self._ssh_pool = ssh_pool
+        self._hash_files = hash_files
+        self._rescan = rescan
+        self._agent = ManifestAgent(ssh_pool)
 
     @staticmethod
-    def display(systems: list[System], source_config: SourceConfig) -> None:
-        """Display sizes of source ROM directories."""
-        sorted_systems = sorted(systems, key=lambda s: s.value)
-        rom_directories: list[str] = []
+    def default_path() -> Path:
+        """Return the default manifest location in the user's cache directory."""
+        cache_dir = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+        return Path(cache_dir) / "retro-emulation-scripts" / "manifest.sqlite3"
+
+    def close(self) -> None:
+        """Close the database."""
+        self._db.close()
+
+    def refresh(self, sources: list[str], jobs: int = 1) -> None:
+        """Bring the index up to date for the given directories.
+
+        Sources may be local paths or rsync-style `host:path` locations. Up to
+        `jobs` directories are listed at the same time.
+        """
+        roots: list[tuple[str | None, str]] = []
+        for source in sources:
+            host = remote_host(source)
+            path = source.partition(":")[2] if host else source
+            root = (host, path.rstrip("/") or "/")
+            if root not in roots:
+                roots.append(root)
+
+        # SQLite is only touched from this thread; workers just list files.
+        known = [self._known_directories(host, root) for host, root in roots]
+
+        remote_known: dict[str, dict[str, float]] = {}
+        for (host, _), directories in zip(roots, known):
+            if host:
+                remote_known.setdefault(host, {}).update(
+                    (path[len(host) + 1:], mtime) for path, mtime in directories.items()
+                )
+        listings: dict[str, dict[str, DirectoryListing] | None] = {}
+        for host, host_known in remote_known.items():
+            host_roots = [root for root_host, root in roots if root_host == host]
+            # Without an agent listing, _scan_root falls back to find.
+            listings[host] = self._agent.scan(
+                host, host_roots, known=None if self._rescan else host_known
+            )
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            scans = [
+                executor.submit(
+                    self._scan_root, host, path, directories, listings.get(host) if host else None
+                )
+                for (host, path), directories in zip(roots, known)
+            ]
+            for (host, path), scan in zip(roots, scans):
+                try:
+                    self._apply_scan(host, *scan.result())
+                except OSError as error:
+                    # A partial listing would drop the missing entries from the index.
+                    prefix = f"{host}:" if host else ""
+                    print(f"Not refreshing the manifest for {prefix}{path}: {error}")
+
+    def total_size(self, source: str) -> int:
+        """Return the total size in bytes of the indexed files under a directory."""
+        root = source.rstrip("/")
+        row = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM files WHERE path > ? AND path < ?",
+            (root + "/", root + "0"),
+        ).fetchone()
+        return int(row[0])
+
+    def fingerprint(self, source: str) -> str | None:
+        """Return a digest of every file under a source directory, or None if it is not indexed."""
+        root = source.rstrip("/")
+        if not self._db.execute("SELECT 1 FROM directories WHERE path = ?", (root,)).fetchone():
+            return None
 
-        for system in sorted_systems:
-            source_subdir = source_config.roms_subdirs.get(system)
-            if not source_subdir:
-                continue
-            path = PurePosixPath(source_config.source_roms_dir) / source_subdir
-            rom_directories.append(f"'{path}/'")
+        digest = hashlib.sha1()
+        rows = self._db.execute(
+            "SELECT path, size, mtime FROM files WHERE path > ? AND path < ? ORDER BY path",
+            (root + "/", root + "0"),
+        )
+        for path, size, mtime in rows:
+            digest.update(f"{path}\0{size}\0{mtime}\n".encode())
+        return digest.hexdigest()
 
+    def files(self, source: str) -> dict[str, tuple[int, float, str | None]] | None:
+        """Return the indexed files under a source directory by relative path.
+
+        Returns None if the directory is not indexed.
+        """
+        root = source.rstrip("/")
+        if not self._db.execute("SELECT 1 FROM directories WHERE path = ?", (root,)).fetchone():
+            return None
+        rows = self._db.execute(
+            "SELECT path, size, mtime, hash FROM files WHERE path > ? AND path < ?",
+            (root + "/", root + "0"),
+        )
+        return {
+            path[len(root) + 1:]: (size, mtime, digest)
+            for path, size, mtime, digest in rows
+            if PurePosixPath(path).name != ".DS_Store"
+        }
+
+    def is_synced(self, source: str, destination: str, fingerprint: str) -> bool:
+        """Return True if the source was last synced to the destination with this fingerprint."""
+        row = self._db.execute(
+            "SELECT fingerprint FROM synced WHERE destination = ? AND source = ?",
+            (destination, source),
+        ).fetchone()
+        return row is not None and row[0] == fingerprint
+
+    def mark_synced(self, source: str, destination: str, fingerprint: str) -> None:
+        """Record a successful sync of the source to the destination."""
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO synced (destination, source, fingerprint, synced_at) "
+                "VALUES (?, ?, ?, ?)",
+                (destination, source, fingerprint, time.time()),
+            )
+
+    def _known_directories(self, host: str | None, root: str) -> dict[str, float]:
+        """Return the indexed mtime of every directory under a root."""
+        root = f"{host}:{root}" if host else root
+        rows = self._db.execute(
+            "SELECT path, mtime FROM directories WHERE path = ? OR (path > ? AND path < ?)",
+            (root, root + "/", root + "0"),
+        )
+        return dict(rows)
 
-        if not rom_directories:
+    def _scan_root(
+        self,
+        host: str | None,
+        root: str,
+        known: dict[str, float],
+        listings: dict[str, DirectoryListing] | None = None,
+    ) -> tuple[dict[str, float], list[str], list[str], list[tuple[str, int, float]]]:
+        """List a root's directories and re-list files in those whose mtime changed.
+
+        Returns the current directory mtimes, the changed and removed
+        directories and the files listed in the changed directories. A
+        remote root is read from its host's agent listing, or with find if
+        the agent could not run there. Raises OSError if find over ssh failed.
+        """
+        prefix = f"{host}:" if host else ""
+        listing = None
+        if host and listings is not None:
+            listing = listings.get(root) or DirectoryListing(root)
+            directories = listing.directories
+            unlisted = listing.unlisted
+        else:
+            directories = self._list_directories(host, [root])
+            unlisted = set()
+
+        current = {prefix + path: mtime for path, mtime in directories.items()}
+        changed = [
+            path
+            for path, mtime in current.items()
+            if path[len(prefix):] not in unlisted and (self._rescan or known.get(path) != mtime)
+        ]
+        removed = [path for path in known if path not in current]
+
+        if listing is not None:
+            changed_directories = {path[len(prefix):] for path in changed}
+            files = [
+                (path, size, mtime)
+                for path, (size, mtime, _) in listing.files.items()
+                if str(PurePosixPath(path).parent) in changed_directories
+            ]
+        else:
+            files = self._list_files(host, [path[len(prefix):] for path in changed])
+        listed = [(prefix + path, size, mtime) for path, size, mtime in files]
+        return current, changed, removed, listed
+
+    def _apply_scan(
+        self,
+        host: str | None,
+        current: dict[str, float],
+        changed: list[str],
+        removed: list[str],
+        listed: list[tuple[str, int, float]],
+    ) -> None:
+        """Replace the index entries of changed and removed directories."""
+        if not changed and not removed:
             return
 
-        directories_str = " ".join(rom_directories)
-        command = f"du --total --summarize --human-readable {directories_str}"
+        previous_hashes = {}
+        for directory in changed:
+            rows = self._db.execute(
+                "SELECT path, size, mtime, hash FROM files "
+                "WHERE directory = ? AND hash IS NOT NULL",
+                (directory,),
+            )
+            previous_hashes.update(
+                {(path, size, mtime): digest for path, size, mtime, digest in rows}
+            )
+
+        with self._db:
+            for directory in changed + removed:
+                self._db.execute("DELETE FROM files WHERE directory = ?", (directory,))
+            for directory in removed:
+                self._db.execute("DELETE FROM directories WHERE path = ?", (directory,))
+
+            for path, size, mtime in listed:
+                digest = previous_hashes.get((path, size, mtime))
+                if digest is None and self._hash_files and host is None:
+                    digest = self._hash_local_file(path)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO files (path, directory, size, mtime, hash) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (path, str(PurePosixPath(path).parent), size, mtime, digest),
+                )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO directories (path, mtime) VALUES (?, ?)",
+                [(path, current[path]) for path in changed],
+            )
+
+    def _list_directories(self, host: str | None, roots: list[str]) -> dict[str, float]:
+        """Return the mtime of every directory under the roots."""
+        if host:
+            output = self._remote_find(host, roots, ["-type", "d", "-printf", r"%T@ %p\0"])
+            directories = {}
+            for entry in output:
+                mtime, _, path = entry.partition(" ")
+                directories[path] = float(mtime)
+            return directories
+
+        directories = {}
+        stack = list(roots)
+        while stack:
+            directory = stack.pop()
+            try:
+                directories[directory] = os.stat(directory).st_mtime
+                with os.scandir(directory) as entries:
+                    stack.extend(e.path for e in entries if e.is_dir(follow_symlinks=False))
+            except OSError:
+                continue
+        return directories
+
+    def _list_files(self, host: str | None, directories: list[str]) -> list[tuple[str, int, float]]:
+        """Return (path, size, mtime) for the files directly inside the directories."""
+        if host:
+            output = self._remote_find(
+                host,
+                directories,
+                ["-mindepth", "1", "-maxdepth", "1", "-type", "f", "-printf", r"%s %T@ %p\0"],
+            )
+            files = []
+            for record in output:
+                size, mtime, path = record.split(" ", 2)
+                files.append((path, int(size), float(mtime)))
+            return files
+
+        files = []
+        for directory in directories:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_file(follow_symlinks=False):
+                            stat = entry.stat(follow_symlinks=False)
+                            files.append((entry.path, stat.st_size, stat.st_mtime))
+            except OSError:
+                continue
+        return files
+
+    def _remote_find(self, host: str, paths: list[str], expression: list[str]) -> list[str]:
+        """Run find over the paths on a remote host and return its NUL-separated output.
+
+        Raises OSError if ssh or find failed, since the output may be incomplete.
+        """
+        ssh = self._ssh_pool.ssh_command(host) if self._ssh_pool else ["ssh"]
+        entries: list[str] = []
+        for start in range(0, len(paths), self._REMOTE_BATCH_SIZE):
+            chunk = paths[start:start + self._REMOTE_BATCH_SIZE]
+            command = shlex.join(["find", *chunk, *expression])
+            # Missing directories are expected and only make find complain.
+            result = subprocess.run(
+                [*ssh, host, command],
+                check=False,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+            # find exits 1 for missing paths; anything else, like ssh's 255, loses entries.
+            if result.returncode not in (0, 1):
+                raise OSError(f"listing {host} failed with exit code {result.returncode}")
+            output = result.stdout.decode(errors="surrogateescape")
+            entries.extend(e for e in output.split("\0") if e)
+        return entries
 
-        subprocess.run(
-            ["ssh", source_config.remote_hostname, command],
-            check=False,
+    @staticmethod
+    def _hash_local_file(path: str) -> str | None:
+        """Return the MD5 of a local file, or None if it cannot be read."""
+        try:
+            with open(path, "rb") as f:
+                return hashlib.file_digest(f, "md5").hexdigest()
+        except OSError:
+            return None
+
+
+class Stage(Enum):
+    """Transfer stages, in the order they are run."""
+
+    BIOS = "bios"
+    ROMS = "roms"
+    MEDIA = "media"
+
+
+class TransformCache:
+    """Local content-addressed store for files derived from source files.
+
+    Each artifact is keyed by the MD5 of its source plus the name and
+    parameters of the transform that produced it, so converting a file once
+    serves every later run, device and frontend that needs the same output,
+    wherever the source lives. Source hashes are remembered by path, size and
+    mtime so unchanged files are not re-read. Artifacts are exposed to rsync
+    through views: stable directories of hard links named like the files
+    they replace. When the store grows past its size limit the least recently
+    used artifacts are evicted. Hold `lock` while converting so fan-out
+    writers sharing the cache build each view once.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sources (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            md5 TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS artifacts (
+            key TEXT PRIMARY KEY,
+            transform TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_used REAL NOT NULL
+        );
+    """
+
+    DEFAULT_MAX_SIZE = 20 * 1000**3
+
+    def __init__(self, path: str | Path | None = None, max_size: int = DEFAULT_MAX_SIZE):
+        self._root = Path(path) if path else self.default_path()
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self._root / "index.sqlite3", check_same_thread=False)
+        self._db.executescript(self._SCHEMA)
+        self._max_size = max_size
+        self._pinned: set[str] = set()
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def default_path() -> Path:
+        """Return the default cache location in the user's cache directory."""
+        cache_dir = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+        return Path(cache_dir) / "retro-emulation-scripts" / "transforms"
+
+    def close(self) -> None:
+        """Evict down to the size limit and close the index."""
+        self.evict()
+        self._db.close()
+
+    def key(self, source: Path, transform: str, params: dict) -> str:
+        """Return the cache key for a transform of a local source file."""
+        description = json.dumps(
+            {"transform": transform, "source": self.source_hash(source), "params": params},
+            sort_keys=True,
         )
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def source_hash(self, source: Path) -> str:
+        """Return the MD5 of a source file, hashing it only if it changed since last time."""
+        stat = source.stat()
+        row = self._db.execute(
+            "SELECT md5 FROM sources WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (str(source), stat.st_size, stat.st_mtime_ns),
+        ).fetchone()
+        if row:
+            return row[0]
+
+        with open(source, "rb") as f:
+            digest = hashlib.file_digest(f, "md5").hexdigest()
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sources (path, size, mtime_ns, md5) VALUES (?, ?, ?, ?)",
+                (str(source), stat.st_size, stat.st_mtime_ns, digest),
+            )
+        return digest
+
+    def object_path(self, key: str) -> Path:
+        """Return where the artifact for a key is stored."""
+        return self._root / "objects" / key[:2] / key
+
+    def get(self, key: str) -> Path | None:
+        """Return the stored artifact for a key, or None if it is not cached."""
+        path = self.object_path(key)
+        if not path.exists():
+            return None
+        self._pinned.add(key)
+        with self._db:
+            self._db.execute("UPDATE artifacts SET last_used = ? WHERE key = ?", (time.time(), key))
+        return path
+
+    def put(self, key: str, transform: str) -> Path:
+        """Record an artifact written to `object_path(key)` and return its path."""
+        path = self.object_path(key)
+        self._pinned.add(key)
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO artifacts (key, transform, size, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                (key, transform, path.stat().st_size, time.time()),
+            )
+        return path
 
+    def view_dir(self, transform: str, *parts: str) -> Path:
+        """Return the stable directory a transform's view for the given parts lives in."""
+        return self._root.joinpath("views", transform, *parts)
+
+    def link_view(self, view: Path, entries: dict[Path, Path]) -> None:
+        """Make a view hold exactly the given relative paths, hard linked to their files."""
+        for relative, target in entries.items():
+            link = view / relative
+            try:
+                if os.path.samefile(link, target):
+                    continue
+                link.unlink()
+            except FileNotFoundError:
+                link.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(target, link)
+            except OSError:
+                shutil.copy2(target, link)
+
+        if not view.exists():
+            return
+        for root, dirs, files in os.walk(view, topdown=False):
+            for name in files:
+                path = Path(root) / name
+                if path.relative_to(view) not in entries:
+                    path.unlink()
+            for name in dirs:
+                path = Path(root) / name
+                if not any(path.iterdir()):
+                    path.rmdir()
+
+    def evict(self) -> None:
+        """Delete least recently used artifacts until the store fits its size limit.
+
+        Artifacts used by this run are kept even if that leaves the store over the limit.
+        """
+        (total,) = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()
+        if total <= self._max_size:
+            return
 
-class FrontendFactory:
-    """Factory for creating frontend instances."""
+        rows = self._db.execute("SELECT key, size FROM artifacts ORDER BY last_used").fetchall()
+        evicted = []
+        inodes = set()
+        for key, size in rows:
+            if total <= self._max_size:
+                break
+            if key in self._pinned:
+                continue
+            path = self.object_path(key)
+            try:
+                stat = path.stat()
+                inodes.add((stat.st_dev, stat.st_ino))
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            evicted.append((key,))
+            total -= size
+
+        with self._db:
+            self._db.executemany("DELETE FROM artifacts WHERE key = ?", evicted)
+        if evicted:
+            self._unlink_views(inodes)
+            print(
+                f"Evicted {len(evicted)} cached artifacts; "
+                f"the cache now holds {human_size(total)}."
+            )
+
+    def _unlink_views(self, inodes: set[tuple[int, int]]) -> None:
+        """Remove view links to evicted artifacts, so their space is actually freed.
+
+        Links no object shares an inode with any more are removed as well.
+        Views are rebuilt the next time they are used.
+        """
+        views = self._root / "views"
+        if not views.exists():
+            return
+        for root, dirs, files in os.walk(views, topdown=False):
+            for name in files:
+                path = Path(root) / name
+                try:
+                    stat = path.stat()
+                    if (stat.st_dev, stat.st_ino) in inodes or stat.st_nlink == 1:
+                        path.unlink()
+                except OSError:
+                    continue
+            for name in dirs:
+                path = Path(root) / name
+                if not any(path.iterdir()):
+                    path.rmdir()
+
+
+# Fixed entry timestamp, so the same ROM always zips to the same bytes.
+_ZIP_DATE_TIME = (1996, 12, 24, 23, 32, 0)
+
+
+def _write_zip(source: str, archive: str) -> int:
+    """Zip one file into a deterministic archive and return the archive size.
+
+    The entry has a fixed timestamp and no extra attributes and is deflated
+    at the highest level, so the same input always produces the same bytes.
+    The archive is written next to its final path and renamed into place,
+    and gets the source's mtime so later runs can tell it is up to date.
+    """
+    info = zipfile.ZipInfo(os.path.basename(source), date_time=_ZIP_DATE_TIME)
+    info.create_system = 0
+
+    temporary = f"{archive}.tmp-{os.getpid()}"
+    try:
+        with open(source, "rb") as src, zipfile.ZipFile(temporary, "w") as zf:
+            size = os.fstat(src.fileno()).st_size
+            # Mapping the file lets zipfile read it without a copy in memory.
+            data: mmap.mmap | bytes = (
+                mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+            )
+            try:
+                zf.writestr(info, data, compress_type=zipfile.ZIP_DEFLATED, compresslevel=9)
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+
+        source_stat = os.stat(source)
+        os.utime(temporary, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+        os.replace(temporary, archive)
+        return os.path.getsize(archive)
+    finally:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+
+
+class DirectoryTransform(ABC):
+    """A conversion applied to a local source directory before it is copied to a frontend."""
+
+    stage: Stage
 
-    _FRONTENDS: dict[str, type[Frontend]] = {
-        "batocera": Batocera,
-        "emudeck": EmuDeck,
-        "esde": EsDe,
-        "knulli": Knulli,
-        "minui": MinUI,
-        "muos": MuOS,
-        "nextui": NextUI,
-        "onion": Onion,
-        "retrodeck": RetroDeck,
-        "rocknix": Rocknix,
-        "spruce": Spruce,
+    @abstractmethod
+    def applies(self, frontend: Frontend, system: System) -> bool:
+        """Return True if the system's source for this stage is converted for the frontend."""
+
+    @abstractmethod
+    def transform(
+        self, frontend: Frontend, system: System, source_dir: str, files: list[str] | None = None
+    ) -> tuple[str, list[str] | None] | None:
+        """Convert a source directory, or only `files` in it, for the frontend.
+
+        Returns a directory holding the converted files and the converted
+        names of `files`, or None if converting failed.
+        """
+
+
+class RomCompressor(DirectoryTransform):
+    """Zips each cartridge ROM into its own deterministic archive on a process pool.
+
+    Only files with the wanted extensions, by default cartridge formats, are
+    zipped. Archives and disc images, images and videos that are compressed
+    already (CHD, CSO, PBP, RVZ, ...) are passed through unchanged, since
+    cores cannot load them from a zip. A ROM is zipped to `stem.zip` unless
+    that name clashes with another file in its directory, as for
+    `game.nes` and `game.fds`; its archive is then named `game.nes.zip`.
+    Standalone, an archive whose mtime matches its source is considered up
+    to date; before a copy, archives come from the transform cache, so a
+    system is only ever compressed once for every device and frontend.
+    Either way re-runs neither redo work nor change bytes on the device.
+    """
+
+    stage = Stage.ROMS
+    TRANSFORM = "zip"
+    PASSTHROUGH_EXTENSIONS = {
+        ".7z", ".chd", ".cso", ".gz", ".jpg", ".mp4", ".pbp", ".png", ".rar", ".rvz", ".xz",
+        ".zip", ".zso", ".zst",
+    }
+    CARTRIDGE_EXTENSIONS = {
+        ".32x", ".a26", ".a52", ".a78", ".col", ".fds", ".gb", ".gba", ".gbc", ".gen", ".gg",
+        ".int", ".lnx", ".md", ".min", ".n64", ".nds", ".nes", ".ngc", ".ngp", ".pce", ".sfc",
+        ".sg", ".smc", ".smd", ".sms", ".v64", ".vb", ".ws", ".wsc", ".z64",
     }
 
-    @classmethod
-    def create(cls, name: str, destination_dir: str) -> Frontend | None:
-        """Create a frontend instance by name."""
-        frontend_class = cls._FRONTENDS.get(name.lower())
-        if not frontend_class:
+    def __init__(
+        self,
+        jobs: int | None = None,
+        dry_run: bool = False,
+        cache: TransformCache | None = None,
+        systems: list[System] | None = None,
+    ):
+        self._jobs = jobs or os.cpu_count() or 1
+        self._dry_run = dry_run
+        self._cache = cache
+        self._systems = set(systems or [])
+
+    def applies(self, frontend: Frontend, system: System) -> bool:
+        return system in self._systems
+
+    def transform(
+        self, frontend: Frontend, system: System, source_dir: str, files: list[str] | None = None
+    ) -> tuple[str, list[str] | None] | None:
+        """Build a view of a system's source directory with its ROMs zipped.
+
+        Only `files` are zipped if given; their archive names are returned
+        with the view's path. Archives are taken from the transform cache,
+        and only missing ones are built. Returns None if any file could not
+        be compressed.
+        """
+        assert self._cache
+        with self._cache.lock:
+            return self._transform(system, source_dir, files)
+
+    def _transform(
+        self, system: System, source_dir: str, selected: list[str] | None
+    ) -> tuple[str, list[str] | None] | None:
+        assert self._cache
+        source_dir = source_dir.rstrip("/")
+        view = self._cache.view_dir(self.TRANSFORM, system.value, Path(source_dir).name)
+
+        # Archive names depend on every file in a directory, selected or not.
+        files = self._files(Path(source_dir), keep_others=True)
+        names, clashes = self._archive_names(files)
+        for source in clashes:
+            print(
+                f"Not compressing {system.value}: "
+                f"the archive of {source} clashes with another file."
+            )
+        if clashes:
             return None
-        return frontend_class(destination_dir)
 
-    @classmethod
-    def available_frontends(cls) -> list[str]:
-        """Return list of available frontend names."""
-        return list(cls._FRONTENDS.keys())
+        wanted = set(selected) if selected is not None else None
+        renamed: dict[str, str] = {}
+        entries: dict[Path, Path] = {}
+        tasks: list[tuple[str, str]] = []
+        keys: dict[str, str] = {}
+        cached = 0
+        for source, relative, compress in files:
+            if wanted is not None and str(relative / source.name) not in wanted:
+                continue
+            if not compress:
+                entries[relative / source.name] = source
+                continue
 
+            renamed[str(relative / source.name)] = str(relative / names[source])
+            key = self._cache.key(source, self.TRANSFORM, {"name": source.name})
+            entries[relative / names[source]] = self._cache.object_path(key)
+            if self._cache.get(key):
+                cached += 1
+            else:
+                tasks.append((str(source), str(self._cache.object_path(key))))
+                keys[str(source)] = key
+
+        converted = [renamed.get(path, path) for path in selected] if selected is not None else None
+        failed, written = self._run(tasks)
+        if self._dry_run:
+            return str(view), converted
+
+        for source_path, key in keys.items():
+            if source_path not in failed:
+                self._cache.put(key, self.TRANSFORM)
+        print(
+            f"Compressed {len(tasks) - len(failed)} files for {system.value} into "
+            f"{human_size(written)}; {cached} came from the cache."
+        )
+        if failed:
+            return None
 
-class LevelConfig:
-    """ROM pack level configuration."""
+        self._cache.link_view(view, entries)
+        return str(view), converted
 
-    _LEVEL_1_SYSTEMS: list[System] = [
-        System.ARCADE_FINALBURNNEO,
-        System.PICO_8,
-        System.NEC_TURBOGRAFX_16,
-        System.NEC_TURBOGRAFX_CD,
-        System.NINTENDO_GAME_BOY,
-        System.NINTENDO_GAME_BOY_ADVANCE,
-        System.NINTENDO_GAME_BOY_COLOR,
-        System.NINTENDO_NES,
-        System.NINTENDO_SNES,
-        System.NINTENDO_SUPER_GAME_BOY,
-        System.SEGA_32X,
-        System.SEGA_CD,
-        System.SEGA_GAME_GEAR,
-        System.SEGA_GENESIS,
-        System.SNK_NEO_GEO_POCKET_COLOR,
-    ]
+    def compress_directory(
+        self,
+        source_dir: str | Path,
+        output_dir: str | Path | None = None,
+        extensions: list[str] | None = None,
+    ) -> bool:
+        """Zip the ROMs under a directory, by default those in cartridge formats.
+
+        Archives are written next to their source files, or into the same
+        relative location under `output_dir`. Returns False if any file failed.
+        """
+        source_root = Path(source_dir)
+        output_root = Path(output_dir) if output_dir else source_root
+        wanted = {f".{e.lower().lstrip('.')}" for e in extensions} if extensions else None
+
+        files = self._files(source_root, wanted)
+        names, clashes = self._archive_names(files)
+        for source in clashes:
+            print(f"Not compressing {source}: its archive would clash with another file.")
+
+        tasks: list[tuple[str, str]] = []
+        up_to_date = 0
+        for source, relative, compress in files:
+            target_dir = output_root / relative
+            if not compress:
+                if output_root != source_root and not self._dry_run:
+                    self._link(source, target_dir / source.name)
+                continue
+            if source in clashes:
+                continue
 
-    _LEVEL_2_SYSTEMS: list[System] = _LEVEL_1_SYSTEMS + [
-        System.SONY_PLAYSTATION,
-    ]
+            archive = target_dir / names[source]
+            if self._is_up_to_date(source, archive):
+                up_to_date += 1
+                continue
+            tasks.append((str(source), str(archive)))
+
+        failed, written = self._run(tasks)
+        if not self._dry_run:
+            print(
+                f"Compressed {len(tasks) - len(failed)} files into {human_size(written)} "
+                f"under {output_root}; {up_to_date} already up to date."
+            )
+        return not failed and not clashes
+
+    def _files(
+        self, source_dir: Path, wanted: set[str] | None = None, keep_others: bool = False
+    ) -> list[tuple[Path, Path, bool]]:
+        """Return each file with its directory relative to the source and whether to zip it.
+
+        Files that are neither wanted nor already compressed are left out
+        unless `keep_others` is set, and so are archives an earlier run wrote
+        next to their ROM.
+        """
+        wanted = wanted or self.CARTRIDGE_EXTENSIONS
+        files: list[tuple[Path, Path, bool]] = []
+        for root, _, names in os.walk(source_dir):
+            relative = Path(root).relative_to(source_dir)
+            own = {
+                archive
+                for name in names
+                if Path(name).suffix.lower() in wanted - self.PASSTHROUGH_EXTENSIONS
+                for archive in (f"{Path(name).stem}.zip", f"{name}.zip")
+                if self._is_up_to_date(Path(root) / name, Path(root) / archive)
+            }
+            for name in sorted(names):
+                source = Path(root) / name
+                extension = source.suffix.lower()
+                if name == ".DS_Store" or name in own:
+                    continue
+                if extension in self.PASSTHROUGH_EXTENSIONS:
+                    files.append((source, relative, False))
+                elif extension in wanted:
+                    files.append((source, relative, True))
+                elif keep_others:
+                    files.append((source, relative, False))
+        return files
 
-    _LEVEL_3_SYSTEMS: list[System] = _LEVEL_2_SYSTEMS + [
-        System.NINTENDO_64,
-        System.SEGA_DREAMCAST,
-        System.SEGA_SATURN,
-        System.SNK_NEO_GEO_CD,
-        System.SONY_PLAYSTATION_PORTABLE,
-    ]
+    @staticmethod
+    def _archive_names(files: list[tuple[Path, Path, bool]]) -> tuple[dict[Path, str], list[Path]]:
+        """Name the archive of every file to zip and return the files whose name still clashes.
+
+        Names are compared without case, as on FAT cards.
+        """
+        def output(relative: Path, name: str) -> tuple[Path, str]:
+            return relative, name.lower()
+
+        short: dict[tuple[Path, str], int] = {}
+        for source, relative, compress in files:
+            key = output(relative, f"{source.stem}.zip" if compress else source.name)
+            short[key] = short.get(key, 0) + 1
+
+        names: dict[Path, str] = {}
+        for source, relative, compress in files:
+            if compress:
+                name = f"{source.stem}.zip"
+                names[source] = name if short[output(relative, name)] == 1 else f"{source.name}.zip"
+
+        taken: dict[tuple[Path, str], int] = {}
+        for source, relative, compress in files:
+            key = output(relative, names[source] if compress else source.name)
+            taken[key] = taken.get(key, 0) + 1
+        clashes = [
+            source
+            for source, relative, compress in files
+            if compress and taken[output(relative, names[source])] > 1
+        ]
+        return names, clashes
+
+    def _run(self, tasks: list[tuple[str, str]]) -> tuple[set[str], int]:
+        """Write the archives on the process pool.
+
+        Returns the sources that failed and the number of bytes written.
+        """
+        if self._dry_run:
+            for source, archive in tasks:
+                print(f'zip "{archive}" "{source}"')
+            return set(), 0
+
+        for _, archive in tasks:
+            Path(archive).parent.mkdir(parents=True, exist_ok=True)
+
+        failed: set[str] = set()
+        written = 0
+        with ProcessPoolExecutor(max_workers=self._jobs) as executor:
+            futures = {executor.submit(_write_zip, *task): task for task in tasks}
+            for future in as_completed(futures):
+                source = futures[future][0]
+                try:
+                    written += future.result()
+                except OSError as error:
+                    failed.add(source)
+                    print(f"Could not compress {source}: {error}")
+        return failed, written
 
-    _LEVEL_4_SYSTEMS: list[System] = _LEVEL_3_SYSTEMS + [
-        System.NINTENDO_GAMECUBE,
-        System.NINTENDO_WII,
-        System.SONY_PLAYSTATION_2,
-    ]
+    @staticmethod
+    def _is_up_to_date(source: Path, archive: Path) -> bool:
+        """Return True if the archive was made from the source as it is now."""
+        try:
+            return archive.stat().st_mtime_ns == source.stat().st_mtime_ns
+        except OSError:
+            return False
 
-    _LEVEL_5_SYSTEMS: list[System] = _LEVEL_4_SYSTEMS + [
-        System.NINTENDO_SWITCH,
-        System.NINTENDO_WIIU,
-        System.SONY_PLAYSTATION_3,
-    ]
+    @staticmethod
+    def _link(source: Path, target: Path) -> None:
+        """Hard link an existing archive into the output, copying if linking fails."""
+        if target.exists() and target.stat().st_mtime_ns == source.stat().st_mtime_ns:
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.unlink(missing_ok=True)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+
+
+def _resize_image(source: str, target: str, width: int, height: int, quality: int) -> str | None:
+    """Shrink an image to fit within width x height and re-encode it to the target.
+
+    The output keeps the source's format and file name so gamelists still
+    point at it. If the result would not be smaller than the source, or
+    Pillow cannot decode or encode it, the source itself is linked or
+    copied to the target instead. Returns Pillow's error in the latter case.
+    """
+    temporary = f"{target}.tmp-{os.getpid()}"
+    error = None
+    try:
+        try:
+            with Image.open(source) as image:
+                image_format = image.format
+                image.thumbnail((width, height), Image.Resampling.LANCZOS)
+                if image_format == "JPEG":
+                    image.convert("RGB").save(
+                        temporary, "JPEG", quality=quality, optimize=True, progressive=True
+                    )
+                elif image_format == "WEBP":
+                    image.save(temporary, "WEBP", quality=quality, method=6)
+                else:
+                    image.save(temporary, image_format, optimize=True)
+        # Decoders raise all of these for damaged files, and oversized ones are refused outright.
+        except (
+            Image.DecompressionBombError, OSError, ValueError, SyntaxError, EOFError, struct.error
+        ) as e:
+            error = str(e) or type(e).__name__
+
+        if error is not None or os.path.getsize(temporary) >= os.path.getsize(source):
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+            try:
+                os.link(source, temporary)
+            except OSError:
+                shutil.copyfile(source, temporary)
+        os.replace(temporary, target)
+        return error
+    finally:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+
+
+class MediaResizer(DirectoryTransform):
+    """Downscales and recompresses scraped images to a frontend's screen on a process pool.
+
+    Images are shrunk to fit the frontend's media profile, or the profile
+    given here, and keep their names and formats. Videos, manuals and other
+    files are passed through unchanged. Results come from the transform
+    cache, keyed by source hash and settings. Needs Pillow; without it media
+    is copied at full resolution.
+    """
+
+    stage = Stage.MEDIA
+    TRANSFORM = "resize-media"
+    IMAGE_EXTENSIONS = {".jpeg", ".jpg", ".png", ".webp"}
 
-    _LEVELS: dict[str, list[System]] = {
-        "1": _LEVEL_1_SYSTEMS,
-        "2": _LEVEL_2_SYSTEMS,
-        "3": _LEVEL_3_SYSTEMS,
-        "4": _LEVEL_4_SYSTEMS,
-        "5": _LEVEL_5_SYSTEMS,
-    }
+    def __init__(
+        self,
+        cache: TransformCache,
+        jobs: int | None = None,
+        dry_run: bool = False,
+        profile: MediaProfile | None = None,
+        quality: int | None = None,
+    ):
+        self._cache = cache
+        self._jobs = jobs or os.cpu_count() or 1
+        self._dry_run = dry_run
+        self._profile = profile
+        self._quality = quality
 
-    @classmethod
-    def systems_for_level(cls, level: str) -> list[System] | None:
-        """Get systems for a given level."""
-        normalized = level.lower().replace("level-", "").replace("level_", "")
-        return cls._LEVELS.get(normalized)
+    @staticmethod
+    def available() -> bool:
+        """Return True if Pillow is installed."""
+        return PIL_AVAILABLE
+
+    def applies(self, frontend: Frontend, system: System) -> bool:
+        return self.available() and self._profile_for(frontend) is not None
+
+    def transform(
+        self, frontend: Frontend, system: System, source_dir: str, files: list[str] | None = None
+    ) -> tuple[str, list[str] | None] | None:
+        """Build a view of a system's media directory with its images resized.
+
+        Only `files` are resized if given; they keep their names. Returns
+        the view's path and `files`, or None if any image could not be
+        converted.
+        """
+        profile = self._profile_for(frontend)
+        assert profile
+        with self._cache.lock:
+            view = self._transform(profile, system, source_dir, files)
+        return (view, files) if view else None
+
+    def _transform(
+        self, profile: MediaProfile, system: System, source_dir: str, selected: list[str] | None
+    ) -> str | None:
+        source_dir = source_dir.rstrip("/")
+        settings = {"width": profile.width, "height": profile.height, "quality": profile.quality}
+        view = self._cache.view_dir(
+            self.TRANSFORM,
+            f"{profile.width}x{profile.height}-q{profile.quality}",
+            system.value,
+            Path(source_dir).name,
+        )
 
-    @classmethod
-    def is_valid_level(cls, level: str) -> bool:
-        """Check if a level is valid."""
-        normalized = level.lower().replace("level-", "").replace("level_", "")
-        return normalized in cls._LEVELS
+        wanted = set(selected) if selected is not None else None
+        entries: dict[Path, Path] = {}
+        images: list[Path] = []
+        tasks: dict[str, tuple[str, str]] = {}
+        source_bytes = 0
+        for root, _, files in os.walk(source_dir):
+            relative = Path(root).relative_to(source_dir)
+            for name in sorted(files):
+                source = Path(root) / name
+                if name == ".DS_Store":
+                    continue
+                if wanted is not None and str(relative / name) not in wanted:
+                    continue
+                if source.suffix.lower() not in self.IMAGE_EXTENSIONS:
+                    entries[relative / name] = source
+                    continue
+
+                key = self._cache.key(source, self.TRANSFORM, settings)
+                entries[relative / name] = self._cache.object_path(key)
+                images.append(self._cache.object_path(key))
+                source_bytes += source.stat().st_size
+                if not self._cache.get(key):
+                    tasks[key] = (str(source), str(self._cache.object_path(key)))
 
+        if self._dry_run:
+            for original, resized in tasks.values():
+                print(f'resize {profile.width}x{profile.height} "{original}" "{resized}"')
+            return str(view)
+
+        for _, target in tasks.values():
+            Path(target).parent.mkdir(parents=True, exist_ok=True)
+
+        failed = 0
+        with ProcessPoolExecutor(max_workers=self._jobs) as executor:
+            futures = {
+                executor.submit(
+                    _resize_image, source, target, profile.width, profile.height, profile.quality
+                ): key
+                for key, (source, target) in tasks.items()
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    reason = future.result()
+                    self._cache.put(key, self.TRANSFORM)
+                    if reason:
+                        print(f"Could not resize {tasks[key][0]}, copying it unchanged: {reason}")
+                except OSError as error:
+                    failed += 1
+                    print(f"Could not resize {tasks[key][0]}: {error}")
+        if failed:
+            return None
 
-def main() -> int:
-    """Main entry point."""
-    parser = argparse.ArgumentParser(
-        description="Copy BIOS and ROM files to emulation frontends."
-    )
-    parser.add_argument(
-        "destination",
-        type=str,
-        help=f"Destination OS/application ({', '.join(FrontendFactory.available_frontends())}, sizes)",
-    )
-    parser.add_argument(
-        "destination_dir",
-        type=str,
-        nargs="?",
-        default="",
-        help="Destination root directory (required for all destinations except sizes)",
-    )
-    parser.add_argument(
-        "level",
-        type=str,
-        nargs="?",
-        default="",
-        help="ROM pack level (1-5 or level-1 through level-5)",
-    )
+        self._cache.link_view(view, entries)
+        resized_bytes = sum(image.stat().st_size for image in images)
+        print(
+            f"Resized {len(tasks)} images for {system.value} to {profile.width}x{profile.height} "
+            f"({len(images) - len(tasks)} cached): "
+            f"{human_size(source_bytes)} -> {human_size(resized_bytes)}."
+        )
+        return str(view)
 
-    args = parser.parse_args()
-    destination_type = args.destination.lower()
+    def _profile_for(self, frontend: Frontend) -> MediaProfile | None:
+        profile = self._profile or frontend.media_profile
+        if profile and self._quality:
+            return MediaProfile(profile.width, profile.height, self._quality)
+        return profile
 
-    remote_destination = ":" in (args.destination_dir or "")
-    yaml_path = Path(__file__).parent / "source_config.yaml"
-    source_config = SourceConfig.from_yaml(yaml_path, remote_source=not remote_destination)
 
-    # For sizes, destination_dir is unused; treat it as the level if provided.
-    if destination_type in ("sizes", "rom-sizes", "rom_sizes"):
-        level = args.destination_dir or args.level
-        systems: list[System] = []
-        if level:
-            if not LevelConfig.is_valid_level(level):
-                print(f"{level} is not a supported ROM pack name.")
-                return 1
-            systems = LevelConfig.systems_for_level(level) or []
-        RomSizeDisplay.display(systems, source_config)
-        return 0
+class MediaSelector:
+    """Picks the scraped media that belongs to the ROMs being copied.
 
-    if not args.destination_dir:
-        print("destination_dir is required.")
-        parser.print_usage()
-        return 1
+    Media files are matched to ROMs by name in every media type folder:
+    `Game.png` (ES-DE) and `Game-image.png` (Batocera) both belong to
+    `Game.zip`. Files at the top of the media directory, such as a gamelist,
+    are always kept. Orphaned media on the destination can be pruned; only
+    files inside the media type folders are considered, since on Batocera
+    the media shares its directory with the ROMs. ROM names are read from
+    the source library, so selection also works from a fan-out mirror.
+    """
 
-    level = args.level
-    systems: list[System] = []
-    if level:
-        if not LevelConfig.is_valid_level(level):
-            print(f"{level} is not a supported ROM pack name.")
-            return 1
-        systems = LevelConfig.systems_for_level(level) or []
+    def __init__(
+        self,
+        source_config: SourceConfig,
+        ssh_pool: SshConnectionPool | None = None,
+        dry_run: bool = False,
+    ):
+        self._source_config = source_config
+        self._ssh_pool = ssh_pool
+        self._dry_run = dry_run
+        self._rom_stems: dict[System, set[str]] = {}
+        self._agent = ManifestAgent(ssh_pool)
+
+    def rom_stems(self, system: System) -> set[str] | None:
+        """Return the names of a system's source ROMs, or None if it has no ROMs directory."""
+        subdir = self._source_config.roms_subdirs.get(system)
+        if not subdir:
+            return None
+        if system not in self._rom_stems:
+            rom_source = str(PurePosixPath(self._source_config.roms_dir) / subdir)
+            self._rom_stems[system] = {
+                PurePosixPath(path).stem for path in self._list_source_files(rom_source)
+            }
+        return self._rom_stems[system]
+
+    def select(self, stems: set[str], media_source: str) -> tuple[list[str], list[str]]:
+        """Return the media files to copy and the media files to skip for the ROM names."""
+        selected: list[str] = []
+        skipped: list[str] = []
+        for path in self._list_source_files(media_source):
+            if "/" not in path or self.belongs(PurePosixPath(path).stem, stems):
+                selected.append(path)
+            else:
+                skipped.append(path)
+        return selected, skipped
+
+    @staticmethod
+    def belongs(media_stem: str, rom_stems: set[str]) -> bool:
+        """Return True if a media file name belongs to one of the ROMs."""
+        return media_stem in rom_stems or media_stem.rpartition("-")[0] in rom_stems
+
+    def prune(self, destination: str, media_dirs: set[str], rom_stems: set[str]) -> int:
+        """Delete media in the destination's media type folders that belongs to no ROM.
+
+        Returns the number of files deleted.
+        """
+        root = destination.rstrip("/")
+        orphans = [
+            f"{root}/{media_dir}/{path}"
+            for media_dir in sorted(media_dirs)
+            for path in self.list_files(f"{root}/{media_dir}")
+            if not self.belongs(PurePosixPath(path).stem, rom_stems)
+        ]
+        if not orphans:
+            return 0
+        if self._dry_run:
+            for orphan in orphans:
+                print(f'rm "{orphan}"')
+            return len(orphans)
+
+        host = remote_host(root)
+        if host:
+            ssh = self._ssh_pool.ssh_command(host) if self._ssh_pool else ["ssh"]
+            paths = [orphan.partition(":")[2] for orphan in orphans]
+            subprocess.run(
+                [*ssh, host, "xargs -0 rm -f --"],
+                input="\0".join(paths).encode(errors="surrogateescape"),
+                check=False,
+            )
+        else:
+            for orphan in orphans:
+                Path(orphan).unlink(missing_ok=True)
+        return len(orphans)
+
+    def list_files(self, directory: str) -> list[str]:
+        """Return the paths of all files under a local or remote directory, relative to it."""
+        root = directory.rstrip("/")
+        host = remote_host(root)
+        if host:
+            ssh = self._ssh_pool.ssh_command(host) if self._ssh_pool else ["ssh"]
+            command = shlex.join(["find", root.partition(":")[2], "-type", "f", "-printf", r"%P\0"])
+            # A missing directory only makes find complain.
+            result = subprocess.run(
+                [*ssh, host, command],
+                check=False,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+            paths = result.stdout.decode(errors="surrogateescape").split("\0")
+            return sorted(p for p in paths if p and PurePosixPath(p).name != ".DS_Store")
+
+        paths = []
+        for current, _, files in os.walk(root):
+            relative = os.path.relpath(current, root)
+            for name in files:
+                if name != ".DS_Store":
+                    paths.append(name if relative == "." else f"{relative}/{name}")
+        return sorted(paths)
+
+    def _list_source_files(self, directory: str) -> list[str]:
+        """List files in the source library, with the manifest agent where it is remote.
+
+        Destinations go through `list_files`, since devices may not have python3.
+        """
+        root = directory.rstrip("/")
+        host = remote_host(root)
+        if not host:
+            return self.list_files(root)
+
+        path = root.partition(":")[2]
+        listings = self._agent.scan(host, [path])
+        if listings is None:
+            return self.list_files(root)
+        listing = listings.get(path) or DirectoryListing(path)
+        return sorted(
+            os.path.relpath(file, path)
+            for file in listing.files
+            if PurePosixPath(file).name != ".DS_Store"
+        )
+
+
+class Transfer:
+    """A single rsync transfer for one system and stage.
+
+    `files` optionally restricts the transfer to those paths relative to the
+    source; they are sent with --files-from once written to `files_from`.
+    """
+
+    def __init__(
+        self,
+        stage: Stage,
+        system: System,
+        source: str,
+        destination: str,
+        files: list[str] | None = None,
+    ):
+        self.stage = stage
+        self.system = system
+        self.source = source
+        self.destination = destination
+        self.files = files
+        self.files_from: str | None = None
+
+    @property
+    def label(self) -> str:
+        """Short label used to prefix output for this transfer."""
+        return f"{self.stage.value}/{self.system.value}"
+
+    @property
+    def systems(self) -> list[System]:
+        """Systems covered by this transfer."""
+        return [self.system]
+
+    @property
+    def rsync_options(self) -> list[str]:
+        """Extra rsync options needed by this transfer."""
+        if self.files_from:
+            return [f"--files-from={self.files_from}"]
+        return []
+
+
+class TransferBatch:
+    """Several transfers of one stage run as a single rsync using --files-from."""
+
+    def __init__(
+        self,
+        stage: Stage,
+        index: int,
+        transfers: list[Transfer],
+        source: str,
+        destination: str,
+        files_from: str,
+        options: list[str],
+    ):
+        self.stage = stage
+        self.index = index
+        self.transfers = transfers
+        self.source = source
+        self.destination = destination
+        self.files_from = files_from
+        self._options = options
+
+    @property
+    def label(self) -> str:
+        """Short label used to prefix output for this batch."""
+        return f"{self.stage.value}/batch-{self.index} ({len(self.transfers)} systems)"
+
+    @property
+    def systems(self) -> list[System]:
+        """Systems covered by this batch."""
+        return [transfer.system for transfer in self.transfers]
+
+    @property
+    def rsync_options(self) -> list[str]:
+        """Extra rsync options needed by this batch."""
+        return [*self._options, f"--files-from={self.files_from}"]
+
+
+class Route:
+    """Where one stage of one system is copied from and to on a frontend.
+
+    A route with a `skip_reason` is not copied and may lack a source or a
+    destination. `size` is the estimated number of source bytes, or None if
+    it was not estimated.
+    """
+
+    def __init__(
+        self,
+        stage: Stage,
+        system: System,
+        source: str | None,
+        destination: str | None,
+        size: int | None = None,
+        skip_reason: str | None = None,
+    ):
+        self.stage = stage
+        self.system = system
+        self.source = source
+        self.destination = destination
+        self.size = size
+        self.skip_reason = skip_reason
+
+    def transfer(self) -> Transfer:
+        """Return the transfer that carries out this route."""
+        assert self.source is not None and self.destination is not None
+        return Transfer(self.stage, self.system, self.source, self.destination)
+
+    def to_dict(self) -> dict[str, object]:
+        """Return the route as a JSON-serializable dictionary."""
+        return {
+            "stage": self.stage.value,
+            "system": self.system.value,
+            "source": self.source,
+            "destination": self.destination,
+            "bytes": self.size,
+            "skip": self.skip_reason,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Route":
+        """Create a route from a dictionary written by `to_dict`."""
+        return cls(
+            Stage(data["stage"]),
+            System(data["system"]),
+            data.get("source"),
+            data.get("destination"),
+            data.get("bytes"),
+            data.get("skip"),
+        )
+
+
+class RoutingTable:
+    """Every route of a copy to one frontend, resolved once.
+
+    Routes are kept stage by stage in the order they run. A table can be
+    written to a JSON plan and loaded again, so a copy can be reviewed before
+    it is applied, replayed later, or reordered by editing the plan.
+    """
+
+    VERSION = 1
+    NO_SOURCE = "no source directory"
+    NO_DESTINATION = "no destination directory"
+
+    def __init__(self, frontend: Frontend, systems: list[System], routes: list[Route]):
+        self.frontend = frontend
+        self.systems = systems
+        self.routes = routes
+
+    @classmethod
+    def build(
+        cls, frontend: Frontend, source_config: SourceConfig, systems: list[System]
+    ) -> "RoutingTable":
+        """Resolve the source and destination of every stage of every system."""
+        routes: list[Route] = []
+        for stage in Stage:
+            for system in systems:
+                source, destination = cls._resolve(frontend, source_config, stage, system)
+                skip_reason = None
+                if source is None:
+                    skip_reason = cls.NO_SOURCE
+                elif destination is None:
+                    skip_reason = cls.NO_DESTINATION
+                routes.append(Route(stage, system, source, destination, skip_reason=skip_reason))
+        return cls(frontend, systems, routes)
+
+    @classmethod
+    def from_json(cls, path: str | Path) -> "RoutingTable":
+        """Load a plan written by `write_json`. Raises ValueError if it is not a valid plan."""
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != cls.VERSION:
+            raise ValueError(f"{path} is not a version {cls.VERSION} plan.")
+        frontend = FrontendFactory.create(data.get("frontend", ""), data.get("destination_dir", ""))
+        if not frontend:
+            raise ValueError(
+                f"{data.get('frontend')} is not a supported destination OS/application."
+            )
+        try:
+            systems = [System(value) for value in data["systems"]]
+            routes = [Route.from_dict(route) for route in data["routes"]]
+        except KeyError as error:
+            raise ValueError(f"{path} is missing {error}.") from None
+        return cls(frontend, systems, routes)
+
+    def transfers(self, stage: Stage, systems: list[System] | None = None) -> list[Transfer]:
+        """Return the transfers of a stage, optionally only for some systems, in plan order."""
+        return [route.transfer() for route in self._routes(stage, systems) if not route.skip_reason]
+
+    def skipped(self, stage: Stage, systems: list[System] | None = None) -> list[Route]:
+        """Return the routes of a stage that will not be copied."""
+        return [route for route in self._routes(stage, systems) if route.skip_reason]
+
+    def estimate_sizes(self, manifest: LibraryManifest, jobs: int = 8) -> None:
+        """Fill in the source size of every route to be copied from the library manifest."""
+        routes = [route for route in self.routes if not route.skip_reason]
+        manifest.refresh([route.source for route in routes if route.source], jobs)
+        for route in routes:
+            assert route.source is not None
+            route.size = manifest.total_size(route.source)
+
+    def to_dict(self) -> dict[str, object]:
+        """Return the table as a JSON-serializable dictionary."""
+        return {
+            "version": self.VERSION,
+            "frontend": FrontendFactory.name_of(self.frontend),
+            "destination_dir": self.frontend.destination_dir,
+            "systems": [system.value for system in self.systems],
+            "routes": [route.to_dict() for route in self.routes],
+        }
+
+    def write_json(self, path: str | Path) -> None:
+        """Write the table to a JSON plan file."""
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.write("\n")
+
+    def print_summary(self) -> None:
+        """Print the routes and estimated bytes per stage, and the routes that will be skipped."""
+        print(f"Plan for {self.frontend.name} at {self.frontend.destination_dir}:")
+        for stage in Stage:
+            routes = [
+                route for route in self.routes if route.stage == stage and not route.skip_reason
+            ]
+            size = sum(route.size or 0 for route in routes)
+            print(f"  {stage.value:<6} {len(routes):>4} systems {human_size(size):>8}")
+
+        # A system without BIOS files or scraped media is not worth reporting.
+        skipped = [
+            route
+            for route in self.routes
+            if route.skip_reason == self.NO_DESTINATION
+            or (route.skip_reason and route.stage == Stage.ROMS)
+        ]
+        for route in skipped:
+            print(f"  skip   {route.stage.value}/{route.system.value}: {route.skip_reason}")
+
+    def _routes(self, stage: Stage, systems: list[System] | None) -> list[Route]:
+        selected = set(systems) if systems is not None else None
+        return [
+            route
+            for route in self.routes
+            if route.stage == stage and (selected is None or route.system in selected)
+        ]
+
+    @staticmethod
+    def _resolve(
+        frontend: Frontend, source_config: SourceConfig, stage: Stage, system: System
+    ) -> tuple[str | None, str | None]:
+        """Return the source and destination of a stage for a system, None where there is none."""
+        if stage == Stage.BIOS:
+            subdir = source_config.bios_subdirs.get(system)
+            source = str(PurePosixPath(source_config.bios_dir) / subdir) + "/" if subdir else None
+            destination = frontend.bios_directory(system)
+            return source, destination + "/" if destination else None
+
+        if stage == Stage.ROMS:
+            subdir = source_config.roms_subdirs.get(system)
+            source = str(PurePosixPath(source_config.roms_dir) / subdir) + "/" if subdir else None
+            return source, frontend.roms_directory(system)
+
+        media_dir = frontend.source_scraped_media_dir(system, source_config)
+        destination = frontend.destination_scraped_media_dir(system)
+        return (
+            media_dir + "/" if media_dir else None,
+            destination + "/" if destination else None,
+        )
+
+
+class TransferMetrics:
+    """Statistics for one rsync run, parsed from its --stats output."""
+
+    _STATS_PATTERNS = {
+        "files_considered": re.compile(r"^Number of files: ([\d,.]+)(?: \(reg: ([\d,.]+))?", re.M),
+        "files_transferred": re.compile(r"^Number of regular files transferred: ([\d,.]+)", re.M),
+        "bytes_transferred": re.compile(r"^Total transferred file size: ([\d,.]+)", re.M),
+        "bytes_sent": re.compile(r"^Total bytes sent: ([\d,.]+)", re.M),
+        "bytes_received": re.compile(r"^Total bytes received: ([\d,.]+)", re.M),
+    }
+
+    def __init__(
+        self,
+        stage: Stage,
+        label: str,
+        systems: list[System],
+        exit_code: int,
+        elapsed: float,
+        files_considered: int = 0,
+        files_transferred: int = 0,
+        bytes_transferred: int = 0,
+        bytes_sent: int = 0,
+        bytes_received: int = 0,
+        mode: str = "rsync",
+    ):
+        self.stage = stage
+        self.label = label
+        self.systems = systems
+        self.exit_code = exit_code
+        self.elapsed = elapsed
+        self.files_considered = files_considered
+        self.files_transferred = files_transferred
+        self.bytes_transferred = bytes_transferred
+        self.bytes_sent = bytes_sent
+        self.bytes_received = bytes_received
+        self.mode = mode
+
+    @classmethod
+    def from_rsync_stats(
+        cls,
+        stage: Stage,
+        label: str,
+        systems: list[System],
+        exit_code: int,
+        elapsed: float,
+        output: str,
+        mode: str = "rsync",
+    ) -> "TransferMetrics":
+        """Build metrics from the output of an rsync run with --stats.
+
+        `mode` records what carried out the transfer: rsync, the native copy
+        engine ("copy") or a tar stream ("tar"), which report the same lines.
+        """
+        values: dict[str, int] = {}
+        for name, pattern in cls._STATS_PATTERNS.items():
+            match = pattern.search(output)
+            if match:
+                # Prefer the regular file count over files plus directories.
+                number = match.group(match.lastindex or 1)
+                values[name] = int(re.sub(r"[,.]", "", number))
+        return cls(stage, label, systems, exit_code, elapsed, **values, mode=mode)
+
+    @property
+    def megabytes_per_second(self) -> float:
+        """Effective throughput of transferred file data in MB/s."""
+        if self.elapsed <= 0:
+            return 0.0
+        return self.bytes_transferred / 1_000_000 / self.elapsed
+
+    def to_dict(self) -> dict[str, object]:
+        """Return the metrics as a JSON-serializable dictionary."""
+        return {
+            "stage": self.stage.value,
+            "label": self.label,
+            "systems": [system.value for system in self.systems],
+            "exit_code": self.exit_code,
+            "mode": self.mode,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "files_considered": self.files_considered,
+            "files_transferred": self.files_transferred,
+            "bytes_transferred": self.bytes_transferred,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "megabytes_per_second": round(self.megabytes_per_second, 3),
+        }
+
+
+class RunReport:
+    """Collects transfer metrics for a run, prints a summary and writes JSON."""
+
+    def __init__(self):
+        self._metrics: list[TransferMetrics] = []
+        self._deduplicated: dict[Stage, list[int]] = {}
+        self._lock = threading.Lock()
+        self._started_at = datetime.now(timezone.utc)
+        self._start = time.monotonic()
+
+    def add(self, metrics: TransferMetrics) -> None:
+        """Record the metrics of one transfer."""
+        with self._lock:
+            self._metrics.append(metrics)
+
+    def add_deduplicated(self, stage: Stage, files: int, size: int) -> None:
+        """Record files made on the device from identical ones instead of being sent."""
+        with self._lock:
+            totals = self._deduplicated.setdefault(stage, [0, 0])
+            totals[0] += files
+            totals[1] += size
+
+    def print_summary(self) -> None:
+        """Print one row per transfer, slowest first within each stage, with stage totals."""
+        if not self._metrics and not self._deduplicated:
+            return
+
+        header = (
+            f"{'Transfer':<48} {'Files':>8} {'Copied':>8} {'MB':>10} {'Seconds':>9} {'MB/s':>8}"
+        )
+        print()
+        print(header)
+        print("-" * len(header))
+        for stage in Stage:
+            rows = [m for m in self._metrics if m.stage == stage]
+            if not rows:
+                continue
+            for m in sorted(rows, key=lambda m: m.elapsed, reverse=True):
+                label = m.label if m.mode == "rsync" else f"{m.label} ({m.mode})"
+                self._print_row(label, m.files_considered, m.files_transferred,
+                                m.bytes_transferred, m.elapsed, m.megabytes_per_second)
+            total = self._totals(rows)
+            self._print_row(f"{stage.value} total", total["files_considered"],
+                            total["files_transferred"], total["bytes_transferred"],
+                            total["elapsed_seconds"], total["megabytes_per_second"])
+            print()
+
+        if self._deduplicated:
+            files = sum(files for files, _ in self._deduplicated.values())
+            saved = sum(size for _, size in self._deduplicated.values())
+            print(f"Deduplicated {files} files on the device; {human_size(saved)} not sent.")
+
+    def write_json(self, path: str | Path) -> None:
+        """Write every transfer's metrics and per-stage totals to a JSON file."""
+        report = {
+            "started_at": self._started_at.isoformat(),
+            "elapsed_seconds": round(time.monotonic() - self._start, 3),
+            "transfers": [m.to_dict() for m in self._metrics],
+            "stages": {
+                stage.value: self._totals([m for m in self._metrics if m.stage == stage])
+                for stage in Stage
+            },
+            "deduplicated": {
+                stage.value: {"files": files, "bytes_saved": size}
+                for stage, (files, size) in self._deduplicated.items()
+            },
+        }
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    @staticmethod
+    def _totals(metrics: list[TransferMetrics]) -> dict[str, float]:
+        """Sum metrics; elapsed is the sum of transfer times, not wall time."""
+        elapsed = sum(m.elapsed for m in metrics)
+        transferred = sum(m.bytes_transferred for m in metrics)
+        return {
+            "transfers": len(metrics),
+            "failed": sum(1 for m in metrics if m.exit_code != 0),
+            "files_considered": sum(m.files_considered for m in metrics),
+            "files_transferred": sum(m.files_transferred for m in metrics),
+            "bytes_transferred": transferred,
+            "bytes_sent": sum(m.bytes_sent for m in metrics),
+            "bytes_received": sum(m.bytes_received for m in metrics),
+            "elapsed_seconds": round(elapsed, 3),
+            "megabytes_per_second": round(transferred / 1_000_000 / elapsed, 3) if elapsed else 0.0,
+        }
+
+    @staticmethod
+    def _print_row(
+        label: str, files: float, copied: float, size: float, elapsed: float, speed: float
+    ) -> None:
+        print(
+            f"{label[:48]:<48} {int(files):>8} {int(copied):>8} "
+            f"{size / 1_000_000:>10.1f} {elapsed:>9.1f} {speed:>8.1f}"
+        )
+
+
+def read_device_file(path: str, ssh_pool: SshConnectionPool | None = None) -> bytes | None:
+    """Return the contents of a file on a local or remote device, or None if it is not there."""
+    host = remote_host(path)
+    if host:
+        ssh = ssh_pool.ssh_command(host) if ssh_pool else ["ssh"]
+        result = subprocess.run(
+            [*ssh, host, shlex.join(["cat", path.partition(":")[2]])],
+            check=False,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        return result.stdout if result.returncode == 0 else None
+    return Path(path).read_bytes() if Path(path).exists() else None
+
+
+def write_device_file(path: str, data: bytes, ssh_pool: SshConnectionPool | None = None) -> None:
+    """Replace a file on a local or remote device through a temporary file.
+
+    Raises OSError if it cannot be written.
+    """
+    host = remote_host(path)
+    if host:
+        ssh = ssh_pool.ssh_command(host) if ssh_pool else ["ssh"]
+        path = path.partition(":")[2]
+        script = (
+            f"mkdir -p {shlex.quote(str(PurePosixPath(path).parent))} && "
+            f"cat > {shlex.quote(path + '.tmp')} && "
+            f"mv {shlex.quote(path + '.tmp')} {shlex.quote(path)}"
+        )
+        result = subprocess.run([*ssh, host, script], input=data, check=False)
+        if result.returncode != 0:
+            raise OSError(f"ssh exited with {result.returncode}")
+    else:
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temporary = target.with_suffix(".tmp")
+        temporary.write_bytes(data)
+        os.replace(temporary, target)
+
+
+class TransferJournal:
+    """Records the progress of a run on the device, so an interrupted run can resume.
+
+    The journal lives in `.retro-sync/journal.json` under the frontend's
+    destination root. As transfers start and finish it is rewritten at most
+    every `FLUSH_INTERVAL` seconds, and `flush` writes what is left once a
+    batch ends or is interrupted. An interrupted transfer remembers the file
+    rsync was writing and, on a local device, how much of it had arrived.
+    Every journaled transfer keeps
+    partial files; when resuming, completed transfers are skipped without
+    starting rsync and the others append to their partial files after
+    verifying them. The journal is removed once a run finishes without errors.
+    """
+
+    PATH = ".retro-sync/journal.json"
+    FLUSH_INTERVAL = 10
+
+    _PROGRESS = re.compile(r"^\s*[\d,.]+[KMG]?\s+\d+%")
+
+    def __init__(
+        self, destination_dir: str, ssh_pool: SshConnectionPool | None = None, resume: bool = False
+    ):
+        self._path = str(PurePosixPath(destination_dir) / self.PATH)
+        self._ssh_pool = ssh_pool
+        self.resume = resume
+        self._lock = threading.Lock()
+        self._warned = False
+        self._dirty = False
+        self._saved_at: float | None = None
+        self._entries: dict[str, dict] = self._load() if resume else {}
+
+    @staticmethod
+    def key(transfer: Transfer) -> str:
+        """Return the journal key of a transfer.
+
+        The label stands in for the source, which a transform swaps for a cache view.
+        """
+        return f"{transfer.label} -> {transfer.destination}"
+
+    def is_completed(self, transfer: Transfer) -> bool:
+        """Return True if the journal records the transfer as completed."""
+        entry = self._entries.get(self.key(transfer))
+        return entry is not None and entry["status"] == "completed"
+
+    def is_interrupted(self, transfer: Transfer) -> bool:
+        """Return True if the transfer started in an earlier run but never completed."""
+        entry = self._entries.get(self.key(transfer))
+        return entry is not None and entry["status"] != "completed"
+
+    def describe(self, transfer: Transfer) -> str:
+        """Describe where an interrupted transfer stopped."""
+        entry = self._entries.get(self.key(transfer), {})
+        if not entry.get("file"):
+            return transfer.label
+        offset = entry.get("offset")
+        at = f" at {human_size(offset)}" if offset is not None else ""
+        return f"{transfer.label} from {entry['file']}{at}"
+
+    def start(self, transfers: list[Transfer]) -> None:
+        """Record that the transfers are starting."""
+        with self._lock:
+            for transfer in transfers:
+                previous = self._entries.get(self.key(transfer), {})
+                self._entries[self.key(transfer)] = {
+                    **previous,
+                    "label": transfer.label,
+                    "status": "started",
+                    "updated_at": time.time(),
+                }
+            self._save_if_due()
+
+    def finish(self, transfers: list[Transfer], returncode: int, output: str) -> None:
+        """Record the outcome of the transfers and, if they failed, where rsync stopped."""
+        last_file = None if returncode == 0 else self._last_file(output)
+        with self._lock:
+            for transfer in transfers:
+                entry: dict = {
+                    "label": transfer.label,
+                    "status": "completed" if returncode == 0 else "interrupted",
+                    "updated_at": time.time(),
+                }
+                if last_file:
+                    entry["file"] = last_file
+                    entry["offset"] = self._offset(transfer, last_file)
+                self._entries[self.key(transfer)] = entry
+            self._save_if_due()
+
+    def flush(self) -> None:
+        """Write any progress not yet written to the device."""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def clear(self) -> None:
+        """Remove the journal after a run with nothing left to resume."""
+        host = remote_host(self._path)
+        if host:
+            ssh = self._ssh_pool.ssh_command(host) if self._ssh_pool else ["ssh"]
+            path = self._path.partition(":")[2]
+            subprocess.run([*ssh, host, shlex.join(["rm", "-f", path])], check=False)
+            return
+        Path(self._path).unlink(missing_ok=True)
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            data = read_device_file(self._path, self._ssh_pool)
+            return json.loads(data)["transfers"] if data else {}
+        except (OSError, ValueError, KeyError) as error:
+            print(f"Ignoring unreadable journal {self._path}: {error}")
+            return {}
+
+    def _save_if_due(self) -> None:
+        """Write the journal unless it was written less than FLUSH_INTERVAL seconds ago."""
+        self._dirty = True
+        now = time.monotonic()
+        if self._saved_at is None or now - self._saved_at >= self.FLUSH_INTERVAL:
+            self._save()
+
+    def _save(self) -> None:
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        data = json.dumps({"version": 1, "transfers": self._entries}, indent=2)
+        try:
+            write_device_file(self._path, data.encode(), self._ssh_pool)
+        except OSError as error:
+            # A device that just went away cannot be written to; the run
+            # reports the failed transfers anyway.
+            if not self._warned:
+                print(f"Could not write journal {self._path}: {error}")
+                self._warned = True
+
+    @classmethod
+    def _last_file(cls, output: str) -> str | None:
+        """Return the last file rsync listed before it stopped, if any."""
+        for line in reversed(re.split(r"[\r\n]", output)):
+            line = line.rstrip()
+            if (
+                not line
+                or line.endswith("/")
+                or cls._PROGRESS.match(line)
+                or line.startswith(
+                    ("rsync", "sending ", "sent ", "total size", "Number of", "Total ")
+                )
+            ):
+                continue
+            return line
+        return None
+
+    @staticmethod
+    def _offset(transfer: Transfer, relative: str) -> int | None:
+        """Return how much of a file reached a local destination."""
+        if remote_host(transfer.destination):
+            return None
+        try:
+            return os.path.getsize(Path(transfer.destination) / relative)
+        except OSError:
+            return None
+
+
+class DeviceManifest:
+    """Inventory of what earlier runs copied to a device, kept on the device itself.
+
+    The manifest lives in `.retro-sync/manifest` under the frontend's
+    destination root as zlib-compressed JSON. For every transfer label it
+    records the destination, the level it was copied for and the relative
+    path, size, mtime and, where known, source MD5 of each file. A later run
+    for the same frontend diffs the source listing against it, so only new
+    or changed files are sent and the device is not stat-ed file by file.
+    Files removed from the device by hand are not noticed unless the
+    manifest is not trusted, in which case it is only rewritten.
+    """
+
+    PATH = ".retro-sync/manifest"
+    VERSION = 1
+
+    # Local and remote listings round mtimes differently.
+    _MTIME_TOLERANCE = 0.001
+
+    def __init__(
+        self,
+        frontend: str,
+        destination_dir: str,
+        level: str | None = None,
+        ssh_pool: SshConnectionPool | None = None,
+        trusted: bool = True,
+    ):
+        self._frontend = frontend
+        self._destination_dir = destination_dir
+        self._level = level
+        self._path = str(PurePosixPath(destination_dir) / self.PATH)
+        self._ssh_pool = ssh_pool
+        self._trusted = trusted
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries: dict[str, dict] = self._load()
+
+    def changed_files(
+        self, transfer: Transfer, listing: dict[str, tuple[int, float, str | None]]
+    ) -> list[str] | None:
+        """Return the files of a source listing the device does not hold as recorded.
+
+        Returns None if the manifest cannot tell: it is not trusted, has no
+        entry for the transfer or recorded it for another destination.
+        """
+        with self._lock:
+            entry = self._entries.get(transfer.label)
+        if not self._trusted or entry is None or entry["destination"] != transfer.destination:
+            return None
+        recorded = entry["files"]
+        return sorted(
+            path for path, info in listing.items() if not self._matches(recorded.get(path), info)
+        )
+
+    def record(self, transfer: Transfer, listing: dict[str, tuple[int, float, str | None]]) -> None:
+        """Record that every file of a source listing was copied for a transfer."""
+        with self._lock:
+            self._entries[transfer.label] = {
+                "destination": transfer.destination,
+                "level": self._level,
+                "copied_at": time.time(),
+                "files": {path: list(info) for path, info in sorted(listing.items())},
+            }
+            self._dirty = True
+
+    def save(self) -> None:
+        """Write the manifest to the device if anything was recorded since it was read."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(
+                {
+                    "version": self.VERSION,
+                    "frontend": self._frontend,
+                    "destination_dir": self._destination_dir,
+                    "transfers": self._entries,
+                },
+                separators=(",", ":"),
+            )
+            try:
+                write_device_file(self._path, zlib.compress(data.encode(), 9), self._ssh_pool)
+            except OSError as error:
+                print(f"Could not write device manifest {self._path}: {error}")
+            self._dirty = False
+
+    @classmethod
+    def _matches(cls, recorded: list | None, current: tuple[int, float, str | None]) -> bool:
+        """Return True if a recorded file has the size, mtime and hash of the source file."""
+        if recorded is None:
+            return False
+        size, mtime, digest = recorded
+        if size != current[0] or abs(mtime - current[1]) > cls._MTIME_TOLERANCE:
+            return False
+        return digest is None or current[2] is None or digest == current[2]
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            data = read_device_file(self._path, self._ssh_pool)
+            if not data:
+                return {}
+            manifest = json.loads(zlib.decompress(data))
+            # Another frontend lays the device out differently; start over.
+            if manifest["version"] != self.VERSION or manifest["frontend"] != self._frontend:
+                return {}
+            return manifest["transfers"]
+        except (OSError, ValueError, KeyError, zlib.error) as error:
+            print(f"Ignoring unreadable device manifest {self._path}: {error}")
+            return {}
+
+
+class BiosChecksums:
+    """Known-good BIOS dumps, keyed by file name."""
+
+    def __init__(self, known: dict[str, list[tuple[str, int]]]):
+        self._known = known
+
+    @classmethod
+    def from_yaml(cls, path: str | Path) -> "BiosChecksums":
+        """Load known-good checksums from a YAML file."""
+        with open(path) as f:
+            data = yaml.safe_load(f) or {}
+        known = {
+            str(name): [(entry["md5"].lower(), int(entry["size"])) for entry in entries]
+            for name, entries in data.items()
+        }
+        return cls(known)
+
+    def verify(self, name: str, size: int, md5: str) -> bool | None:
+        """Return True for a known-good dump, False for a bad one, None for an unknown name."""
+        entries = self._known.get(name)
+        if entries is None:
+            return None
+        return (md5.lower(), size) in entries
+
+
+class FileHasher:
+    """Computes MD5 and size of every file under local or remote directories.
+
+    Local files are memory-mapped, or read in chunks where that fails, on a
+    thread pool in their order on disk; hashlib releases the GIL while
+    hashing, so files are hashed in parallel. Remote directories are hashed
+    on their host by the manifest agent, or with md5sum where the host has
+    no python3, over the shared SSH connection, so file contents never cross
+    the network.
+    """
+
+    _CHUNK_SIZE = 1024 * 1024
+    _MAP_WINDOW = 64 * 1024 * 1024
+
+    def __init__(self, ssh_pool: SshConnectionPool | None = None, jobs: int = 4):
+        self._ssh_pool = ssh_pool
+        self._jobs = max(1, jobs)
+        self._agent = ManifestAgent(ssh_pool)
+
+    def hash_directories(self, directories: list[str]) -> dict[str, dict[str, tuple[int, str]]]:
+        """Return, per directory, a mapping of relative file path to (size, md5).
+
+        Directories may be local paths or rsync-style `host:path` locations.
+        Missing directories map to an empty result.
+        """
+        results: dict[str, dict[str, tuple[int, str]]] = {}
+        remote: dict[str, list[str]] = {}
+        for directory in directories:
+            host = remote_host(directory)
+            if host:
+                remote.setdefault(host, []).append(directory)
+            else:
+                results[directory] = self._hash_local(directory)
+
+        for host, host_directories in remote.items():
+            results.update(self._hash_remote(host, host_directories))
+        return results
+
+    def hash_files(self, paths: list[str]) -> dict[str, str]:
+        """Return the MD5 of each readable file by its local path or `host:path` location."""
+        results: dict[str, str] = {}
+        local: list[str] = []
+        remote: dict[str, list[str]] = {}
+        for path in paths:
+            host = remote_host(path)
+            if host:
+                remote.setdefault(host, []).append(path.partition(":")[2])
+            else:
+                local.append(path)
+
+        local = disk_order(local)
+        with ThreadPoolExecutor(max_workers=self._jobs) as executor:
+            for path, hashed in zip(local, executor.map(self._hash_local_file, local)):
+                if hashed is not None:
+                    results[path] = hashed[1]
+
+        # The paths go over stdin and come back NUL-separated as "md5 path".
+        per_file = 'for f; do printf "%s %s\\0" "$(md5sum < "$f" | cut -c1-32)" "$f"; done'
+        for host, host_paths in remote.items():
+            ssh = self._ssh_pool.ssh_command(host) if self._ssh_pool else ["ssh"]
+            result = subprocess.run(
+                [*ssh, host, f"xargs -0 -r -P {self._jobs} sh -c {shlex.quote(per_file)} sh"],
+                check=False,
+                input="\0".join(host_paths).encode(errors="surrogateescape"),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+            for record in result.stdout.decode(errors="surrogateescape").split("\0"):
+                md5, _, path = record.partition(" ")
+                if md5 and path:
+                    results[f"{host}:{path}"] = md5
+        return results
+
+    def _hash_local(self, directory: str) -> dict[str, tuple[int, str]]:
+        """Hash every file under a local directory on the thread pool."""
+        paths: list[str] = []
+        for root, _, files in os.walk(directory):
+            paths.extend(os.path.join(root, name) for name in files if name != ".DS_Store")
+        paths = disk_order(paths)
+
+        with ThreadPoolExecutor(max_workers=self._jobs) as executor:
+            hashed = executor.map(self._hash_local_file, paths)
+            return {
+                os.path.relpath(path, directory): result
+                for path, result in zip(paths, hashed)
+                if result is not None
+            }
+
+    def _hash_local_file(self, path: str) -> tuple[int, str] | None:
+        """Return (size, md5) of a local file, memory-mapping it where possible."""
+        digest = hashlib.md5()
+        size = 0
+        try:
+            with open(path, "rb") as f:
+                try:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        if hasattr(mapped, "madvise"):
+                            mapped.madvise(mmap.MADV_SEQUENTIAL)
+                        with memoryview(mapped) as view:
+                            for start in range(0, len(view), self._MAP_WINDOW):
+                                digest.update(view[start:start + self._MAP_WINDOW])
+                        return len(mapped), digest.hexdigest()
+                except (OSError, ValueError):
+                    # Empty files and some network or FUSE filesystems cannot be mapped.
+                    pass
+                while chunk := f.read(self._CHUNK_SIZE):
+                    digest.update(chunk)
+                    size += len(chunk)
+        except OSError:
+            return None
+        return size, digest.hexdigest()
+
+    def _hash_remote(
+        self, host: str, directories: list[str]
+    ) -> dict[str, dict[str, tuple[int, str]]]:
+        """Hash directories on a remote host with the manifest agent in one round trip."""
+        paths = [directory.partition(":")[2] for directory in directories]
+        listings = self._agent.scan(host, paths, hashes=True, jobs=self._jobs)
+        if listings is None:
+            return self._hash_remote_shell(host, directories)
+
+        results: dict[str, dict[str, tuple[int, str]]] = {}
+        for directory, path in zip(directories, paths):
+            listing = listings.get(path) or DirectoryListing(path)
+            results[directory] = {
+                os.path.relpath(file, path): (size, md5)
+                for file, (size, _, md5) in listing.files.items()
+                if md5 and PurePosixPath(file).name != ".DS_Store"
+            }
+        return results
+
+    def _hash_remote_shell(
+        self, host: str, directories: list[str]
+    ) -> dict[str, dict[str, tuple[int, str]]]:
+        """Hash directories on a remote host without python3 in one round trip.
+
+        The output is NUL-separated: a directory name, one "size md5 path"
+        record per file, then an empty record.
+        """
+        per_file = (
+            'for f; do printf "%s %s %s\\0" "$(stat -c %s "$f")" '
+            '"$(md5sum < "$f" | cut -c1-32)" "$f"; done'
+        )
+        script = []
+        for directory in directories:
+            path = directory.partition(":")[2]
+            script.append(
+                f"printf '%s\\0' {shlex.quote(directory)}; "
+                f"(cd {shlex.quote(path)} 2>/dev/null && "
+                f"find . -type f ! -name .DS_Store -print0 | "
+                f"xargs -0 -r -P {self._jobs} sh -c {shlex.quote(per_file)} sh); "
+                f"printf '\\0'"
+            )
+
+        ssh = self._ssh_pool.ssh_command(host) if self._ssh_pool else ["ssh"]
+        result = subprocess.run(
+            [*ssh, host, "; ".join(script)], check=False, stdout=subprocess.PIPE
+        )
+
+        results: dict[str, dict[str, tuple[int, str]]] = {d: {} for d in directories}
+        current: dict[str, tuple[int, str]] | None = None
+        for record in result.stdout.decode(errors="surrogateescape").split("\0"):
+            if current is None:
+                current = results.get(record)
+                continue
+            if not record:
+                current = None
+                continue
+            size, md5, path = record.split(" ", 2)
+            current[os.path.normpath(path)] = (int(size), md5)
+        return results
+
+
+def rsync_stats(
+    files: int, directories: int, transferred: int, total_bytes: int, transferred_bytes: int
+) -> str:
+    """Return the lines of rsync's --stats output that TransferMetrics reads."""
+    return (
+        f"Number of files: {files + directories} (reg: {files}, dir: {directories})\n"
+        f"Number of regular files transferred: {transferred}\n"
+        f"Total file size: {total_bytes} bytes\n"
+        f"Total transferred file size: {transferred_bytes} bytes\n"
+    )
+
+
+# Linux's FS_IOC_FIEMAP ioctl, _IOWR('f', 11, struct fiemap), and its structures.
+_FS_IOC_FIEMAP = 0xC020660B
+_FIEMAP_HEADER = struct.Struct("=QQIIII")
+_FIEMAP_EXTENT = struct.Struct("=QQQ2QI3I")
+
+
+def disk_order(paths: list[str]) -> list[str]:
+    """Return local files sorted by where their data starts on disk.
+
+    The first extent of each file comes from FIEMAP where the filesystem
+    reports extents; other files follow in inode order, which most
+    filesystems allocate in the order files were written. Reading a
+    directory of small ROMs in this order instead of by name keeps a
+    spinning disk from seeking back and forth.
+    """
+    fiemap = len(paths) > 1
+
+    def location(path: str) -> tuple[int, int]:
+        nonlocal fiemap
+        try:
+            info = os.lstat(path)
+        except OSError:
+            return 2, 0
+        if fiemap and stat.S_ISREG(info.st_mode) and info.st_size:
+            request = bytearray(_FIEMAP_HEADER.size + _FIEMAP_EXTENT.size)
+            _FIEMAP_HEADER.pack_into(request, 0, 0, 2**64 - 1, 0, 0, 1, 0)
+            try:
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    fcntl.ioctl(fd, _FS_IOC_FIEMAP, request)
+                finally:
+                    os.close(fd)
+            except OSError as error:
+                # Network filesystems have no extents; stop asking.
+                if error.errno in (errno.ENOTTY, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL):
+                    fiemap = False
+            else:
+                if _FIEMAP_HEADER.unpack_from(request)[3]:
+                    return 0, _FIEMAP_EXTENT.unpack_from(request, _FIEMAP_HEADER.size)[1]
+        return 1, info.st_ino
+
+    return sorted(paths, key=location)
+
+
+class LocalCopyEngine:
+    """Copies directory trees between local filesystems without starting rsync.
+
+    Each file is cloned where the filesystem supports reflinks and otherwise
+    copied inside the kernel with copy_file_range or sendfile, falling back
+    to plain reads and writes. It is written under a temporary name next to
+    its destination and renamed into place, so a device never holds a
+    half-written ROM under its real name. Files are read in their order on
+    the source disk, and small ones are read ahead whole. Like the rsync
+    runs it replaces, it skips .DS_Store files and never deletes anything at
+    the destination. A file already at the destination is left alone if its
+    size matches and, unless `size_only` is set, so does its modification
+    time. Up to `threads` files are copied at once.
+
+    The output mimics rsync's: the files copied, then the --stats lines
+    that TransferMetrics reads.
+    """
+
+    # Linux's FICLONE ioctl, _IOW(0x94, 9, int).
+    FICLONE = 0x40049409
+    _CHUNK = 8 * 1024 * 1024
+    # FAT stores modification times in two-second steps.
+    _MODIFY_WINDOW_NS = 2_000_000_000
+    # Larger files only get the sequential hint, not a read-ahead of the whole file.
+    _READ_AHEAD_LIMIT = 16 * 1024 * 1024
+
+    def __init__(self, threads: int = 4, size_only: bool = True):
+        self._threads = max(1, threads)
+        self._size_only = size_only
+
+    @staticmethod
+    def handles(transfer: "Transfer | TransferBatch") -> bool:
+        """Return True if a transfer is between local paths and needs nothing only rsync can do."""
+        if not isinstance(transfer, Transfer):
+            return False
+        if remote_host(transfer.source) or remote_host(transfer.destination):
+            return False
+        # A hand-written --files-from list may use rsync's `dir/./file` syntax.
+        return transfer.files_from is None or transfer.files is not None
+
+    def copy(
+        self,
+        source: str,
+        destination: str,
+        files: list[str] | None = None,
+        log: Callable[[str], None] | None = None,
+        cancelled: threading.Event | None = None,
+    ) -> CommandResult:
+        """Copy a source directory, or only the listed files in it, and return rsync-style output.
+
+        As with rsync, a source ending in a slash has its contents copied
+        into the destination; otherwise the directory itself is.
+        """
+        cancelled = cancelled or threading.Event()
+        source_root = Path(source)
+        destination_root = Path(destination)
+        if not source.endswith("/"):
+            destination_root /= source_root.name
+
+        directories, entries = self._entries(source_root, files)
+        locations = {str(source_root / relative): relative for relative in entries}
+        entries = [locations[path] for path in disk_order(list(locations))]
+        copied: list[str] = []
+        errors: list[str] = []
+        total = copied_bytes = 0
+        try:
+            for relative in directories:
+                (destination_root / relative).mkdir(parents=True, exist_ok=True)
+        except OSError as error:
+            errors.append(f"copy: {destination_root}: {error.strerror or error}")
+            entries = []
+
+        with ThreadPoolExecutor(max_workers=self._threads) as executor:
+            futures = {
+                executor.submit(
+                    self._copy_file, source_root / relative, destination_root / relative, cancelled
+                ): relative
+                for relative in entries
+            }
+            for future in as_completed(futures):
+                relative = futures[future]
+                try:
+                    size, written = future.result()
+                except OSError as error:
+                    errors.append(f"copy: {relative}: {error.strerror or error}")
+                    continue
+                total += size
+                if written is not None:
+                    copied.append(relative)
+                    copied_bytes += written
+                    if log:
+                        log(relative)
+
+        stats = rsync_stats(len(entries), len(directories), len(copied), total, copied_bytes)
+        # Errors go first so the journal sees the last file copied, as with rsync.
+        output = "".join(f"{line}\n" for line in [*errors, *copied]) + "\n" + stats
+        # rsync's exit code for a partial transfer due to errors.
+        return CommandResult(23 if errors or cancelled.is_set() else 0, output)
+
+    def duplicate(self, original: Path, target: Path) -> None:
+        """Recreate a file under another name on the same filesystem.
+
+        The copy is a hard link where the filesystem has them and otherwise a
+        clone or, on FAT and exFAT, a plain copy. An up-to-date target is
+        left alone.
+        """
+        info = original.stat()
+        with contextlib.suppress(FileNotFoundError):
+            if self._is_up_to_date(info, target.stat()):
+                return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self._temporary_path(target)
+        temporary.unlink(missing_ok=True)
+        try:
+            os.link(original, temporary)
+        except OSError:
+            self._copy_file(original, target, threading.Event())
+            return
+        os.replace(temporary, target)
+
+    @staticmethod
+    def _entries(source_root: Path, files: list[str] | None) -> tuple[list[str], list[str]]:
+        """Return the directories to create and the files to copy, relative to the source."""
+        if files is not None:
+            listed = [f for f in files if PurePosixPath(f).name != ".DS_Store"]
+            parents = sorted({str(PurePosixPath(f).parent) for f in listed} - {"."})
+            return [".", *parents], listed
+
+        directories: list[str] = []
+        entries: list[str] = []
+        for current, dirnames, filenames in os.walk(source_root):
+            relative = os.path.relpath(current, source_root)
+            prefix = "" if relative == "." else f"{relative}/"
+            directories.append(relative)
+            # Links to directories are copied as links, as rsync -a does.
+            links = [d for d in dirnames if os.path.islink(os.path.join(current, d))]
+            dirnames[:] = sorted(d for d in dirnames if d not in links)
+            entries.extend(
+                prefix + name for name in sorted([*filenames, *links]) if name != ".DS_Store"
+            )
+        return directories, entries
+
+    def _copy_file(
+        self, source: Path, target: Path, cancelled: threading.Event
+    ) -> tuple[int, int | None]:
+        """Bring one file up to date.
+
+        Returns its size and the bytes written, or None for the bytes if it was unchanged.
+        """
+        info = source.lstat()
+        try:
+            current: os.stat_result | None = target.lstat()
+        except FileNotFoundError:
+            current = None
+
+        temporary = self._temporary_path(target)
+        if stat.S_ISLNK(info.st_mode):
+            link = os.readlink(source)
+            if current and stat.S_ISLNK(current.st_mode) and os.readlink(target) == link:
+                return 0, None
+            temporary.unlink(missing_ok=True)
+            os.symlink(link, temporary)
+            os.replace(temporary, target)
+            return 0, 0
+
+        if current and stat.S_ISREG(current.st_mode) and self._is_up_to_date(info, current):
+            return info.st_size, None
+        if cancelled.is_set():
+            return info.st_size, None
+
+        try:
+            with open(source, "rb") as reader, open(temporary, "wb") as writer:
+                self._advise(reader.fileno(), info.st_size)
+                complete = self._copy_data(
+                    reader.fileno(), writer.fileno(), info.st_size, cancelled
+                )
+            if not complete:
+                temporary.unlink(missing_ok=True)
+                return info.st_size, None
+            with contextlib.suppress(OSError):
+                # FAT cards have no permission bits to set.
+                os.chmod(temporary, stat.S_IMODE(info.st_mode))
+            os.utime(temporary, ns=(info.st_atime_ns, info.st_mtime_ns))
+            os.replace(temporary, target)
+        except BaseException:
+            temporary.unlink(missing_ok=True)
+            raise
+        return info.st_size, info.st_size
+
+    def _copy_data(
+        self, source_fd: int, target_fd: int, size: int, cancelled: threading.Event
+    ) -> bool:
+        """Copy a file's contents with the fastest method available. Returns False if cancelled.
+
+        Raises OSError if fewer than `size` bytes could be read, as when the
+        source is truncated during the copy.
+        """
+        with contextlib.suppress(OSError):
+            fcntl.ioctl(target_fd, self.FICLONE, source_fd)
+            return True
+
+        offset = 0
+        # Fall through to slower methods on filesystems or kernels that refuse one.
+        unsupported = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP)
+        for method in ("copy_file_range", "sendfile"):
+            if not hasattr(os, method):
+                continue
+            try:
+                while offset < size:
+                    if cancelled.is_set():
+                        return False
+                    count = min(self._CHUNK, size - offset)
+                    if method == "copy_file_range":
+                        copied = os.copy_file_range(source_fd, target_fd, count)
+                    else:
+                        copied = os.sendfile(target_fd, source_fd, offset, count)
+                    if copied == 0:
+                        break
+                    offset += copied
+            except OSError as error:
+                if error.errno not in unsupported:
+                    raise
+                continue
+            self._check_complete(offset, size)
+            return True
+
+        os.lseek(source_fd, offset, os.SEEK_SET)
+        os.lseek(target_fd, offset, os.SEEK_SET)
+        while chunk := os.read(source_fd, self._CHUNK):
+            if cancelled.is_set():
+                return False
+            view = memoryview(chunk)
+            while view:
+                view = view[os.write(target_fd, view):]
+            offset += len(chunk)
+        self._check_complete(offset, size)
+        return True
+
+    @staticmethod
+    def _check_complete(copied: int, size: int) -> None:
+        """Raise OSError if a copy stopped short of the size the source had when it was opened."""
+        if copied < size:
+            raise OSError(errno.EIO, f"source ended after {copied} of {size} bytes")
+
+    def _advise(self, fd: int, size: int) -> None:
+        """Tell the kernel a source file is read front to back, and prefetch it if small."""
+        if not hasattr(os, "posix_fadvise"):
+            return
+        with contextlib.suppress(OSError):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            if size <= self._READ_AHEAD_LIMIT:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+
+    def _is_up_to_date(self, source: os.stat_result, target: os.stat_result) -> bool:
+        if source.st_size != target.st_size:
+            return False
+        if self._size_only:
+            return True
+        return abs(source.st_mtime_ns - target.st_mtime_ns) < self._MODIFY_WINDOW_NS
+
+    @staticmethod
+    def _temporary_path(target: Path) -> Path:
+        name = f".{target.name}.part"
+        if len(name.encode()) > 255:
+            name = f".{hashlib.sha1(target.name.encode()).hexdigest()}.part"
+        return target.with_name(name)
+
+
+class BulkSeeder:
+    """Seeds empty ROM directories with a single tar stream instead of rsync.
+
+    On a fresh card rsync's per-file negotiation is pure overhead, so a ROM
+    transfer between a local and a remote end is sent as one tar stream
+    when the source holds at least MIN_FILES files and the destination
+    holds no more than MAX_EXISTING_RATIO as many. The stream is packed in
+    the source directory and unpacked in the frontend's ROM directory, so
+    it lands under the frontend's names. tar packs an explicit list of
+    members given on stdin: the directories, then the files in their order
+    on disk, located by the manifest agent on a remote source, so a
+    spinning-disk NAS streams them without seeking back and forth. Later
+    runs find the directory populated and go back to rsync. Transfers
+    between local directories are left to the native copy engine.
+    """
+
+    MIN_FILES = 50
+    MAX_EXISTING_RATIO = 0.05
+
+    def __init__(self, ssh_pool: SshConnectionPool | None = None):
+        self._ssh_pool = ssh_pool
+        self._agent = ManifestAgent(ssh_pool)
+        self._members: dict[str, list[str]] = {}
+
+    @staticmethod
+    def applies(transfer: "Transfer | TransferBatch") -> bool:
+        """Return True if a transfer could be seeded: whole ROM directories with one remote end."""
+        if not isinstance(transfer, Transfer) or transfer.stage != Stage.ROMS:
+            return False
+        if transfer.files is not None:
+            return False
+        if bool(remote_host(transfer.source)) == bool(remote_host(transfer.destination)):
+            return False
+        return shutil.which("tar") is not None
+
+    def assess(self, transfer: Transfer) -> tuple[bool, str, int, int]:
+        """Decide whether to seed a transfer with tar.
+
+        Returns the decision, the reason for it and the number of files and
+        bytes in the source.
+        """
+        listing = self._list_source(transfer.source)
+        if listing is None:
+            return False, "could not list the source", 0, 0
+        directories, ordered, size = listing
+        files = len(ordered)
+        prefix = "."
+        if not transfer.source.endswith("/"):
+            prefix = f"./{PurePosixPath(transfer.source).name}"
+        self._members[transfer.source] = [
+            prefix if path == "." else f"{prefix}/{path}" for path in [*directories, *ordered]
+        ]
+        if files < self.MIN_FILES:
+            return False, f"only {files} files", files, size
+
+        allowed = int(files * self.MAX_EXISTING_RATIO)
+        existing = self._count_destination(self._destination_dir(transfer), allowed + 1)
+        if existing is None or existing > allowed:
+            return False, "destination already populated", files, size
+        state = "destination empty" if existing == 0 else f"destination has {existing} files"
+        return True, f"{files} files, {state}", files, size
+
+    def commands(self, transfer: Transfer, display: bool = False) -> tuple[list[str], list[str]]:
+        """Return the commands that pack the source and unpack it at the destination.
+
+        The packing tar reads its members from stdin; see `members`. With
+        `display` the ssh options are left out, for printing.
+        """
+        source = transfer.source.rstrip("/")
+        if transfer.source.endswith("/"):
+            source_dir = source
+        else:
+            source_dir = str(PurePosixPath(source).parent)
+        destination = transfer.destination.rstrip("/")
+
+        pack = [
+            "tar", "-cf", "-", "--no-recursion", "-C", self._path(source_dir), "--null", "-T", "-",
+        ]
+        # -o: keep the receiving user's ownership, as the devices have no matching users.
+        unpack = ["tar", "-x", "-o", "-v", "-f", "-", "-C", self._path(destination)]
+        source_host = remote_host(source)
+        destination_host = remote_host(destination)
+        pool = None if display else self._ssh_pool
+        if source_host:
+            ssh = pool.ssh_command(source_host) if pool else ["ssh"]
+            return [*ssh, source_host, shlex.join(pack)], unpack
+        assert destination_host
+        ssh = pool.ssh_command(destination_host) if pool else ["ssh"]
+        make_dir = shlex.join(["mkdir", "-p", self._path(destination)])
+        return pack, [*ssh, destination_host, f"{make_dir} && {shlex.join(unpack)}"]
+
+    def members(self, transfer: Transfer) -> bytes:
+        """Return the NUL-separated list of members for the packing tar of an assessed transfer."""
+        return b"".join(
+            os.fsencode(member) + b"\0" for member in self._members[transfer.source]
+        )
+
+    def _list_source(self, source: str) -> tuple[list[str], list[str], int] | None:
+        """Return the directories and files under a source directory and their total size.
+
+        Paths are relative to the source, directories sorted so parents come
+        first and files in their order on disk.
+        """
+        root = source.rstrip("/")
+        host = remote_host(root)
+        if host:
+            path = root.partition(":")[2]
+            listings = self._agent.scan(host, [path], locations=True)
+            if listings is None:
+                return None
+            listing = listings.get(path) or DirectoryListing(path)
+            files = sorted(
+                (file for file in listing.files if PurePosixPath(file).name != ".DS_Store"),
+                key=lambda file: listing.locations.get(file, (2, 0)),
+            )
+            return (
+                sorted(os.path.relpath(directory, path) for directory in listing.directories),
+                [os.path.relpath(file, path) for file in files],
+                sum(listing.files[file][0] for file in files),
+            )
+
+        directories = []
+        paths = []
+        size = 0
+        for current, _, names in os.walk(root):
+            directories.append(os.path.relpath(current, root))
+            for name in names:
+                if name != ".DS_Store":
+                    with contextlib.suppress(OSError):
+                        size += os.lstat(os.path.join(current, name)).st_size
+                        paths.append(os.path.join(current, name))
+        return (
+            sorted(directories),
+            [os.path.relpath(file, root) for file in disk_order(paths)],
+            size,
+        )
+
+    def _count_destination(self, destination: str, limit: int) -> int | None:
+        """Count the files in a destination directory, stopping at `limit`."""
+        host = remote_host(destination)
+        path = self._path(destination)
+        if host:
+            ssh = self._ssh_pool.ssh_command(host) if self._ssh_pool else ["ssh"]
+            command = f"find {shlex.quote(path)} -type f 2>/dev/null | head -n {limit} | wc -l"
+            result = subprocess.run(
+                [*ssh, host, command], check=False, stdout=subprocess.PIPE, text=True
+            )
+            try:
+                return int(result.stdout.strip())
+            except ValueError:
+                return None
+
+        count = 0
+        for _, _, names in os.walk(path):
+            count += len(names)
+            if count >= limit:
+                return limit
+        return count
+
+    @staticmethod
+    def _destination_dir(transfer: Transfer) -> str:
+        destination = transfer.destination.rstrip("/")
+        if transfer.source.endswith("/"):
+            return destination
+        return f"{destination}/{PurePosixPath(transfer.source.rstrip('/')).name}"
+
+    @staticmethod
+    def _path(location: str) -> str:
+        return location.partition(":")[2] if remote_host(location) else location
+
+
+class Duplicate:
+    """A file recreated on the device from an identical one instead of being sent."""
+
+    def __init__(
+        self, transfer: Transfer, relative: str, size: int, original: str, carrier: str | None
+    ):
+        self.transfer = transfer
+        self.relative = relative
+        self.size = size
+        # Where the identical file is on the device, and the label of the
+        # transfer sending it, or None if an earlier stage already did.
+        self.original = original
+        self.carrier = carrier
+
+    @property
+    def target(self) -> str:
+        """Location of the file on the device."""
+        return f"{self.transfer.destination.rstrip('/')}/{self.relative}"
+
+
+class Deduplicator:
+    """Sends each distinct file to a device once and recreates its duplicates there.
+
+    Only files whose size matches another file being copied, or one already
+    copied in this run, are hashed, at the source: by a thread pool for a
+    local library and by md5sum on the host for a remote one. Of every set
+    of identical files the first is sent and the others are made on the
+    device from it, as hard links, or as clones or plain copies on
+    filesystems without hard links such as FAT and exFAT. A deduplicator
+    remembers what it placed, so every device needs its own.
+    """
+
+    def __init__(
+        self,
+        hasher: FileHasher,
+        ssh_pool: SshConnectionPool | None = None,
+        engine: LocalCopyEngine | None = None,
+    ):
+        self._hasher = hasher
+        self._ssh_pool = ssh_pool
+        self._engine = engine or LocalCopyEngine()
+        # Size -> (source, device location, md5) of files already on the device.
+        self._placed: dict[int, list[tuple[str, str, str | None]]] = {}
+        self._hashes: dict[str, str] = {}
+
+    def plan(
+        self,
+        transfers: list[Transfer],
+        listings: dict[str, dict[str, tuple[int, float, str | None]]],
+    ) -> tuple[list[Transfer], list[Duplicate]]:
+        """Take the duplicates out of a stage's transfers.
+
+        Returns the transfers still to run, without the files that will be
+        recreated on the device, and those files. Hashes computed on the way
+        are filled into the listings.
+        """
+        # (transfer, relative path, size, source location)
+        entries: list[tuple[Transfer, str, int, str]] = []
+        sizes: dict[int, int] = {size: len(placed) for size, placed in self._placed.items()}
+        for transfer in transfers:
+            listing = listings.get(transfer.label)
+            if listing is None:
+                continue
+            for relative in transfer.files if transfer.files is not None else sorted(listing):
+                size = listing[relative][0] if relative in listing else 0
+                if size:
+                    entries.append((transfer, relative, size, transfer.source + relative))
+                    sizes[size] = sizes.get(size, 0) + 1
+
+        entries = [entry for entry in entries if sizes[entry[2]] > 1]
+        for transfer, relative, _, source in entries:
+            known = listings[transfer.label][relative][2]
+            if known:
+                self._hashes[source] = known
+        wanted = {source for _, _, _, source in entries}
+        wanted.update(
+            source for _, source, _ in self._placed_sized(sizes) if source not in self._hashes
+        )
+        self._hashes.update(self._hasher.hash_files(sorted(wanted - self._hashes.keys())))
+
+        originals: dict[tuple[int, str], tuple[str, str | None]] = {}
+        for size, placed in self._placed.items():
+            for source, location, md5 in placed:
+                md5 = md5 or self._hashes.get(source)
+                if md5:
+                    originals.setdefault((size, md5), (location, None))
+
+        duplicates: list[Duplicate] = []
+        for transfer, relative, size, source in entries:
+            md5 = self._hashes.get(source)
+            if not md5:
+                continue
+            listing = listings[transfer.label]
+            listing[relative] = (*listing[relative][:2], md5)
+            target = f"{transfer.destination.rstrip('/')}/{relative}"
+            original = originals.setdefault((size, md5), (target, transfer.label))
+            if original[0] != target:
+                duplicates.append(Duplicate(transfer, relative, size, *original))
+
+        remaining: list[Transfer] = []
+        for transfer in transfers:
+            derived = {d.relative for d in duplicates if d.transfer is transfer}
+            if not derived:
+                remaining.append(transfer)
+                continue
+            files = transfer.files
+            if files is None:
+                files = sorted(listings[transfer.label])
+            files = [f for f in files if f not in derived]
+            if files:
+                remaining.append(
+                    Transfer(
+                        transfer.stage,
+                        transfer.system,
+                        transfer.source,
+                        transfer.destination,
+                        files,
+                    )
+                )
+        return remaining, duplicates
+
+    def link(self, duplicates: list[Duplicate], completed: set[str]) -> set[str]:
+        """Make the duplicates on the device from originals that arrived.
+
+        `completed` holds the labels of the transfers that succeeded. Returns
+        the labels of transfers whose duplicates could not all be made.
+        """
+        failed: set[str] = set()
+        ready: list[Duplicate] = []
+        for duplicate in duplicates:
+            if duplicate.carrier is None or duplicate.carrier in completed:
+                ready.append(duplicate)
+            else:
+                failed.add(duplicate.transfer.label)
+
+        local = [d for d in ready if not remote_host(d.target)]
+        for duplicate in local:
+            try:
+                self._engine.duplicate(Path(duplicate.original), Path(duplicate.target))
+            except OSError as error:
+                print(f"Could not make {duplicate.target} from {duplicate.original}: {error}")
+                failed.add(duplicate.transfer.label)
+
+        remote: dict[str, list[Duplicate]] = {}
+        for duplicate in ready:
+            host = remote_host(duplicate.target)
+            if host:
+                remote.setdefault(host, []).append(duplicate)
+        for host, host_duplicates in remote.items():
+            for duplicate in self._link_remote(host, host_duplicates):
+                print(f"Could not make {duplicate.target} from {duplicate.original} on {host}.")
+                failed.add(duplicate.transfer.label)
+        return failed
+
+    def place(self, transfer: Transfer, listing: dict[str, tuple[int, float, str | None]]) -> None:
+        """Remember the files of a transfer that reached the device, for later stages."""
+        destination = transfer.destination.rstrip("/")
+        for relative, (size, _, md5) in listing.items():
+            if size:
+                self._placed.setdefault(size, []).append(
+                    (transfer.source + relative, f"{destination}/{relative}", md5)
+                )
+
+    def _placed_sized(self, sizes: dict[int, int]) -> Iterator[tuple[str, str, str | None]]:
+        """Yield the placed files whose size collides with another file."""
+        for size, placed in self._placed.items():
+            if sizes.get(size, 0) > 1:
+                yield from placed
+
+    def _link_remote(self, host: str, duplicates: list[Duplicate]) -> list[Duplicate]:
+        """Make duplicates on a remote device in one shell and return those that failed.
+
+        Hard links are tried first, then GNU cp's reflinks, then a plain
+        copy, each written under a temporary name and moved into place.
+        """
+        script = []
+        for duplicate in duplicates:
+            original = duplicate.original.partition(":")[2]
+            target = PurePosixPath(duplicate.target.partition(":")[2])
+            o, t = shlex.quote(original), shlex.quote(str(target))
+            temporary = shlex.quote(str(target.with_name(f".{target.name}.part")))
+            script.append(
+                f'{{ [ "$(stat -c %s {t} 2>/dev/null)" = {duplicate.size} ] || '
+                f"{{ mkdir -p {shlex.quote(str(target.parent))} && "
+                f"{{ ln -f {o} {temporary} 2>/dev/null || "
+                f"cp --reflink=auto -p {o} {temporary} 2>/dev/null || cp -p {o} {temporary}; }} && "
+                f"mv -f {temporary} {t}; }} || printf '%s\\0' {t}; }}"
+            )
+
+        ssh = self._ssh_pool.ssh_command(host) if self._ssh_pool else ["ssh"]
+        result = subprocess.run(
+            [*ssh, host, "sh"],
+            check=False,
+            input="\n".join(script).encode(errors="surrogateescape"),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        if result.returncode != 0:
+            return duplicates
+        failed = set(result.stdout.decode(errors="surrogateescape").split("\0"))
+        return [d for d in duplicates if d.target.partition(":")[2] in failed]
+
+
+class BiosPlan:
+    """Deduplicated, verified BIOS transfers for one frontend.
+
+    All BIOS transfers that share a destination directory are merged into one
+    rsync that lists every file once. Files whose name and content match
+    across systems are copied once; files that collide with different content
+    keep the first copy that is not a bad dump. Bad dumps are never copied, and
+    files that only have bad dumps are listed in `missing`. Problems are
+    collected in `issues`.
+    """
+
+    def __init__(self):
+        self.transfers: list[TransferBatch] = []
+        self.issues: list[str] = []
+        self.verified = 0
+        self.unverified = 0
+        self.bad = 0
+        self.duplicates = 0
+        self.missing: list[str] = []
+
+    def print_report(self) -> None:
+        """Print a summary of the plan and every issue found."""
+        systems = sum(len(t.transfers) for t in self.transfers)
+        print(
+            f"BIOS plan: {len(self.transfers)} transfers for {systems} systems; "
+            f"{self.verified} verified, {self.unverified} unverified, "
+            f"{self.bad} bad, {self.duplicates} duplicates skipped."
+        )
+        for issue in self.issues:
+            print(f"  {issue}")
+
+
+class FileCopier:
+    """Service for copying BIOS and ROM files to a frontend."""
+
+    def __init__(
+        self,
+        frontend: Frontend,
+        source_config: SourceConfig,
+        dry_run: bool = False,
+        jobs: int = 1,
+        ssh_pool: SshConnectionPool | None = None,
+        batch: bool = False,
+        manifest: LibraryManifest | None = None,
+        output_prefix: str | None = None,
+        bios_checksums: BiosChecksums | None = None,
+        report: RunReport | None = None,
+        transforms: list[DirectoryTransform] | None = None,
+        media_selector: MediaSelector | None = None,
+        prune_media: bool = False,
+        journal: TransferJournal | None = None,
+        runner: CommandRunner | None = None,
+        routing: RoutingTable | None = None,
+        engine: LocalCopyEngine | None = None,
+        seeder: BulkSeeder | None = None,
+        device_manifest: DeviceManifest | None = None,
+        deduplicator: Deduplicator | None = None,
+    ):
+        self._frontend = frontend
+        self._source_config = source_config
+        self._dry_run = dry_run
+        self._jobs = max(1, jobs)
+        self._ssh_pool = ssh_pool
+        self._batch = batch
+        self._manifest = manifest
+        self._output_prefix = output_prefix
+        self._bios_checksums = bios_checksums
+        self._report = report
+        self._transforms = transforms or []
+        self._media_selector = media_selector
+        self._prune_media = prune_media
+        self._journal = journal
+        self._runner = runner or CommandRunner(self._jobs)
+        self._routing = routing
+        self._engine = engine
+        self._seeder = seeder
+        self._device_manifest = device_manifest
+        self._deduplicator = deduplicator
+
+    def copy_bios_files(self, systems: list[System]) -> bool:
+        """Copy BIOS files for the given systems. Returns False if any transfer failed."""
+        return self.run_transfers(self.bios_transfers(systems))
+
+    def copy_rom_files(
+        self, systems: list[System], copy_source_directory: bool = False
+    ) -> bool:
+        """Copy ROM files for the given systems. Returns False if any transfer failed."""
+        return self.run_transfers(self.rom_transfers(systems, copy_source_directory))
+
+    def copy_scraped_media_files(self, systems: list[System]) -> bool:
+        """Copy scraped media files for the given systems. Returns False if any transfer failed."""
+        return self.run_transfers(self.scraped_media_transfers(systems))
+
+    def bios_transfers(self, systems: list[System]) -> list[Transfer]:
+        """Return the BIOS transfers for the given systems."""
+        return self._routing_for(systems).transfers(Stage.BIOS, systems)
+
+    def rom_transfers(
+        self, systems: list[System], copy_source_directory: bool = False
+    ) -> list[Transfer]:
+        """Return the ROM transfers for the given systems."""
+        routing = self._routing_for(systems)
+        for route in routing.skipped(Stage.ROMS, systems):
+            if route.skip_reason == RoutingTable.NO_SOURCE:
+                print(f"No source ROMS for {route.system.value}.")
+            else:
+                print(
+                    f"No destination directory for {route.system.value} on {self._frontend.name}."
+                )
+
+        transfers = routing.transfers(Stage.ROMS, systems)
+        if copy_source_directory:
+            for transfer in transfers:
+                transfer.source = transfer.source.rstrip("/")
+        return transfers
+
+    def scraped_media_transfers(self, systems: list[System]) -> list[Transfer]:
+        """Return the scraped media transfers for the given systems."""
+        return self._routing_for(systems).transfers(Stage.MEDIA, systems)
+
+    def run_transfers(self, transfers: list[Transfer]) -> bool:
+        """Run transfers, skipping unchanged ones and batching the rest if enabled.
+
+        Returns False if any transfer failed.
+        """
+        rom_stems: dict[System, tuple[set[str], set[str]]] = {}
+        if self._media_selector:
+            transfers, rom_stems = self._select_media(transfers)
+
+        if self._journal and self._journal.resume:
+            transfers = self._skip_completed(transfers)
+
+        fingerprints: dict[str, str] = {}
+        if self._manifest:
+            transfers, fingerprints = self._skip_unchanged(transfers)
+
+        listings: dict[str, dict[str, tuple[int, float, str | None]]] = {}
+        if self._device_manifest or self._deduplicator:
+            listings = self._source_listings(transfers)
+        if self._device_manifest:
+            transfers = self._skip_recorded(transfers, listings)
+
+        # Transfers as they were planned against the library, before any conversion.
+        planned = {transfer.label: transfer for transfer in transfers}
+        converted: set[str] = set()
+        if self._transforms:
+            transfers = self._apply_transforms(transfers)
+            converted = {t.label for t in transfers if t.source != planned[t.label].source}
+
+        duplicates: list[Duplicate] = []
+        # Verified BIOS transfers pick their own files from whole directories.
+        verifying = self._bios_checksums and transfers and transfers[0].stage == Stage.BIOS
+        if self._deduplicator and not verifying:
+            # Converted files no longer match the library listing they would be found by.
+            unconverted = {
+                label: files for label, files in listings.items() if label not in converted
+            }
+            transfers, duplicates = self._deduplicator.plan(transfers, unconverted)
+            self._print_duplicates(duplicates)
+
+        bios_plan = None
+        staging_dir = tempfile.mkdtemp(prefix="retro-batch-")
+        try:
+            if verifying:
+                bios_plan = self.plan_bios(transfers, staging_dir)
+                bios_plan.print_report()
+                runnable: list[Transfer | TransferBatch] = list(bios_plan.transfers)
+            else:
+                runnable = self._plan_runnable(transfers, staging_dir)
+            results = self._run_pool(runnable)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+        if self._prune_media and rom_stems:
+            self._prune_orphaned_media(runnable, results, rom_stems)
+
+        if self._manifest and not self._dry_run:
+            for item, code in zip(runnable, results):
+                if code != 0:
+                    continue
+                members = item.transfers if isinstance(item, TransferBatch) else [item]
+                for transfer in members:
+                    source = planned.get(transfer.label, transfer).source
+                    fingerprint = fingerprints.get(source)
+                    if fingerprint:
+                        self._manifest.mark_synced(source, transfer.destination, fingerprint)
+
+        completed = {
+            member.label
+            for item, code in zip(runnable, results)
+            if code == 0
+            for member in (item.transfers if isinstance(item, TransferBatch) else [item])
+        }
+        failed_links: set[str] = set()
+        if duplicates and not self._dry_run:
+            assert self._deduplicator
+            # Transfers made up entirely of duplicates never ran.
+            completed |= {d.transfer.label for d in duplicates} - {t.label for t in transfers}
+            failed_links = self._deduplicator.link(duplicates, completed)
+            completed -= failed_links
+            linked = [d for d in duplicates if d.transfer.label in completed]
+            if self._report and linked:
+                self._report.add_deduplicated(
+                    duplicates[0].transfer.stage, len(linked), sum(d.size for d in linked)
+                )
+
+        for label in completed:
+            if label not in planned or label not in listings or self._dry_run:
+                continue
+            if self._deduplicator and label not in converted:
+                self._deduplicator.place(planned[label], listings[label])
+            if self._device_manifest:
+                self._device_manifest.record(planned[label], listings[label])
+        if self._device_manifest and not self._dry_run:
+            self._device_manifest.save()
+
+        succeeded = self._report_failures(runnable, results) and not failed_links
+        if bios_plan and bios_plan.missing:
+            for path in bios_plan.missing:
+                print(f"Not copied, only bad dumps found: {path}")
+            return False
+        return succeeded
+
+    def _routing_for(self, systems: list[System]) -> RoutingTable:
+        """Return the routing table given to this copier, or resolve one for the systems."""
+        return self._routing or RoutingTable.build(self._frontend, self._source_config, systems)
+
+    def _plan_runnable(
+        self, transfers: list[Transfer], staging_dir: str
+    ) -> list[Transfer | TransferBatch]:
+        """Turn one stage's transfers into the rsync runs that will carry them out."""
+        planned: list[Transfer | TransferBatch] = list(transfers)
+        if self._batch and len(transfers) > 1:
+            planned = self._batch_transfers(transfers, staging_dir)
+
+        for index, item in enumerate(planned):
+            if isinstance(item, Transfer) and item.files is not None:
+                item.files_from = str(Path(staging_dir) / f"{item.stage.value}-files-{index}")
+                Path(item.files_from).write_text("".join(f"{path}\n" for path in item.files))
+        return planned
+
+    def plan_bios(self, transfers: list[Transfer], staging_dir: str) -> BiosPlan:
+        """Merge BIOS transfers per destination directory and verify every file.
+
+        Each merged transfer lists `subdir/./file` entries relative to the
+        source BIOS directory, so rsync drops the system subdirectory and
+        every file is sent once to the shared destination.
+        """
+        assert self._bios_checksums
+        plan = BiosPlan()
+        hasher = FileHasher(self._ssh_pool, self._jobs)
+        hashes = hasher.hash_directories([t.source.rstrip("/") for t in transfers])
+
+        groups: dict[str, list[Transfer]] = {}
+        for transfer in transfers:
+            groups.setdefault(transfer.destination, []).append(transfer)
+
+        for destination, members in groups.items():
+            # relative path -> (transfer, md5, known good)
+            chosen: dict[str, tuple[Transfer, str, bool | None]] = {}
+            rejected: set[str] = set()
+            for transfer in members:
+                for relative, (size, md5) in sorted(hashes[transfer.source.rstrip("/")].items()):
+                    source_file = f"{transfer.source}{relative}"
+                    status = self._bios_checksums.verify(PurePosixPath(relative).name, size, md5)
+                    if status is False:
+                        plan.bad += 1
+                        plan.issues.append(
+                            f"Bad dump: {source_file} (md5 {md5}, {size} bytes), not copied"
+                        )
+                        rejected.add(relative)
+                        continue
+
+                    existing = chosen.get(relative)
+                    if existing is None:
+                        chosen[relative] = (transfer, md5, status)
+                        continue
+
+                    # Copies of one name are either all checked or all unknown,
+                    # and bad dumps never get here, so the first copy is kept.
+                    plan.duplicates += 1
+                    kept, kept_md5, _ = existing
+                    if kept_md5 == md5:
+                        plan.issues.append(
+                            f"Duplicate: {relative} in {kept.system.value} and "
+                            f"{transfer.system.value} (identical, copied once)"
+                        )
+                    else:
+                        plan.issues.append(
+                            f"Conflict: {relative} differs between {kept.system.value} and "
+                            f"{transfer.system.value}; using {kept.system.value}"
+                        )
+
+            plan.missing.extend(
+                f"{destination.rstrip('/')}/{relative}"
+                for relative in sorted(rejected - set(chosen))
+            )
+            if not chosen:
+                continue
+
+            for _, _, status in chosen.values():
+                if status is None:
+                    plan.unverified += 1
+                elif status:
+                    plan.verified += 1
+
+            index = len(plan.transfers) + 1
+            files_from = Path(staging_dir) / f"bios-{index}-files-from"
+            files_from.write_text(
+                "".join(
+                    f"{self._source_config.bios_subdirs[transfer.system]}/./{relative}\n"
+                    for relative, (transfer, _, _) in chosen.items()
+                )
+            )
+            plan.transfers.append(
+                TransferBatch(
+                    Stage.BIOS,
+                    index,
+                    members,
+                    self._source_config.bios_dir + "/",
+                    destination,
+                    str(files_from),
+                    [],
+                )
+            )
+
+        return plan
+
+    def _apply_transforms(self, transfers: list[Transfer]) -> list[Transfer]:
+        """Point transfers at converted copies of their sources where a transform applies."""
+        converted: list[Transfer] = []
+        for transfer in transfers:
+            transform = next(
+                (
+                    t
+                    for t in self._transforms
+                    if t.stage == transfer.stage and t.applies(self._frontend, transfer.system)
+                ),
+                None,
+            )
+            if not transform:
+                converted.append(transfer)
+                continue
+
+            host = remote_host(transfer.source)
+            if host:
+                print(f"Not converting {transfer.label}: the source is on {host}.")
+                converted.append(transfer)
+                continue
+
+            result = transform.transform(
+                self._frontend, transfer.system, transfer.source, transfer.files
+            )
+            if not result:
+                print(f"Not converting {transfer.label}: some files could not be converted.")
+                converted.append(transfer)
+                continue
+
+            source_dir, files = result
+            if transfer.source.endswith("/"):
+                source_dir += "/"
+            converted.append(
+                Transfer(transfer.stage, transfer.system, source_dir, transfer.destination, files)
+            )
+        return converted
+
+    def _select_media(
+        self, transfers: list[Transfer]
+    ) -> tuple[list[Transfer], dict[System, tuple[set[str], set[str]]]]:
+        """Restrict media transfers to the media of the ROMs being copied.
+
+        Returns the transfers and, for each system whose media was selected,
+        its media type folders and ROM names.
+        """
+        assert self._media_selector
+        selected: list[Transfer] = []
+        rom_stems: dict[System, tuple[set[str], set[str]]] = {}
+        for transfer in transfers:
+            stems = None
+            if transfer.stage == Stage.MEDIA:
+                stems = self._media_selector.rom_stems(transfer.system)
+            if stems is None:
+                selected.append(transfer)
+                continue
+
+            files, skipped = self._media_selector.select(stems, transfer.source)
+            print(
+                f"Selected {len(files)} media files for {len(stems)} ROMs in {transfer.label}; "
+                f"skipping {len(skipped)} for ROMs not being copied."
+            )
+            media_dirs = {path.split("/", 1)[0] for path in files + skipped if "/" in path}
+            rom_stems[transfer.system] = (media_dirs, stems)
+            selected.append(
+                Transfer(
+                    transfer.stage, transfer.system, transfer.source, transfer.destination, files
+                )
+            )
+        return selected, rom_stems
+
+    def _prune_orphaned_media(
+        self,
+        runnable: list[Transfer | TransferBatch],
+        results: list[int],
+        rom_stems: dict[System, tuple[set[str], set[str]]],
+    ) -> None:
+        """Delete destination media of ROMs no longer copied, after successful media transfers."""
+        assert self._media_selector
+        for item, code in zip(runnable, results):
+            if code != 0:
+                continue
+            members = item.transfers if isinstance(item, TransferBatch) else [item]
+            for transfer in members:
+                if transfer.stage != Stage.MEDIA or transfer.system not in rom_stems:
+                    continue
+                media_dirs, stems = rom_stems[transfer.system]
+                removed = self._media_selector.prune(transfer.destination, media_dirs, stems)
+                if removed:
+                    print(f"Pruned {removed} orphaned media files from {transfer.label}.")
+
+    def _skip_completed(self, transfers: list[Transfer]) -> list[Transfer]:
+        """Drop transfers the journal of an interrupted run records as completed."""
+        assert self._journal
+        remaining: list[Transfer] = []
+        for transfer in transfers:
+            if self._journal.is_completed(transfer):
+                print(f"Skipping {transfer.label}: completed before the interruption.")
+                continue
+            if self._journal.is_interrupted(transfer):
+                print(f"Resuming {self._journal.describe(transfer)}.")
+            remaining.append(transfer)
+        return remaining
+
+    def _skip_unchanged(
+        self, transfers: list[Transfer]
+    ) -> tuple[list[Transfer], dict[str, str]]:
+        """Drop transfers whose source is unchanged since it was last synced to the destination.
+
+        Returns the remaining transfers and the current fingerprint of every source.
+        """
+        assert self._manifest
+        self._manifest.refresh([t.source for t in transfers])
+
+        remaining: list[Transfer] = []
+        fingerprints: dict[str, str] = {}
+        for transfer in transfers:
+            fingerprint = self._manifest.fingerprint(transfer.source)
+            if fingerprint and transfer.files is not None:
+                # A different selection from the same source is a different transfer.
+                selection = "\n".join(transfer.files)
+                fingerprint = hashlib.sha1(f"{fingerprint}\n{selection}".encode()).hexdigest()
+            if fingerprint:
+                fingerprints[transfer.source] = fingerprint
+
+            # A local destination that disappeared (e.g. a reformatted card)
+            # always needs a fresh copy.
+            destination_present = remote_host(transfer.destination) or os.path.isdir(
+                transfer.destination
+            )
+            if (
+                fingerprint
+                and destination_present
+                and self._manifest.is_synced(transfer.source, transfer.destination, fingerprint)
+            ):
+                print(f"Skipping {transfer.label}: unchanged since last sync.")
+                continue
+            remaining.append(transfer)
+
+        return remaining, fingerprints
+
+    def _skip_recorded(
+        self,
+        transfers: list[Transfer],
+        listings: dict[str, dict[str, tuple[int, float, str | None]]],
+    ) -> list[Transfer]:
+        """Narrow transfers to the files the device manifest does not record as copied."""
+        assert self._device_manifest
+        remaining: list[Transfer] = []
+        for transfer in transfers:
+            listing = listings.get(transfer.label)
+            changed = None
+            if listing is not None:
+                changed = self._device_manifest.changed_files(transfer, listing)
+            if listing is None or changed is None:
+                remaining.append(transfer)
+            elif not changed:
+                print(f"Skipping {transfer.label}: the device manifest lists every file.")
+            else:
+                print(
+                    f"{transfer.label}: {len(changed)} of {len(listing)} files changed "
+                    "since the last copy."
+                )
+                remaining.append(
+                    Transfer(
+                        transfer.stage,
+                        transfer.system,
+                        transfer.source,
+                        transfer.destination,
+                        changed,
+                    )
+                )
+        return remaining
+
+    def _source_listings(
+        self, transfers: list[Transfer]
+    ) -> dict[str, dict[str, tuple[int, float, str | None]]]:
+        """Return the files each transfer copies by relative path, keyed by label.
+
+        Files come from the library manifest if there is one, or else from
+        the manifest agent, one run per host. Transfers that copy the source
+        directory itself and sources that could not be listed are left out.
+        """
+        sources = {t.label: t.source for t in transfers if t.source.endswith("/")}
+        listings: dict[str, dict[str, tuple[int, float, str | None]] | None]
+        if self._manifest:
+            listings = {label: self._manifest.files(source) for label, source in sources.items()}
+        else:
+            listings = dict(self._agent_listings(sources))
+
+        selected: dict[str, dict[str, tuple[int, float, str | None]]] = {}
+        for transfer in transfers:
+            listing = listings.get(transfer.label)
+            if listing is not None and transfer.files is not None:
+                listing = {path: listing[path] for path in transfer.files if path in listing}
+            if listing is not None:
+                selected[transfer.label] = listing
+        return selected
+
+    def _agent_listings(
+        self, sources: dict[str, str]
+    ) -> dict[str, dict[str, tuple[int, float, str | None]]]:
+        """List source directories, keyed by label, with the manifest agent."""
+        roots: dict[str | None, set[str]] = {}
+        for source in sources.values():
+            host = remote_host(source)
+            path = source.partition(":")[2] if host else source
+            roots.setdefault(host, set()).add(path.rstrip("/"))
+        agent = ManifestAgent(self._ssh_pool)
+        scans = {host: agent.scan(host, sorted(paths)) for host, paths in roots.items()}
+
+        listings = {}
+        for label, source in sources.items():
+            host = remote_host(source)
+            root = (source.partition(":")[2] if host else source).rstrip("/")
+            directory = (scans[host] or {}).get(root)
+            if directory is None:
+                continue
+            listings[label] = {
+                path[len(root) + 1:]: info
+                for path, info in directory.files.items()
+                if PurePosixPath(path).name != ".DS_Store"
+            }
+        return listings
+
+    def _run_pool(self, transfers: list[Transfer | TransferBatch]) -> list[int]:
+        """Run transfers on the command runner and return their exit codes.
+
+        With a single worker rsync writes straight to the terminal. With more
+        workers, or when an output prefix is set because other copiers run at
+        the same time, each transfer's output is buffered and printed as one
+        block when it finishes, so output from different systems never
+        interleaves.
+        """
+        if not self._output_prefix and (self._jobs == 1 or len(transfers) <= 1):
+            labels: list[str | None] = [None] * len(transfers)
+        else:
+            prefix = f"{self._output_prefix} " if self._output_prefix else ""
+            labels = [prefix + t.label for t in transfers]
+
+        try:
+            return self._runner.run_all(
+                [functools.partial(self._rsync, t, label) for t, label in zip(transfers, labels)]
+            )
+        finally:
+            if self._journal:
+                self._journal.flush()
+
+    def _batch_transfers(
+        self, transfers: list[Transfer], staging_dir: str
+    ) -> list[Transfer | TransferBatch]:
+        """Group transfers that share a source or destination parent into batches.
+
+        rsync cannot rename directories, so each batch gets a staging directory
+        of symlinks that maps source subdirectory names to frontend directory
+        names. When the destination is local the links sit on the receiving
+        side and point at the frontend directories (followed with
+        --keep-dirlinks); when only the source is local they sit on the
+        sending side and point at the source directories (followed with
+        --copy-dirlinks).
+        """
+        stage = transfers[0].stage
+        if not remote_host(transfers[0].destination):
+            link_side, dirlinks_option = "destination", "--keep-dirlinks"
+        elif not remote_host(transfers[0].source):
+            link_side, dirlinks_option = "source", "--copy-dirlinks"
+        else:
+            return list(transfers)
+
+        # The symlinks sit on `link_side`; transfers are grouped by the parent
+        # on the other side and a link name may only appear once per batch.
+        groups: dict[str, list[dict[str, Transfer]]] = {}
+        for transfer in transfers:
+            source_path = PurePosixPath(transfer.source.rstrip("/"))
+            destination_path = PurePosixPath(transfer.destination.rstrip("/"))
+            if link_side == "destination":
+                parent, name = str(source_path.parent), source_path.name
+            else:
+                parent, name = str(destination_path.parent), destination_path.name
+
+            batches = groups.setdefault(parent, [])
+            batch = next((b for b in batches if name not in b), None)
+            if batch is None:
+                batch = {}
+                batches.append(batch)
+            batch[name] = transfer
+
+        planned: list[Transfer | TransferBatch] = []
+        for parent, batches in groups.items():
+            for members in batches:
+                if len(members) == 1:
+                    planned.extend(members.values())
+                    continue
+
+                index = len(planned) + 1
+                batch_dir = Path(staging_dir) / f"{stage.value}-{index}"
+                links_dir = batch_dir / "links"
+                links_dir.mkdir(parents=True)
+                for name, transfer in members.items():
+                    self._link_batch_member(links_dir / name, transfer, link_side)
+
+                files_from = batch_dir / "files-from"
+                files_from.write_text(
+                    "".join(
+                        f"{name}/\n"
+                        if transfer.files is None
+                        else "".join(f"{name}/{path}\n" for path in transfer.files)
+                        for name, transfer in members.items()
+                    )
+                )
+
+                if link_side == "destination":
+                    source, destination = parent + "/", str(links_dir) + "/"
+                else:
+                    source, destination = str(links_dir) + "/", parent + "/"
+
+                planned.append(
+                    TransferBatch(
+                        stage,
+                        index,
+                        list(members.values()),
+                        source,
+                        destination,
+                        str(files_from),
+                        # -a does not imply -r when --files-from is used.
+                        ["-r", dirlinks_option],
+                    )
+                )
+
+        return planned
+
+    def _link_batch_member(self, link: Path, transfer: Transfer, link_side: str) -> None:
+        """Create the staging symlink for one transfer in a batch."""
+        # Without a trailing slash rsync copies the source directory itself
+        # into the destination instead of its contents.
+        copies_directory = not transfer.source.endswith("/")
+        source_name = PurePosixPath(transfer.source.rstrip("/")).name
+
+        if link_side == "destination":
+            target = Path(os.path.abspath(transfer.destination))
+            if copies_directory:
+                target = target / source_name
+            if not self._dry_run:
+                target.mkdir(parents=True, exist_ok=True)
+        else:
+            target = Path(os.path.abspath(transfer.source.rstrip("/")))
+            if copies_directory:
+                link.mkdir()
+                link = link / source_name
+
+        link.symlink_to(target, target_is_directory=True)
+
+    def _report_failures(
+        self, transfers: list[Transfer | TransferBatch], results: list[int]
+    ) -> bool:
+        """Print failed transfers and return True if every transfer succeeded."""
+        failed = [(t, code) for t, code in zip(transfers, results) if code != 0]
+        for transfer, code in failed:
+            print(f"rsync failed for {transfer.label} (exit code {code}).")
+        return not failed
+
+    async def _rsync(self, transfer: Transfer | TransferBatch, label: str | None = None) -> int:
+        """Execute rsync for a transfer, record its metrics and return its exit code.
+
+        Transfers between local paths use the native copy engine instead, if
+        there is one, and ROM directories being seeded a tar stream. If a
+        label is given, output is captured and printed as
+        a single block prefixed with the label instead of streaming to the
+        terminal.
+        """
+        source, destination = transfer.source, transfer.destination
+        flags = "-avP" if label is None else "-av"
+        members = transfer.transfers if isinstance(transfer, TransferBatch) else [transfer]
+        options = transfer.rsync_options
+        if self._journal:
+            # Keep what arrived of an interrupted file, and continue it when resuming.
+            options = [*options, "--partial"]
+            if self._journal.resume and any(self._journal.is_interrupted(t) for t in members):
+                options.append("--append-verify")
+        command_line = " ".join(
+            ["rsync", flags, "--size-only", *options, f'"{source}"', f'"{destination}"']
+        )
+        command = [
+            "rsync", flags, "--size-only", "--stats", "--exclude=.DS_Store",
+            *options, source, destination,
+        ]
+        native = self._engine is not None and self._engine.handles(transfer)
+        if native:
+            command_line = f'copy "{source}" "{destination}"'
+
+        seed = False
+        files = size = 0
+        if self._seeder and not native and self._seeder.applies(transfer):
+            assert isinstance(transfer, Transfer)
+            journal = self._journal
+            resuming = journal and journal.resume and journal.is_interrupted(transfer)
+            if not resuming:
+                seed, reason, files, size = await asyncio.to_thread(self._seeder.assess, transfer)
+                self._print_mode(transfer, "tar stream" if seed else "rsync", reason)
+            if seed:
+                producer, consumer = self._seeder.commands(transfer, display=True)
+                command_line = f"{shlex.join(producer)} | {shlex.join(consumer)}"
+
+        if self._dry_run:
+            if label is None:
+                print(command_line)
+            else:
+                self._print_block(label, command_line)
+            return 0
+
+        if self._ssh_pool:
+            command[1:1] = self._ssh_pool.rsync_options(source, destination)
+
+        start = time.monotonic()
+
+        async def started() -> None:
+            nonlocal start
+            if label is None:
+                print(command_line, flush=True)
+            if self._journal:
+                # The journal may be written over ssh; keep that off the event loop.
+                await asyncio.to_thread(self._journal.start, members)
+            start = time.monotonic()
+
+        if native:
+            assert isinstance(transfer, Transfer)
+            result = await self._copy_natively(transfer, label is None, started)
+        elif seed:
+            assert self._seeder and isinstance(transfer, Transfer)
+            producer, consumer = self._seeder.commands(transfer)
+            member_list = self._seeder.members(transfer)
+            if not remote_host(destination):
+                # Unlike rsync, tar does not create the directory it unpacks into.
+                Path(destination).mkdir(parents=True, exist_ok=True)
+            hosts = [host for host in (remote_host(source), remote_host(destination)) if host]
+            result = await self._runner.run_pipeline(
+                producer,
+                consumer,
+                hosts=hosts,
+                device=CommandRunner.device_of(destination),
+                stream=label is None,
+                input=member_list,
+                on_start=started,
+            )
+            if result.returncode == 0:
+                result.output += "\n" + rsync_stats(files, 0, files, size, size)
+        else:
+            hosts = [host for host in (remote_host(source), remote_host(destination)) if host]
+            result = await self._runner.run(
+                command,
+                hosts=hosts,
+                device=CommandRunner.device_of(destination),
+                stream=label is None,
+                on_start=started,
+            )
+        returncode, output = result.returncode, result.output
+        if label is not None:
+            self._print_block(label, f"{command_line}\n{output}")
+
+        if self._journal:
+            await asyncio.to_thread(self._journal.finish, members, returncode, output)
+        if self._report:
+            self._report.add(
+                TransferMetrics.from_rsync_stats(
+                    transfer.stage,
+                    label or transfer.label,
+                    transfer.systems,
+                    returncode,
+                    time.monotonic() - start,
+                    output,
+                    mode="copy" if native else "tar" if seed else "rsync",
+                )
+            )
+        return returncode
+
+    def _print_duplicates(self, duplicates: list[Duplicate]) -> None:
+        """Report the files of each transfer that will be made on the device instead of sent."""
+        prefix = f"{self._output_prefix} " if self._output_prefix else ""
+        by_label: dict[str, list[Duplicate]] = {}
+        for duplicate in duplicates:
+            by_label.setdefault(duplicate.transfer.label, []).append(duplicate)
+        for label, members in by_label.items():
+            size = human_size(sum(d.size for d in members))
+            print(
+                f"{prefix}{label}: {len(members)} files ({size}) are copies of others; "
+                "making them on the device."
+            )
+
+    def _print_mode(self, transfer: Transfer, mode: str, reason: str) -> None:
+        """Report how a ROM directory is being copied and why."""
+        prefix = f"{self._output_prefix} " if self._output_prefix else ""
+        with _OUTPUT_LOCK:
+            print(f"{prefix}{transfer.label}: {mode} ({reason})", flush=True)
+
+    async def _copy_natively(
+        self, transfer: Transfer, stream: bool, on_start: Callable[[], Awaitable[None]]
+    ) -> CommandResult:
+        """Copy a local transfer with the native engine under the runner's limits."""
+        assert self._engine
+        cancelled = threading.Event()
+        copy = functools.partial(
+            self._engine.copy,
+            transfer.source,
+            transfer.destination,
+            transfer.files,
+            functools.partial(print, flush=True) if stream else None,
+            cancelled,
+        )
+        try:
+            return await self._runner.call(
+                copy, device=CommandRunner.device_of(transfer.destination), on_start=on_start
+            )
+        except asyncio.CancelledError:
+            # The worker thread cannot be cancelled; it stops at the next chunk instead.
+            cancelled.set()
+            raise
+
+    def _print_block(self, label: str, output: str) -> None:
+        """Print a block of output for one transfer without interleaving."""
+        with _OUTPUT_LOCK:
+            print(f"==> {label}")
+            print(output.rstrip("\n"))
+            sys.stdout.flush()
+
+
+class FanOutCopier:
+    """Copies the same systems to several devices, reading each source directory once.
+
+    Every source directory is pulled into a local mirror and then copied from
+    the mirror to each destination that needs it, with one writer per
+    destination. The next directory is pulled while the previous one is being
+    written to the devices. Without an explicit mirror directory each pulled
+    directory is deleted as soon as every destination has it, so the mirror
+    never holds more than two systems at once. BIOS directories are small and
+    are all pulled before any is written, so each destination gets its BIOS
+    files from one run that can verify, merge and batch them.
+    """
+
+    def __init__(
+        self,
+        frontends: list[Frontend],
+        source_config: SourceConfig,
+        mirror_dir: str | None = None,
+        dry_run: bool = False,
+        jobs: int = 1,
+        ssh_pool: SshConnectionPool | None = None,
+        batch: bool = False,
+        manifest: LibraryManifest | None = None,
+        bios_checksums: BiosChecksums | None = None,
+        report: RunReport | None = None,
+        transforms: list[DirectoryTransform] | None = None,
+        media_selector: MediaSelector | None = None,
+        prune_media: bool = False,
+        journals: list[TransferJournal] | None = None,
+        runner: CommandRunner | None = None,
+        engine: LocalCopyEngine | None = None,
+        seeder: BulkSeeder | None = None,
+        device_manifests: list[DeviceManifest] | None = None,
+        deduplicators: list[Deduplicator] | None = None,
+    ):
+        self._frontends = frontends
+        self._source_config = source_config
+        self._mirror_dir = mirror_dir
+        self._dry_run = dry_run
+        self._jobs = jobs
+        self._ssh_pool = ssh_pool
+        self._batch = batch
+        self._manifest = manifest
+        self._bios_checksums = bios_checksums
+        self._report = report
+        self._transforms = transforms
+        self._media_selector = media_selector
+        self._prune_media = prune_media
+        self._journals = journals
+        self._runner = runner
+        self._engine = engine
+        self._seeder = seeder
+        self._device_manifests = device_manifests
+        self._deduplicators = deduplicators
+
+    def copy(self, systems: list[System]) -> bool:
+        """Copy BIOS, ROMs and scraped media for the systems to every destination.
+
+        Returns False if any pull or destination transfer failed.
+        """
+        keep_mirror = self._mirror_dir is not None
+        mirror_dir = self._mirror_dir or tempfile.mkdtemp(prefix="retro-mirror-")
+        mirror_config = self._source_config.mirror(mirror_dir)
+
+        consumers = [
+            FileCopier(
+                frontend,
+                mirror_config,
+                dry_run=self._dry_run,
+                jobs=self._jobs,
+                batch=self._batch,
+                output_prefix=f"[{frontend.name}]",
+                bios_checksums=self._bios_checksums,
+                report=self._report,
+                transforms=self._transforms,
+                media_selector=self._media_selector,
+                prune_media=self._prune_media,
+                journal=self._journals[index] if self._journals else None,
+                runner=self._runner,
+                engine=self._engine,
+                seeder=self._seeder,
+                device_manifest=self._device_manifests[index] if self._device_manifests else None,
+                deduplicator=self._deduplicators[index] if self._deduplicators else None,
+            )
+            for index, frontend in enumerate(self._frontends)
+        ]
+        puller = FileCopier(
+            self._frontends[0],
+            self._source_config,
+            dry_run=self._dry_run,
+            ssh_pool=self._ssh_pool,
+            manifest=self._manifest,
+            output_prefix="[source]",
+            report=self._report,
+            runner=self._runner,
+            engine=self._engine,
+        )
+
+        # Map each mirrored source directory to its pull and to the
+        # destination transfers that read from it, BIOS first.
+        pulls: dict[str, Transfer] = {}
+        deliveries: dict[str, list[tuple[int, Transfer]]] = {}
+        for stage in Stage:
+            for index, consumer in enumerate(consumers):
+                for transfer in self._stage_transfers(consumer, stage, systems):
+                    mirrored = transfer.source.rstrip("/")
+                    if mirrored not in pulls:
+                        pulls[mirrored] = Transfer(
+                            stage,
+                            transfer.system,
+                            self._source_path(mirrored, mirror_config) + "/",
+                            mirrored + "/",
+                        )
+                    deliveries.setdefault(mirrored, []).append((index, transfer))
+
+        writers = [ThreadPoolExecutor(max_workers=1) for _ in consumers]
+        in_flight: deque[tuple[list[str], list[Future[bool]]]] = deque()
+        succeeded = True
+        try:
+            bios_pulled: list[str] = []
+            bios: dict[int, list[Transfer]] = {}
+            for mirrored, pull in pulls.items():
+                if pull.stage != Stage.BIOS:
+                    continue
+                if not self._pull(puller, mirrored, pull):
+                    succeeded = False
+                    continue
+                bios_pulled.append(mirrored)
+                for index, transfer in deliveries[mirrored]:
+                    bios.setdefault(index, []).append(transfer)
+            if bios:
+                futures = [
+                    writers[index].submit(consumers[index].run_transfers, transfers)
+                    for index, transfers in bios.items()
+                ]
+                in_flight.append((bios_pulled, futures))
+
+            for mirrored, pull in pulls.items():
+                if pull.stage == Stage.BIOS:
+                    continue
+                if not self._pull(puller, mirrored, pull):
+                    succeeded = False
+                    continue
+
+                futures = [
+                    writers[index].submit(consumers[index].run_transfers, [transfer])
+                    for index, transfer in deliveries[mirrored]
+                ]
+                in_flight.append(([mirrored], futures))
+                while len(in_flight) > 1:
+                    succeeded = self._finish(*in_flight.popleft(), keep_mirror) and succeeded
+
+            while in_flight:
+                succeeded = self._finish(*in_flight.popleft(), keep_mirror) and succeeded
+        finally:
+            for writer in writers:
+                writer.shutdown()
+            if not keep_mirror:
+                shutil.rmtree(mirror_dir, ignore_errors=True)
+
+        return succeeded
+
+    @staticmethod
+    def _stage_transfers(copier: FileCopier, stage: Stage, systems: list[System]) -> list[Transfer]:
+        """Return a copier's transfers for one stage."""
+        if stage == Stage.BIOS:
+            return copier.bios_transfers(systems)
+        if stage == Stage.ROMS:
+            return copier.rom_transfers(systems)
+        return copier.scraped_media_transfers(systems)
+
+    def _source_path(self, mirrored: str, mirror_config: SourceConfig) -> str:
+        """Return the source location of a directory in the mirror."""
+        roots = [
+            (mirror_config.bios_dir, self._source_config.bios_dir),
+            (mirror_config.roms_dir, self._source_config.roms_dir),
+            (mirror_config.batocera_artwork_dir, self._source_config.batocera_artwork_dir),
+            (mirror_config.esde_artwork_dir, self._source_config.esde_artwork_dir),
+        ]
+        for mirror_root, source_root in roots:
+            relative = os.path.relpath(mirrored, mirror_root)
+            if not relative.startswith(".."):
+                return str(PurePosixPath(source_root) / relative)
+        raise ValueError(f"{mirrored} is not inside the mirror.")
+
+    @staticmethod
+    def _pull(puller: FileCopier, mirrored: str, pull: Transfer) -> bool:
+        """Pull one source directory into the mirror."""
+        # rsync only creates the last directory of the destination.
+        Path(mirrored).parent.mkdir(parents=True, exist_ok=True)
+        return puller.run_transfers([pull])
+
+    @staticmethod
+    def _finish(mirrored: list[str], futures: list[Future[bool]], keep_mirror: bool) -> bool:
+        """Wait for mirrored directories to reach every destination, then drop them if temporary."""
+        succeeded = all(future.result() for future in futures)
+        if not keep_mirror:
+            for directory in mirrored:
+                shutil.rmtree(directory, ignore_errors=True)
+        return succeeded
+
+
+class InotifyWatcher:
+    """Reports which local directory trees changed, using Linux inotify through libc.
+
+    Every directory under each root is watched, and directories created
+    later are added as they appear. If the kernel's event queue overflows,
+    every root is reported as changed. Raises OSError if inotify is
+    unavailable or runs out of watches, so callers can fall back to polling.
+    """
+
+    _IN_ATTRIB = 0x4
+    _IN_CLOSE_WRITE = 0x8
+    _IN_MOVED_FROM = 0x40
+    _IN_MOVED_TO = 0x80
+    _IN_CREATE = 0x100
+    _IN_DELETE = 0x200
+    _IN_DELETE_SELF = 0x400
+    _IN_Q_OVERFLOW = 0x4000
+    _IN_ISDIR = 0x40000000
+    _IN_NONBLOCK = os.O_NONBLOCK
+    _IN_CLOEXEC = os.O_CLOEXEC
+    _MASK = (
+        _IN_CLOSE_WRITE | _IN_ATTRIB | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+        | _IN_DELETE_SELF
+    )
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, roots: list[str]):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(self._IN_NONBLOCK | self._IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._roots = roots
+        self._watches: dict[int, tuple[str, str]] = {}
+        try:
+            for root in roots:
+                for directory, _, _ in os.walk(root):
+                    self._watch(root, directory)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        """Stop watching."""
+        os.close(self._fd)
+
+    def wait(self, timeout: float) -> set[str]:
+        """Wait up to `timeout` seconds for changes and return the roots that changed.
+
+        Raises OSError if a new directory cannot be watched.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed: set[str] = set()
+        # Let a burst of events (e.g. a file being copied in) settle first.
+        time.sleep(1)
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+                offset += self._EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & self._IN_Q_OVERFLOW:
+                    # Events were dropped, so any root may have changed.
+                    changed.update(self._roots)
+                    continue
+                if wd not in self._watches:
+                    continue
+                root, directory = self._watches[wd]
+                changed.add(root)
+                if mask & self._IN_ISDIR and mask & (self._IN_CREATE | self._IN_MOVED_TO):
+                    new_directory = os.path.join(directory, os.fsdecode(name))
+                    for path, _, _ in os.walk(new_directory):
+                        self._watch(root, path)
+        return changed
+
+    def _watch(self, root: str, directory: str) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self._MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"Cannot watch {directory}: {os.strerror(errno)}")
+        self._watches[wd] = (root, directory)
+
+
+class LibraryWatcher:
+    """Keeps registered devices in sync as the source library changes.
+
+    Each device (a frontend and destination) has a queue of the transfers
+    whose source changed since they were last synced to it, worked out from
+    the library manifest. Changes are noticed with inotify for a local
+    library, or by refreshing the manifest every `interval` seconds, which
+    only re-lists directories whose mtime changed. Whenever a device is
+    mounted or reachable its queue is pushed, so only changed systems are
+    ever copied.
+    """
+
+    def __init__(
+        self,
+        frontends: list[Frontend],
+        source_config: SourceConfig,
+        manifest: LibraryManifest,
+        ssh_pool: SshConnectionPool | None = None,
+        jobs: int = 1,
+        interval: float = 300,
+    ):
+        self._source_config = source_config
+        self._manifest = manifest
+        self._ssh_pool = ssh_pool
+        self._interval = interval
+        self._copiers = [
+            FileCopier(
+                frontend,
+                source_config,
+                jobs=jobs,
+                ssh_pool=ssh_pool,
+                manifest=manifest,
+                output_prefix=f"[{frontend.name}]",
+            )
+            for frontend in frontends
+        ]
+        self._frontends = frontends
+
+    def run(self, systems: list[System]) -> None:
+        """Watch and push changes until interrupted."""
+        transfers = [
+            [
+                *copier.bios_transfers(systems),
+                *copier.rom_transfers(systems),
+                *copier.scraped_media_transfers(systems),
+            ]
+            for copier in self._copiers
+        ]
+        sources = sorted({t.source.rstrip("/") for device in transfers for t in device})
+        queues: list[dict[str, Transfer]] = [{} for _ in self._frontends]
+
+        watcher = None
+        if not any(remote_host(source) for source in sources):
+            try:
+                watcher = InotifyWatcher([s for s in sources if os.path.isdir(s)])
+                print(f"Watching {len(sources)} source directories with inotify.")
+            except OSError as error:
+                print(
+                    f"Cannot use inotify ({error}); checking for changes every "
+                    f"{self._interval:.0f}s."
+                )
+        if watcher is None:
+            print(
+                f"Checking {len(sources)} source directories for changes every "
+                f"{self._interval:.0f}s."
+            )
+
+        changed = set(sources)
+        try:
+            while True:
+                if changed:
+                    self._manifest.refresh(sorted(changed))
+                    self._enqueue(changed, transfers, queues)
+                self._push(queues)
+
+                # Each wakeup, with or without changes, also pushes to devices that came back.
+                if watcher:
+                    try:
+                        changed = watcher.wait(self._interval)
+                    except OSError as error:
+                        print(
+                            f"Cannot use inotify ({error}); checking for changes every "
+                            f"{self._interval:.0f}s."
+                        )
+                        watcher.close()
+                        watcher = None
+                        changed = set(sources)
+                else:
+                    time.sleep(self._interval)
+                    changed = set(sources)
+        finally:
+            if watcher:
+                watcher.close()
+
+    def _enqueue(
+        self,
+        changed: set[str],
+        transfers: list[list[Transfer]],
+        queues: list[dict[str, Transfer]],
+    ) -> None:
+        """Queue the transfers from changed sources that a device has not synced yet."""
+        for index, device_transfers in enumerate(transfers):
+            for transfer in device_transfers:
+                if transfer.source.rstrip("/") not in changed:
+                    continue
+                fingerprint = self._manifest.fingerprint(transfer.source)
+                if fingerprint and self._manifest.is_synced(
+                    transfer.source, transfer.destination, fingerprint
+                ):
+                    continue
+                if transfer.label not in queues[index]:
+                    print(f"Queued {transfer.label} for {self._describe(index)}.")
+                queues[index][transfer.label] = transfer
+
+    def _push(self, queues: list[dict[str, Transfer]]) -> None:
+        """Push each available device's queue, keeping whatever did not sync."""
+        for index, queue in enumerate(queues):
+            if not queue or not self._is_available(self._frontends[index]):
+                continue
+            print(f"Pushing {len(queue)} changed transfers to {self._describe(index)}.")
+            pending = list(queue.values())
+            # Stages run in order so BIOS files land before ROMs.
+            for stage in Stage:
+                self._copiers[index].run_transfers([t for t in pending if t.stage == stage])
+            for transfer in pending:
+                fingerprint = self._manifest.fingerprint(transfer.source)
+                if fingerprint and self._manifest.is_synced(
+                    transfer.source, transfer.destination, fingerprint
+                ):
+                    del queue[transfer.label]
+
+    def _is_available(self, frontend: Frontend) -> bool:
+        """Return True if a device is mounted (a non-empty local directory) or reachable by ssh."""
+        destination = frontend.destination_dir
+        host = remote_host(destination)
+        if host:
+            ssh = self._ssh_pool.ssh_command(host) if self._ssh_pool else ["ssh"]
+            result = subprocess.run(
+                [*ssh, "-o", "ConnectTimeout=5", "-o", "BatchMode=yes", host, "true"],
+                check=False,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            return result.returncode == 0
+        # An unmounted card leaves an empty mount point behind; never fill it.
+        try:
+            return any(os.scandir(destination))
+        except OSError:
+            return False
+
+    def _describe(self, index: int) -> str:
+        frontend = self._frontends[index]
+        return f"{frontend.name} at {frontend.destination_dir}"
+
+
+def human_size(size: float) -> str:
+    """Format a byte count the way du --human-readable does."""
+    for unit in ("B", "K", "M", "G", "T"):
+        if abs(size) < 1024 or unit == "T":
+            break
+        size /= 1024
+    if unit != "B" and abs(size) < 10:
+        return f"{size:.1f}{unit}"
+    return f"{size:.0f}{unit}"
+
+
+class SystemFootprint:
+    """Source bytes one system puts on a device, per stage."""
+
+    def __init__(self, system: System):
+        self.system = system
+        self.sizes: dict[Stage, int] = {}
+
+    @property
+    def total(self) -> int:
+        """Total bytes across all stages."""
+        return sum(self.sizes.values())
+
+
+class SizeIndex:
+    """Source directory sizes served from the library manifest.
+
+    Every directory that is asked about is refreshed incrementally first, so
+    only directories that changed since the last call are listed again, with
+    up to `jobs` systems listed in parallel.
+    """
+
+    def __init__(self, manifest: LibraryManifest, source_config: SourceConfig, jobs: int = 8):
+        self._manifest = manifest
+        self._source_config = source_config
+        self._jobs = jobs
+
+    def footprints(
+        self, systems: list[System], frontend: Frontend | None = None
+    ) -> list[SystemFootprint]:
+        """Return the footprint of each system that would put files on a device.
+
+        Without a frontend only source ROM directories are counted. With one,
+        the footprint follows what FileCopier would copy to that frontend:
+        systems it has no ROMs directory for lose their ROMs, and BIOS files
+        and scraped media are added.
+        """
+        if frontend is None:
+            transfers = [
+                Transfer(
+                    Stage.ROMS,
+                    system,
+                    str(PurePosixPath(self._source_config.roms_dir) / subdir) + "/",
+                    "",
+                )
+                for system in systems
+                if (subdir := self._source_config.roms_subdirs.get(system))
+            ]
+        else:
+            copier = FileCopier(frontend, self._source_config)
+            transfers = [
+                *copier.bios_transfers(systems),
+                *copier.rom_transfers(systems),
+                *copier.scraped_media_transfers(systems),
+            ]
+
+        self._manifest.refresh([t.source for t in transfers], self._jobs)
+
+        footprints: dict[System, SystemFootprint] = {}
+        for transfer in transfers:
+            footprint = footprints.setdefault(transfer.system, SystemFootprint(transfer.system))
+            size = self._manifest.total_size(transfer.source)
+            footprint.sizes[transfer.stage] = footprint.sizes.get(transfer.stage, 0) + size
+        return [footprints[system] for system in systems if system in footprints]
+
+
+def parse_size(text: str) -> int:
+    """Parse a size like 128G, 64GB, 500M or 120GiB into bytes.
+
+    Plain suffixes are decimal, the way card capacities are sold; "iB"
+    suffixes are binary.
+    """
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?)(i?)B?\s*", text, re.I)
+    if not match:
+        raise ValueError(f"{text} is not a valid size.")
+    number, unit, binary = match.groups()
+    exponent = " KMGT".index(unit.upper() or " ")
+    return int(float(number) * (1024 if binary else 1000) ** exponent)
+
+
+class CapacityPlanner:
+    """Chooses the systems that fit on a card of a given size.
+
+    Systems are considered level by level, so everything that fits from
+    level 1 is chosen before anything from level 2. Within a level the
+    planner picks the subset with the largest total weight (1 per system
+    unless overridden) that fits in the space left, as a 0/1 knapsack over
+    sizes rounded up to 1/4096 of the budget.
+    """
+
+    _UNITS = 4096
+
+    def __init__(
+        self, footprints: list[SystemFootprint], weights: dict[System, float] | None = None
+    ):
+        self._footprints = footprints
+        self._weights = weights or {}
+
+    def plan(self, budget: int) -> list[SystemFootprint]:
+        """Return the chosen footprints, in level order. Nothing fits a budget of zero or less."""
+        if budget <= 0:
+            return []
+        unit = max(1, -(-budget // self._UNITS))
+        remaining = budget // unit
+        chosen: set[System] = set()
+
+        tiers: dict[int, list[SystemFootprint]] = {}
+        for footprint in self._footprints:
+            if footprint.total and self._weights.get(footprint.system, 1.0) > 0:
+                tier = LevelConfig.first_level(footprint.system) or 99
+                tiers.setdefault(tier, []).append(footprint)
+
+        for tier in sorted(tiers):
+            items = tiers[tier]
+            picked = self._knapsack(
+                [-(-f.total // unit) for f in items],
+                [round(self._weights.get(f.system, 1.0) * 1000) for f in items],
+                remaining,
+            )
+            for index in picked:
+                chosen.add(items[index].system)
+                remaining -= -(-items[index].total // unit)
+
+        return [f for f in self._footprints if f.system in chosen]
+
+    @staticmethod
+    def _knapsack(sizes: list[int], values: list[int], capacity: int) -> list[int]:
+        """Return the indexes of the items with the largest total value that fit."""
+        best = [0] * (capacity + 1)
+        taken = [[False] * (capacity + 1) for _ in sizes]
+        for index, (size, value) in enumerate(zip(sizes, values)):
+            for space in range(capacity, size - 1, -1):
+                if best[space - size] + value > best[space]:
+                    best[space] = best[space - size] + value
+                    taken[index][space] = True
+
+        picked = []
+        space = capacity
+        for index in range(len(sizes) - 1, -1, -1):
+            if taken[index][space]:
+                picked.append(index)
+                space -= sizes[index]
+        return sorted(picked)
+
+
+class RomSizeDisplay:
+    """Utility for displaying ROM directory sizes."""
+
+    @staticmethod
+    def display(
+        systems: list[System],
+        source_config: SourceConfig,
+        size_index: SizeIndex,
+        frontend: Frontend | None = None,
+        device_dir: str | None = None,
+        ssh_pool: SshConnectionPool | None = None,
+    ) -> None:
+        """Display sizes of source ROM directories, or the projected footprint on a frontend."""
+        sorted_systems = sorted(systems, key=lambda s: s.value)
+        footprints = size_index.footprints(sorted_systems, frontend)
+
+        if frontend is None:
+            for footprint in footprints:
+                subdir = source_config.roms_subdirs[footprint.system]
+                path = PurePosixPath(source_config.source_roms_dir) / subdir
+                print(f"{human_size(footprint.total)}\t{path}/")
+            if footprints:
+                print(f"{human_size(sum(f.total for f in footprints))}\ttotal")
+            return
+
+        print(f"{'System':<32} {'ROMs':>8} {'BIOS':>8} {'Media':>8} {'Total':>8}")
+        for footprint in (f for f in footprints if f.total):
+            sizes = [
+                footprint.sizes.get(stage, 0) for stage in (Stage.ROMS, Stage.BIOS, Stage.MEDIA)
+            ]
+            print(
+                f"{footprint.system.value:<32} "
+                + " ".join(f"{human_size(size):>8}" for size in sizes)
+                + f" {human_size(footprint.total):>8}"
+            )
+
+        total = sum(f.total for f in footprints)
+        print(f"{'total on ' + frontend.name:<32} {'':>8} {'':>8} {'':>8} {human_size(total):>8}")
+
+        if device_dir:
+            free = RomSizeDisplay.free_space(device_dir, ssh_pool)
+            if free is None:
+                print(f"Could not read free space on {device_dir}.")
+            elif free >= total:
+                print(
+                    f"Fits: {human_size(free)} free on {device_dir}, "
+                    f"{human_size(free - total)} to spare."
+                )
+            else:
+                print(
+                    f"Does not fit: {human_size(free)} free on {device_dir}, "
+                    f"{human_size(total - free)} short."
+                )
+
+    @staticmethod
+    def free_space(directory: str, ssh_pool: SshConnectionPool | None = None) -> int | None:
+        """Return the free bytes on the filesystem holding a local or `host:path` directory."""
+        host = remote_host(directory)
+        if not host:
+            try:
+                return shutil.disk_usage(directory).free
+            except OSError:
+                return None
+
+        path = directory.partition(":")[2] or "."
+        ssh = ssh_pool.ssh_command(host) if ssh_pool else ["ssh"]
+        runner = CommandRunner()
+        (result,) = runner.run_all(
+            [lambda: runner.run([*ssh, host, shlex.join(["df", "-Pk", path])], hosts=[host])]
+        )
+        lines = result.output.splitlines()
+        if result.returncode != 0 or len(lines) < 2:
+            return None
+        try:
+            return int(lines[-1].split()[3]) * 1024
+        except (IndexError, ValueError):
+            return None
+
+
+class DeviceVerifier:
+    """Checks a provisioned device against the source library, file by file.
+
+    Both sides are hashed at the same time: the source where it lives (on
+    the NAS for a remote library) and the device where it is mounted, so no
+    file contents cross the network. Every source file the copy would have
+    sent is reported as missing, truncated or corrupt if the device's copy
+    is absent, shorter or different. Files only on the device are ignored.
+    """
+
+    PROBLEMS = ("missing", "truncated", "corrupt")
+
+    def __init__(
+        self,
+        frontend: Frontend,
+        source_config: SourceConfig,
+        ssh_pool: SshConnectionPool | None = None,
+        jobs: int = 8,
+    ):
+        self._frontend = frontend
+        self._source_config = source_config
+        self._hasher = FileHasher(ssh_pool, jobs)
+
+    def verify(self, systems: list[System]) -> bool:
+        """Verify the systems, print a per-system report and return True if nothing is wrong."""
+        copier = FileCopier(self._frontend, self._source_config)
+        transfers = [
+            *copier.bios_transfers(systems),
+            *copier.rom_transfers(systems),
+            *copier.scraped_media_transfers(systems),
+        ]
+        sources = sorted({t.source.rstrip("/") for t in transfers})
+        destinations = sorted({t.destination.rstrip("/") for t in transfers})
+
+        print(f"Hashing {len(sources)} source and {len(destinations)} destination directories...")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            source_future = executor.submit(self._hasher.hash_directories, sources)
+            destination_future = executor.submit(self._hasher.hash_directories, destinations)
+            source_hashes = source_future.result()
+            destination_hashes = destination_future.result()
+
+        counts: dict[System, dict[str, int]] = {}
+        problems: dict[System, list[tuple[str, str]]] = {}
+        for transfer in transfers:
+            source_files = source_hashes.get(transfer.source.rstrip("/"), {})
+            destination_files = destination_hashes.get(transfer.destination.rstrip("/"), {})
+            system_counts = counts.setdefault(
+                transfer.system, dict.fromkeys(("ok", *self.PROBLEMS), 0)
+            )
+            for relative, (size, md5) in sorted(source_files.items()):
+                status = self.compare((size, md5), destination_files.get(relative))
+                system_counts[status] += 1
+                if status != "ok":
+                    problems.setdefault(transfer.system, []).append(
+                        (status, f"{transfer.stage.value}: {relative}")
+                    )
+
+        print(f"Verification of {self._frontend.name} at {self._frontend.destination_dir}:")
+        for system, system_counts in counts.items():
+            summary = ", ".join(
+                f"{count} {status}" for status, count in system_counts.items() if count
+            )
+            print(f"  {system.value:<32} {summary or 'no files'}")
+            for status, path in problems.get(system, []):
+                print(f"      {status:<9} {path}")
+
+        totals = {
+            status: sum(c[status] for c in counts.values()) for status in ("ok", *self.PROBLEMS)
+        }
+        print("Checked " + ", ".join(f"{count} {status}" for status, count in totals.items()) + ".")
+        return not any(totals[status] for status in self.PROBLEMS)
+
+    @staticmethod
+    def compare(source: tuple[int, str], destination: tuple[int, str] | None) -> str:
+        """Classify a device file against its source as ok, missing, truncated or corrupt."""
+        if destination is None:
+            return "missing"
+        if destination[0] < source[0]:
+            return "truncated"
+        if destination != source:
+            return "corrupt"
+        return "ok"
+
+
+class FrontendFactory:
+    """Factory for creating frontend instances."""
+
+    _FRONTENDS: dict[str, type[Frontend]] = {
+        "batocera": Batocera,
+        "emudeck": EmuDeck,
+        "esde": EsDe,
+        "knulli": Knulli,
+        "minui": MinUI,
+        "muos": MuOS,
+        "nextui": NextUI,
+        "onion": Onion,
+        "retrodeck": RetroDeck,
+        "rocknix": Rocknix,
+        "spruce": Spruce,
+    }
+
+    @classmethod
+    def create(cls, name: str, destination_dir: str) -> Frontend | None:
+        """Create a frontend instance by name."""
+        frontend_class = cls._FRONTENDS.get(name.lower())
+        if not frontend_class:
+            return None
+        return frontend_class(destination_dir)
+
+    @classmethod
+    def name_of(cls, frontend: Frontend) -> str:
+        """Return the name a frontend instance is created by."""
+        return next(
+            name
+            for name, frontend_class in cls._FRONTENDS.items()
+            if type(frontend) is frontend_class
+        )
+
+    @classmethod
+    def available_frontends(cls) -> list[str]:
+        """Return list of available frontend names."""
+        return list(cls._FRONTENDS.keys())
+
+
+class LevelConfig:
+    """ROM pack level configuration."""
+
+    _LEVEL_1_SYSTEMS: list[System] = [
+        System.ARCADE_FINALBURNNEO,
+        System.PICO_8,
+        System.NEC_TURBOGRAFX_16,
+        System.NEC_TURBOGRAFX_CD,
+        System.NINTENDO_GAME_BOY,
+        System.NINTENDO_GAME_BOY_ADVANCE,
+        System.NINTENDO_GAME_BOY_COLOR,
+        System.NINTENDO_NES,
+        System.NINTENDO_SNES,
+        System.NINTENDO_SUPER_GAME_BOY,
+        System.SEGA_32X,
+        System.SEGA_CD,
+        System.SEGA_GAME_GEAR,
+        System.SEGA_GENESIS,
+        System.SNK_NEO_GEO_POCKET_COLOR,
+    ]
+
+    _LEVEL_2_SYSTEMS: list[System] = _LEVEL_1_SYSTEMS + [
+        System.SONY_PLAYSTATION,
+    ]
+
+    _LEVEL_3_SYSTEMS: list[System] = _LEVEL_2_SYSTEMS + [
+        System.NINTENDO_64,
+        System.SEGA_DREAMCAST,
+        System.SEGA_SATURN,
+        System.SNK_NEO_GEO_CD,
+        System.SONY_PLAYSTATION_PORTABLE,
+    ]
+
+    _LEVEL_4_SYSTEMS: list[System] = _LEVEL_3_SYSTEMS + [
+        System.NINTENDO_GAMECUBE,
+        System.NINTENDO_WII,
+        System.SONY_PLAYSTATION_2,
+    ]
+
+    _LEVEL_5_SYSTEMS: list[System] = _LEVEL_4_SYSTEMS + [
+        System.NINTENDO_SWITCH,
+        System.NINTENDO_WIIU,
+        System.SONY_PLAYSTATION_3,
+    ]
+
+    _LEVELS: dict[str, list[System]] = {
+        "1": _LEVEL_1_SYSTEMS,
+        "2": _LEVEL_2_SYSTEMS,
+        "3": _LEVEL_3_SYSTEMS,
+        "4": _LEVEL_4_SYSTEMS,
+        "5": _LEVEL_5_SYSTEMS,
+    }
+
+    @classmethod
+    def systems_for_level(cls, level: str) -> list[System] | None:
+        """Get systems for a given level."""
+        normalized = level.lower().replace("level-", "").replace("level_", "")
+        return cls._LEVELS.get(normalized)
+
+    @classmethod
+    def is_valid_level(cls, level: str) -> bool:
+        """Check if a level is valid."""
+        normalized = level.lower().replace("level-", "").replace("level_", "")
+        return normalized in cls._LEVELS
+
+    @classmethod
+    def first_level(cls, system: System) -> int | None:
+        """Return the lowest level that includes a system, or None if no level does."""
+        for level, systems in cls._LEVELS.items():
+            if system in systems:
+                return int(level)
+        return None
+
+
+def main() -> int:
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description="Copy BIOS and ROM files to emulation frontends."
+    )
+    parser.add_argument(
+        "destination",
+        type=str,
+        help=f"Destination OS/application ({', '.join(FrontendFactory.available_frontends())}, "
+        "sizes, fanout, watch, plan-capacity, compress, verify, plan, apply)",
+    )
+    parser.add_argument(
+        "destination_dir",
+        type=str,
+        nargs="?",
+        default="",
+        help="Destination root directory (required for all destinations except sizes and fanout), "
+        "or with apply the plan file",
+    )
+    parser.add_argument(
+        "level",
+        type=str,
+        nargs="?",
+        default="",
+        help="ROM pack level (1-5 or level-1 through level-5)",
+    )
+    parser.add_argument(
+        "--systems",
+        default=None,
+        help="Comma-separated systems to copy instead of a level (e.g. from plan-capacity)",
+    )
+    parser.add_argument(
+        "--config",
+        default=str(Path(__file__).parent / "source_config.yaml"),
+        help="Source configuration file (default: source_config.yaml next to this script)",
+    )
+    parser.add_argument(
+        "--local-source",
+        action="store_true",
+        help="Read the source directories from this machine instead of remote_hostname",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of systems to transfer concurrently (default: 1), "
+        "or to size concurrently with sizes (default: 8)",
+    )
+    parser.add_argument(
+        "--host-jobs",
+        type=int,
+        default=None,
+        help="Run at most this many transfers against any one remote host (default: --jobs)",
+    )
+    parser.add_argument(
+        "--device-jobs",
+        type=int,
+        default=None,
+        help="Write at most this many transfers to any one destination device (default: --jobs)",
+    )
+    parser.add_argument(
+        "--use-rsync",
+        action="store_true",
+        help="Copy with rsync even when source and destination are both local",
+    )
+    parser.add_argument(
+        "--no-bulk-seed",
+        action="store_true",
+        help="Use rsync even for empty ROM directories instead of seeding them with one tar stream",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Transfer each stage with as few rsync runs as possible using --files-from",
+    )
+    parser.add_argument(
+        "--manifest",
+        nargs="?",
+        const=str(LibraryManifest.default_path()),
+        default=None,
+        metavar="PATH",
+        help="Index the source library in a SQLite manifest and skip systems unchanged "
+        f"since their last sync (default path: {LibraryManifest.default_path()})",
+    )
+    parser.add_argument(
+        "--rescan",
+        action="store_true",
+        help="Re-list every source directory in the manifest, not just changed ones",
+    )
+    parser.add_argument(
+        "--hash",
+        action="store_true",
+        help="Store MD5 hashes of new or changed local source files in the manifest",
+    )
+
+    parser.add_argument(
+        "--verify-bios",
+        action="store_true",
+        help="Merge BIOS transfers per destination, copy each file once and check "
+        "every file against bios_checksums.yaml; bad dumps are not copied, and fail the "
+        "run if no good copy exists",
+    )
+    parser.add_argument(
+        "--report",
+        default=None,
+        metavar="PATH",
+        help="Write per-transfer metrics (files, bytes, time, MB/s) to a JSON file",
+    )
+    parser.add_argument(
+        "--frontend",
+        default=None,
+        help="With sizes, project the footprint on this frontend (adds BIOS and media, "
+        "drops systems it cannot run); with verify and plan, the frontend on the device",
+    )
+    parser.add_argument(
+        "--device-dir",
+        default=None,
+        help="With sizes and --frontend, compare the footprint with the free space here",
+    )
+    parser.add_argument(
+        "--reserve",
+        default="10%",
+        help="With plan-capacity, space to keep free for saves, as a size or a percentage "
+        "(default: 10%%)",
+    )
+    parser.add_argument(
+        "--weight",
+        action="append",
+        default=[],
+        metavar="SYSTEM=WEIGHT",
+        help="With plan-capacity, how much a system is worth relative to others "
+        "(default: 1; 0 excludes it; repeatable)",
+    )
+    parser.add_argument(
+        "--target",
+        action="append",
+        default=[],
+        metavar="FRONTEND:DIR",
+        help="With the fanout and watch destinations, a device to provision (repeatable)",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=300,
+        help="With the watch destination, seconds between checks for changes and devices "
+        "(default: 300)",
+    )
+    parser.add_argument(
+        "--plan-file",
+        default=None,
+        metavar="PATH",
+        help="With plan, write the routing table here and print a summary "
+        "(default: print it as JSON)",
+    )
+    parser.add_argument(
+        "--mirror-dir",
+        default=None,
+        help="With the fanout destination, keep the local mirror of the source here between runs",
+    )
+    parser.add_argument(
+        "--compress",
+        default=None,
+        metavar="SYSTEMS",
+        help="Comma-separated systems whose cartridge ROMs are zipped into --compress-dir before "
+        "copying (needs a local source or the fanout destination)",
+    )
+    parser.add_argument(
+        "--compress-dir",
+        default=None,
+        help="With the compress destination, where to write the archives "
+        "(default: next to the files)",
+    )
+    parser.add_argument(
+        "--resize-media",
+        action="store_true",
+        help="Shrink and recompress scraped images for the frontend's screen before copying "
+        "(needs Pillow and a local source or the fanout destination)",
+    )
+    parser.add_argument(
+        "--media-size",
+        default=None,
+        metavar="WIDTHxHEIGHT",
+        help="With --resize-media, the size to fit images in instead of the frontend's default",
+    )
+    parser.add_argument(
+        "--media-quality",
+        type=int,
+        default=None,
+        help="With --resize-media, the JPEG/WebP quality (default: the frontend's, or 85)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run: skip systems it completed and append to partial files",
+    )
+    parser.add_argument(
+        "--rescan-device",
+        action="store_true",
+        help="Let rsync check every file on the device instead of trusting the device manifest "
+        "written by earlier runs (it is still rewritten)",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Send identical files once per device and make the other copies there as hard links, "
+        "clones or on-device copies (hashes source files whose sizes match)",
+    )
+    parser.add_argument(
+        "--select-media",
+        action="store_true",
+        help="Only copy scraped media for the ROMs being copied",
+    )
+    parser.add_argument(
+        "--prune-media",
+        action="store_true",
+        help="With --select-media, delete scraped media on the destination for ROMs "
+        "no longer copied",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Where converted files are cached between runs "
+        f"(default: {TransformCache.default_path()})",
+    )
+    parser.add_argument(
+        "--cache-size",
+        default="20G",
+        help="Evict the least recently used converted files beyond this size (default: 20G)",
+    )
+
+    args = parser.parse_args()
+    destination_type = args.destination.lower()
+
+    if args.jobs is not None and args.jobs < 1:
+        print("--jobs must be at least 1.")
+        return 1
+
+    remote_destination = ":" in (args.destination_dir or "")
+    source_config = SourceConfig.from_yaml(
+        args.config, remote_source=not remote_destination and not args.local_source
+    )
+
+    # For sizes, destination_dir is unused; treat it as the level if provided.
+    if destination_type in ("sizes", "rom-sizes", "rom_sizes"):
+        systems = _systems_for_level(args.destination_dir or args.level)
+        if systems is None:
+            return 1
+
+        frontend = None
+        if args.frontend:
+            frontend = FrontendFactory.create(args.frontend, args.device_dir or "")
+            if not frontend:
+                print(f"{args.frontend} is not a supported destination OS/application.")
+                return 1
+
+        with SshConnectionPool() as ssh_pool:
+            manifest = LibraryManifest(
+                args.manifest or LibraryManifest.default_path(), ssh_pool, rescan=args.rescan
+            )
+            size_index = SizeIndex(manifest, source_config, jobs=args.jobs or 8)
+            RomSizeDisplay.display(
+                systems, source_config, size_index, frontend, args.device_dir, ssh_pool
+            )
+            manifest.close()
+        return 0
+
+    # For compress, destination_dir is the directory and level the extensions to zip
+    # (default: cartridge formats).
+    if destination_type == "compress":
+        if not args.destination_dir:
+            print("compress needs a directory, e.g. compress ~/roms/nes nes,fds")
+            return 1
+        compressor = RomCompressor(jobs=args.jobs)
+        extensions = args.level.split(",") if args.level else None
+        succeeded = compressor.compress_directory(
+            Path(args.destination_dir).expanduser(), args.compress_dir, extensions
+        )
+        return 0 if succeeded else 1
+
+    # For verify, the frontend comes from --frontend.
+    if destination_type == "verify":
+        return _run_verify(args, source_config)
+
+    # For plan, the frontend comes from --frontend; apply reads it from the plan.
+    if destination_type == "plan":
+        return _run_plan(args, source_config)
+    if destination_type == "apply":
+        return _run_apply(args)
+
+    # For plan-capacity, destination_dir is the card capacity.
+    if destination_type == "plan-capacity":
+        return _run_plan_capacity(args, source_config)
+
+    # For fanout, destinations come from --target; treat destination_dir as the level.
+    if destination_type == "fanout":
+        systems = _selected_systems(args, args.destination_dir or args.level)
+        if systems is None:
+            return 1
+        frontends = _frontends_for_targets(args.target)
+        if not frontends:
+            parser.print_usage()
+            return 1
+        source_config = SourceConfig.from_yaml(args.config, remote_source=not args.local_source)
+        level = None if args.systems else args.destination_dir or args.level
+        return _run_copy(args, frontends, source_config, systems, level=level)
+
+    # For watch, devices come from --target; treat destination_dir as the level.
+    if destination_type == "watch":
+        systems = _selected_systems(args, args.destination_dir or args.level)
+        if systems is None:
+            return 1
+        frontends = _frontends_for_targets(args.target)
+        if not frontends:
+            parser.print_usage()
+            return 1
+        source_config = SourceConfig.from_yaml(args.config, remote_source=not args.local_source)
+        return _run_watch(args, frontends, source_config, systems)
+
+    if not args.destination_dir:
+        print("destination_dir is required.")
+        parser.print_usage()
+        return 1
+
+    systems = _selected_systems(args, args.level)
+    if systems is None:
+        return 1
 
     frontend = FrontendFactory.create(destination_type, args.destination_dir)
     if not frontend:
@@ -1058,13 +6227,375 @@ def main() -> int:
         print(f"Available: {', '.join(FrontendFactory.available_frontends())}")
         return 1
 
-    copier = FileCopier(frontend, source_config)
-    copier.copy_bios_files(systems)
-    copier.copy_rom_files(systems)
-    copier.copy_scraped_media_files(systems)
+    return _run_copy(
+        args, [frontend], source_config, systems, level=None if args.systems else args.level
+    )
+
+
+def _systems_for_level(level: str) -> list[System] | None:
+    """Return the systems for a level (all for an empty level), or None if it is invalid."""
+    if not level:
+        return []
+    if not LevelConfig.is_valid_level(level):
+        print(f"{level} is not a supported ROM pack name.")
+        return None
+    return LevelConfig.systems_for_level(level) or []
+
+
+def _selected_systems(args: argparse.Namespace, level: str) -> list[System] | None:
+    """Return the systems from --systems if given, else from the level."""
+    if not args.systems:
+        return _systems_for_level(level)
+    return _parse_systems(args.systems)
+
+
+def _parse_systems(text: str) -> list[System] | None:
+    """Parse a comma-separated list of systems, or return None if any is unknown."""
+    systems: list[System] = []
+    for value in text.split(","):
+        try:
+            systems.append(System(value.strip().lower()))
+        except ValueError:
+            print(f"{value} is not a known system.")
+            return None
+    return systems
+
+
+def _run_plan_capacity(args: argparse.Namespace, source_config: SourceConfig) -> int:
+    """Print the largest set of systems that fits on a card of the given capacity."""
+    if not args.frontend or not args.destination_dir:
+        print(
+            "plan-capacity needs a capacity and --frontend, "
+            "e.g. plan-capacity 128G --frontend onion"
+        )
+        return 1
+
+    frontend = FrontendFactory.create(args.frontend, "")
+    if not frontend:
+        print(f"{args.frontend} is not a supported destination OS/application.")
+        return 1
+
+    systems = _systems_for_level(args.level or "5")
+    if systems is None:
+        return 1
+
+    try:
+        capacity = parse_size(args.destination_dir)
+        if args.reserve.endswith("%"):
+            reserve = int(capacity * float(args.reserve[:-1]) / 100)
+        else:
+            reserve = parse_size(args.reserve)
+        weights = {}
+        for item in args.weight:
+            name, _, weight = item.partition("=")
+            weights[System(name.strip().lower())] = float(weight)
+    except ValueError as error:
+        print(error)
+        return 1
+    if reserve < 0 or reserve >= capacity:
+        print(
+            f"Nothing fits: {human_size(max(reserve, 0))} reserved of {human_size(capacity)}; "
+            "the reserve must be smaller than the capacity."
+        )
+        return 1
+
+    with SshConnectionPool() as ssh_pool:
+        manifest = LibraryManifest(
+            args.manifest or LibraryManifest.default_path(), ssh_pool, rescan=args.rescan
+        )
+        footprints = SizeIndex(manifest, source_config, jobs=args.jobs or 8).footprints(
+            systems, frontend
+        )
+        manifest.close()
+
+    budget = capacity - reserve
+    chosen = CapacityPlanner(footprints, weights).plan(budget)
+    chosen_systems = {f.system for f in chosen}
+
+    print(
+        f"Plan for {frontend.name} on {human_size(capacity)} "
+        f"(reserve {human_size(reserve)}, budget {human_size(budget)}):"
+    )
+    for footprint in footprints:
+        if not footprint.total:
+            continue
+        status = "include" if footprint.system in chosen_systems else "skip"
+        level = LevelConfig.first_level(footprint.system) or "-"
+        print(
+            f"  {status:<8} level {level}  "
+            f"{footprint.system.value:<32} {human_size(footprint.total):>8}"
+        )
+
+    used = sum(f.total for f in chosen)
+    print(f"Selected {len(chosen)} systems, {human_size(used)} of {human_size(budget)}.")
+    print(f"--systems {','.join(f.system.value for f in chosen)}")
+    return 0
+
+
+def _run_verify(args: argparse.Namespace, source_config: SourceConfig) -> int:
+    """Check the files on a device against the source library and return the exit code."""
+    if not args.frontend or not args.destination_dir:
+        print(
+            "verify needs a destination directory and --frontend, "
+            "e.g. verify /media/sd 3 --frontend onion"
+        )
+        return 1
+
+    frontend = FrontendFactory.create(args.frontend, args.destination_dir)
+    if not frontend:
+        print(f"{args.frontend} is not a supported destination OS/application.")
+        return 1
+
+    systems = _selected_systems(args, args.level)
+    if systems is None:
+        return 1
+
+    with SshConnectionPool() as ssh_pool:
+        verifier = DeviceVerifier(frontend, source_config, ssh_pool, jobs=args.jobs or 8)
+        return 0 if verifier.verify(systems) else 1
+
+
+def _run_plan(args: argparse.Namespace, source_config: SourceConfig) -> int:
+    """Resolve every route of a copy to a frontend and write them as a JSON plan."""
+    if not args.frontend or not args.destination_dir:
+        print(
+            "plan needs a destination directory and --frontend, "
+            "e.g. plan /media/sd 3 --frontend onion"
+        )
+        return 1
+
+    frontend = FrontendFactory.create(args.frontend, args.destination_dir)
+    if not frontend:
+        print(f"{args.frontend} is not a supported destination OS/application.")
+        return 1
+
+    systems = _selected_systems(args, args.level)
+    if systems is None:
+        return 1
+
+    routing = RoutingTable.build(frontend, source_config, systems)
+    with SshConnectionPool() as ssh_pool:
+        manifest = LibraryManifest(
+            args.manifest or LibraryManifest.default_path(), ssh_pool, rescan=args.rescan
+        )
+        routing.estimate_sizes(manifest, jobs=args.jobs or 8)
+        manifest.close()
+
+    if not args.plan_file:
+        print(json.dumps(routing.to_dict(), indent=2))
+        return 0
+    routing.write_json(args.plan_file)
+    routing.print_summary()
+    print(f"Wrote plan to {args.plan_file}.")
+    return 0
+
+
+def _run_apply(args: argparse.Namespace) -> int:
+    """Run the transfers of a saved plan and return the exit code."""
+    if not args.destination_dir:
+        print("apply needs a plan file, e.g. apply plan.json")
+        return 1
+
+    try:
+        routing = RoutingTable.from_json(args.destination_dir)
+    except (OSError, ValueError) as error:
+        print(f"Could not read plan {args.destination_dir}: {error}")
+        return 1
 
+    # Routes carry their own paths; the source configuration is still needed
+    # for media selection and conversions.
+    remote_destination = ":" in routing.frontend.destination_dir
+    source_config = SourceConfig.from_yaml(
+        args.config, remote_source=not remote_destination and not args.local_source
+    )
+    return _run_copy(args, [routing.frontend], source_config, routing.systems, routing)
+
+
+def _run_watch(
+    args: argparse.Namespace,
+    frontends: list[Frontend],
+    source_config: SourceConfig,
+    systems: list[System],
+) -> int:
+    """Push library changes to the devices until interrupted."""
+    with SshConnectionPool() as ssh_pool:
+        manifest = LibraryManifest(
+            args.manifest or LibraryManifest.default_path(), ssh_pool, rescan=args.rescan
+        )
+        watcher = LibraryWatcher(
+            frontends,
+            source_config,
+            manifest,
+            ssh_pool,
+            jobs=args.jobs or 1,
+            interval=args.interval,
+        )
+        try:
+            watcher.run(systems)
+        except KeyboardInterrupt:
+            print("Stopped watching.")
+        finally:
+            manifest.close()
     return 0
 
 
+def _frontends_for_targets(targets: list[str]) -> list[Frontend] | None:
+    """Create a frontend for each FRONTEND:DIR target, or return None if any is invalid."""
+    if not targets:
+        print("fanout and watch need at least one --target FRONTEND:DIR.")
+        return None
+
+    frontends: list[Frontend] = []
+    for target in targets:
+        name, _, destination_dir = target.partition(":")
+        frontend = FrontendFactory.create(name, destination_dir) if destination_dir else None
+        if not frontend:
+            print(f"{target} is not a valid FRONTEND:DIR target.")
+            print(f"Available: {', '.join(FrontendFactory.available_frontends())}")
+            return None
+        frontends.append(frontend)
+    return frontends
+
+
+def _run_copy(
+    args: argparse.Namespace,
+    frontends: list[Frontend],
+    source_config: SourceConfig,
+    systems: list[System],
+    routing: RoutingTable | None = None,
+    level: str | None = None,
+) -> int:
+    """Copy the systems to one frontend, or fan out to several, and return the exit code.
+
+    With a routing table the single-frontend copy runs its routes instead of
+    resolving them again. The level is recorded in each device's manifest.
+    """
+    cache = None
+    transforms: list[DirectoryTransform] = []
+    if args.compress or args.resize_media:
+        try:
+            cache = TransformCache(args.cache_dir, parse_size(args.cache_size))
+            profile = None
+            if args.media_size:
+                profile = MediaProfile.parse(args.media_size)
+        except ValueError as error:
+            print(error)
+            return 1
+
+        if args.compress:
+            compress_systems = _parse_systems(args.compress)
+            if compress_systems is None:
+                return 1
+            transforms.append(RomCompressor(cache=cache, systems=compress_systems))
+
+        if args.resize_media:
+            if not MediaResizer.available():
+                print(
+                    "--resize-media needs Pillow (uv run --with pillow); copying media unchanged."
+                )
+            transforms.append(MediaResizer(cache, profile=profile, quality=args.media_quality))
+
+    engine = None if args.use_rsync else LocalCopyEngine()
+    report = RunReport()
+    with SshConnectionPool() as ssh_pool:
+        media_selector = None
+        if args.select_media or args.prune_media:
+            media_selector = MediaSelector(source_config, ssh_pool)
+        journals = [
+            TransferJournal(frontend.destination_dir, ssh_pool, resume=args.resume)
+            for frontend in frontends
+        ]
+        seeder = None if args.no_bulk_seed else BulkSeeder(ssh_pool)
+        device_manifests = [
+            DeviceManifest(
+                FrontendFactory.name_of(frontend),
+                frontend.destination_dir,
+                level,
+                ssh_pool,
+                trusted=not args.rescan_device,
+            )
+            for frontend in frontends
+        ]
+        deduplicators = []
+        if args.dedup:
+            deduplicators = [
+                Deduplicator(FileHasher(ssh_pool, args.jobs or 4), ssh_pool) for _ in frontends
+            ]
+
+        manifest = None
+        if args.manifest:
+            manifest = LibraryManifest(
+                args.manifest, ssh_pool, hash_files=args.hash, rescan=args.rescan
+            )
+
+        bios_checksums = None
+        if args.verify_bios:
+            bios_checksums = BiosChecksums.from_yaml(Path(__file__).parent / "bios_checksums.yaml")
+        runner = CommandRunner(args.jobs or 1, args.host_jobs, args.device_jobs)
+
+        if len(frontends) > 1 or args.destination.lower() == "fanout":
+            fan_out = FanOutCopier(
+                frontends,
+                source_config,
+                mirror_dir=args.mirror_dir,
+                jobs=args.jobs or 1,
+                ssh_pool=ssh_pool,
+                batch=args.batch,
+                manifest=manifest,
+                bios_checksums=bios_checksums,
+                report=report,
+                transforms=transforms,
+                media_selector=media_selector,
+                prune_media=args.prune_media,
+                journals=journals,
+                runner=runner,
+                engine=engine,
+                seeder=seeder,
+                device_manifests=device_manifests,
+                deduplicators=deduplicators,
+            )
+            succeeded = fan_out.copy(systems)
+        else:
+            # Stages run one after another so BIOS files always land before ROMs.
+            copier = FileCopier(
+                frontends[0],
+                source_config,
+                jobs=args.jobs or 1,
+                ssh_pool=ssh_pool,
+                batch=args.batch,
+                manifest=manifest,
+                bios_checksums=bios_checksums,
+                report=report,
+                transforms=transforms,
+                media_selector=media_selector,
+                prune_media=args.prune_media,
+                journal=journals[0],
+                runner=runner,
+                routing=routing,
+                engine=engine,
+                seeder=seeder,
+                device_manifest=device_manifests[0],
+                deduplicator=deduplicators[0] if deduplicators else None,
+            )
+            succeeded = copier.copy_bios_files(systems)
+            succeeded = copier.copy_rom_files(systems) and succeeded
+            succeeded = copier.copy_scraped_media_files(systems) and succeeded
+
+        if succeeded:
+            for journal in journals:
+                journal.clear()
+        if manifest:
+            manifest.close()
+    if cache:
+        cache.close()
+
+    report.print_summary()
+    if args.report:
+        report.write_json(args.report)
+        print(f"Wrote transfer report to {args.report}.")
+
+    return 0 if succeeded else 1
+
+
 if __name__ == "__main__":
     sys.exit(main())
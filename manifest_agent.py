@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""List directory trees on the source host for copy_bios_rom_files.py.
+
+copy_bios_rom_files.py pipes this file to python3 on the host over ssh,
+behind a one-line loader that reads the script's length and then the
+script itself from stdin, leaving the rest of stdin to the agent:
+
+    ssh nas-01 python3 -c LOADER [--hash] [--locate] [--jobs N] [--known] -- ROOT...
+
+Every root is walked once with os.scandir and one length-prefixed record
+per directory and regular file is written to stdout: a 20-byte header
+(kind, path length, size, mtime in nanoseconds, digest length), then the
+path and, with --hash, the raw MD5 of the file. Files are hashed in
+their order on disk, by FIEMAP extent or inode number, with read-ahead
+hints, so a spinning-disk array is not made to seek between small
+files; records still come out in listing order. With --locate, each "F"
+record is followed by an "L" record whose size and mtime fields hold
+that sort key, so the caller can read the files in the same order.
+
+Each root that exists starts with an "R" record and the stream ends with
+an "E" record, so a listing cut short by a dropped connection is never
+taken for a complete one. With --known, the directory mtimes the caller
+has already indexed are read from stdin as "D" records ending with an
+"E" record; a directory whose mtime is unchanged gets a "U" record
+instead, and its files are neither stat-ed nor listed. Only the standard
+library is used, so any python3 on the NAS will do.
+"""
+
+import argparse
+import errno
+import fcntl
+import hashlib
+import os
+import stat
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+RECORD = struct.Struct(">cHqqB")
+CHUNK_SIZE = 1024 * 1024
+READ_AHEAD_LIMIT = 16 * 1024 * 1024
+# Known mtimes arrive as float seconds converted back to nanoseconds.
+KNOWN_SLACK_NS = 1000
+
+# Linux's FS_IOC_FIEMAP ioctl and its structures.
+FS_IOC_FIEMAP = 0xC020660B
+FIEMAP_HEADER = struct.Struct("=QQIIII")
+FIEMAP_EXTENT = struct.Struct("=QQQ2QI3I")
+_use_fiemap = True
+
+
+def location(path, inode):
+    """Return a sort key for where a file's data starts on disk."""
+    global _use_fiemap
+    if _use_fiemap:
+        request = bytearray(FIEMAP_HEADER.size + FIEMAP_EXTENT.size)
+        FIEMAP_HEADER.pack_into(request, 0, 0, 2**64 - 1, 0, 0, 1, 0)
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                fcntl.ioctl(fd, FS_IOC_FIEMAP, request)
+            finally:
+                os.close(fd)
+        except OSError as error:
+            if error.errno in (errno.ENOTTY, errno.EOPNOTSUPP, errno.EINVAL):
+                _use_fiemap = False
+        else:
+            if FIEMAP_HEADER.unpack_from(request)[3]:
+                return 0, FIEMAP_EXTENT.unpack_from(request, FIEMAP_HEADER.size)[1]
+    return 1, inode
+
+
+def advise(fd):
+    """Tell the kernel a file is read front to back, and prefetch it if small."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        if os.fstat(fd).st_size <= READ_AHEAD_LIMIT:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+
+
+def md5(path):
+    """Return the raw MD5 of a file, or an empty digest if it cannot be read."""
+    digest = hashlib.md5()
+    try:
+        with open(path, "rb") as f:
+            advise(f.fileno())
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except OSError:
+        return b""
+    return digest.digest()
+
+
+def write_record(out, kind, path, size=0, mtime_ns=0, digest=b""):
+    """Write one record to the output stream."""
+    encoded = os.fsencode(path)
+    out.write(RECORD.pack(kind, len(encoded), size, mtime_ns, len(digest)))
+    out.write(encoded)
+    out.write(digest)
+
+
+def read_known(stream):
+    """Read the directory mtimes in nanoseconds the caller has already indexed."""
+    known = {}
+    while True:
+        header = stream.read(RECORD.size)
+        if len(header) < RECORD.size:
+            break
+        kind, length, _, mtime_ns, digest_length = RECORD.unpack(header)
+        path = os.fsdecode(stream.read(length))
+        stream.read(digest_length)
+        if kind != b"D":
+            break
+        known[path] = mtime_ns
+    return known
+
+
+def walk(out, root, executor, known, locate=False):
+    """Write the records for every directory and regular file under a root.
+
+    Directories whose mtime matches `known` are still descended into, but
+    their files are skipped.
+    """
+    try:
+        if not stat.S_ISDIR(os.stat(root).st_mode):
+            return
+    except OSError:
+        return
+
+    write_record(out, b"R", root)
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        files = []
+        try:
+            # Take the mtime before listing, so a change during the scan shows up next time.
+            mtime_ns = os.stat(directory).st_mtime_ns
+            indexed = known.get(directory)
+            unchanged = indexed is not None and abs(mtime_ns - indexed) <= KNOWN_SLACK_NS
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif not unchanged and entry.is_file(follow_symlinks=False):
+                            info = entry.stat(follow_symlinks=False)
+                            files.append((entry.path, info.st_size, info.st_mtime_ns, info.st_ino))
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+        if unchanged:
+            write_record(out, b"U", directory, 0, mtime_ns)
+            continue
+        write_record(out, b"D", directory, 0, mtime_ns)
+        locations = {}
+        if executor or locate:
+            locations = {path: location(path, inode) for path, _, _, inode in files}
+        digests = {}
+        if executor:
+            ordered = sorted(locations, key=locations.get)
+            digests = dict(zip(ordered, executor.map(md5, ordered)))
+        for path, size, file_mtime_ns, _ in files:
+            write_record(out, b"F", path, size, file_mtime_ns, digests.get(path, b""))
+            if locate:
+                kind, offset = locations[path]
+                write_record(out, b"L", "", kind, offset % 2**63)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a listing of directory trees.")
+    parser.add_argument("--hash", action="store_true", help="Include the MD5 of every file")
+    parser.add_argument(
+        "--locate", action="store_true", help="Include where each file starts on disk"
+    )
+    parser.add_argument("--jobs", type=int, default=4, help="Files to hash at the same time")
+    parser.add_argument(
+        "--known", action="store_true", help="Read indexed directory mtimes from stdin"
+    )
+    parser.add_argument("roots", nargs="*", help="Directories to list")
+    args = parser.parse_args()
+
+    out = sys.stdout.buffer
+    known = read_known(sys.stdin.buffer) if args.known else {}
+    executor = ThreadPoolExecutor(max_workers=max(1, args.jobs)) if args.hash else None
+    try:
+        for root in args.roots:
+            walk(out, root, executor, known, args.locate)
+    finally:
+        if executor:
+            executor.shutdown()
+    write_record(out, b"E", "")
+    out.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+"""Make copy_bios_rom_files importable from the repository root."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,99 @@
+"""Tests for merging and verifying BIOS transfers with --verify-bios."""
+
+import hashlib
+from pathlib import Path
+
+import pytest
+
+from copy_bios_rom_files import (
+    BiosChecksums,
+    BiosPlan,
+    FileCopier,
+    Onion,
+    SourceConfig,
+    Stage,
+    System,
+    Transfer,
+)
+
+GOOD = b"good bios"
+BAD = b"bad bios!"
+
+SUBDIRS = {
+    System.NINTENDO_GAME_BOY: "GB",
+    System.NINTENDO_GAME_BOY_COLOR: "GBC",
+    System.NINTENDO_GAME_BOY_ADVANCE: "GBA",
+}
+
+
+def _plan(tmp_path: Path, library: dict[System, dict[str, bytes]]) -> BiosPlan:
+    """Plan the BIOS copy of a library; only bios.bin has a known-good checksum."""
+    bios_dir = tmp_path / "bios"
+    for system, files in library.items():
+        for name, data in files.items():
+            (bios_dir / SUBDIRS[system]).mkdir(parents=True, exist_ok=True)
+            (bios_dir / SUBDIRS[system] / name).write_bytes(data)
+
+    config = SourceConfig(str(bios_dir), "", "", "", "", False, SUBDIRS, {})
+    checksums = BiosChecksums({"bios.bin": [(hashlib.md5(GOOD).hexdigest(), len(GOOD))]})
+    copier = FileCopier(Onion(str(tmp_path / "sd")), config, bios_checksums=checksums)
+    transfers = [
+        Transfer(Stage.BIOS, system, f"{bios_dir}/{SUBDIRS[system]}/", f"{tmp_path}/sd/BIOS/")
+        for system in library
+    ]
+    (tmp_path / "staging").mkdir()
+    return copier.plan_bios(transfers, str(tmp_path / "staging"))
+
+
+def _files_from(plan: BiosPlan) -> list[str]:
+    return [
+        line for batch in plan.transfers for line in Path(batch.files_from).read_text().splitlines()
+    ]
+
+
+def test_identical_files_are_copied_once(tmp_path: Path) -> None:
+    plan = _plan(
+        tmp_path,
+        {
+            System.NINTENDO_GAME_BOY: {"bios.bin": GOOD},
+            System.NINTENDO_GAME_BOY_COLOR: {"bios.bin": GOOD},
+        },
+    )
+    assert _files_from(plan) == ["GB/./bios.bin"]
+    assert (plan.verified, plan.duplicates, plan.bad) == (1, 1, 0)
+
+
+def test_conflict_between_unverified_files_keeps_the_first(tmp_path: Path) -> None:
+    plan = _plan(
+        tmp_path,
+        {
+            System.NINTENDO_GAME_BOY: {"boot.rom": b"first"},
+            System.NINTENDO_GAME_BOY_COLOR: {"boot.rom": b"second"},
+        },
+    )
+    assert _files_from(plan) == ["GB/./boot.rom"]
+    assert (plan.unverified, plan.duplicates) == (1, 1)
+    assert any(issue.startswith("Conflict: boot.rom") for issue in plan.issues)
+
+
+def test_bad_dumps_are_not_copied(tmp_path: Path) -> None:
+    plan = _plan(
+        tmp_path,
+        {
+            System.NINTENDO_GAME_BOY: {"bios.bin": BAD, "boot.rom": b"boot"},
+            System.NINTENDO_GAME_BOY_COLOR: {"bios.bin": BAD},
+        },
+    )
+    assert _files_from(plan) == ["GB/./boot.rom"]
+    assert plan.bad == 2
+    assert plan.missing == [f"{tmp_path}/sd/BIOS/bios.bin"]
+
+
+@pytest.mark.parametrize("order", [[0, 1], [1, 0]])
+def test_bad_dump_is_replaced_by_a_good_copy(tmp_path: Path, order: list[int]) -> None:
+    systems = [System.NINTENDO_GAME_BOY, System.NINTENDO_GAME_BOY_ADVANCE]
+    contents = [{"bios.bin": GOOD}, {"bios.bin": BAD}]
+    plan = _plan(tmp_path, {systems[i]: contents[i] for i in order})
+    assert _files_from(plan) == ["GB/./bios.bin"]
+    assert (plan.verified, plan.bad) == (1, 1)
+    assert plan.missing == []
@@ -0,0 +1,110 @@
+"""Tests for size parsing and plan-capacity selection."""
+
+import argparse
+
+import pytest
+
+from copy_bios_rom_files import (
+    CapacityPlanner,
+    SourceConfig,
+    Stage,
+    System,
+    SystemFootprint,
+    _run_plan_capacity,
+    parse_size,
+)
+
+
+def _footprint(system: System, size: int) -> SystemFootprint:
+    footprint = SystemFootprint(system)
+    footprint.sizes[Stage.ROMS] = size
+    return footprint
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("512", 512),
+        ("128G", 128_000_000_000),
+        ("64 MB", 64_000_000),
+        ("1.5GiB", 1_610_612_736),
+        ("2TiB", 2 * 1024**4),
+    ],
+)
+def test_parse_size(text: str, expected: int) -> None:
+    assert parse_size(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "lots", "12X", "G"])
+def test_parse_size_rejects_invalid_sizes(text: str) -> None:
+    with pytest.raises(ValueError, match="is not a valid size"):
+        parse_size(text)
+
+
+def test_knapsack_picks_the_most_valuable_subset() -> None:
+    # Greedy by size would take the 6 and stop; the best fit is 5 + 5.
+    assert CapacityPlanner._knapsack([6, 5, 5], [1000, 1000, 1000], 10) == [1, 2]
+
+
+def test_knapsack_backtracks_to_the_items_it_chose() -> None:
+    # The most valuable single item (5) is not part of either best subset.
+    assert CapacityPlanner._knapsack([4, 3, 5, 2], [5, 4, 6, 3], 9) == [0, 1, 3]
+    assert CapacityPlanner._knapsack([4, 3, 5, 2], [5, 4, 6, 3], 6) == [0, 3]
+
+
+def test_knapsack_with_nothing_that_fits() -> None:
+    assert CapacityPlanner._knapsack([5, 7], [1, 1], 4) == []
+
+
+def test_plan_fills_lower_levels_first() -> None:
+    game_boy = _footprint(System.NINTENDO_GAME_BOY, 400)
+    playstation = _footprint(System.SONY_PLAYSTATION, 500)
+    gamecube = _footprint(System.NINTENDO_GAMECUBE, 200)
+
+    chosen = CapacityPlanner([playstation, gamecube, game_boy]).plan(1000)
+
+    assert [f.system for f in chosen] == [System.SONY_PLAYSTATION, System.NINTENDO_GAME_BOY]
+
+
+def test_plan_honours_weights() -> None:
+    game_boy = _footprint(System.NINTENDO_GAME_BOY, 600)
+    game_boy_advance = _footprint(System.NINTENDO_GAME_BOY_ADVANCE, 600)
+    weights = {System.NINTENDO_GAME_BOY_ADVANCE: 2.0}
+
+    chosen = CapacityPlanner([game_boy, game_boy_advance], weights).plan(1000)
+
+    assert [f.system for f in chosen] == [System.NINTENDO_GAME_BOY_ADVANCE]
+
+
+def test_plan_skips_excluded_and_empty_systems() -> None:
+    footprints = [
+        _footprint(System.NINTENDO_GAME_BOY, 100),
+        _footprint(System.NINTENDO_GAME_BOY_ADVANCE, 0),
+    ]
+    weights = {System.NINTENDO_GAME_BOY: 0.0}
+
+    assert CapacityPlanner(footprints, weights).plan(1000) == []
+
+
+@pytest.mark.parametrize("budget", [0, -1])
+def test_plan_with_no_budget(budget: int) -> None:
+    assert CapacityPlanner([_footprint(System.NINTENDO_GAME_BOY, 1)]).plan(budget) == []
+
+
+@pytest.mark.parametrize("reserve", ["128G", "200G", "100%"])
+def test_plan_capacity_rejects_a_reserve_at_or_above_capacity(
+    reserve: str, capsys: pytest.CaptureFixture[str]
+) -> None:
+    args = argparse.Namespace(
+        frontend="onion",
+        destination_dir="128G",
+        level=None,
+        reserve=reserve,
+        weight=[],
+        manifest=None,
+        rescan=False,
+        jobs=None,
+    )
+
+    assert _run_plan_capacity(args, SourceConfig("", "", "", "", "", False, {}, {})) == 1
+    assert "the reserve must be smaller than the capacity" in capsys.readouterr().out
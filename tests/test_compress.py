@@ -0,0 +1,71 @@
+"""Tests for ROM archive naming."""
+
+import os
+from pathlib import Path
+
+from copy_bios_rom_files import RomCompressor
+
+
+def _write(tmp_path: Path, *files: str) -> None:
+    for name in files:
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_bytes(b"rom")
+
+
+def _names(tmp_path: Path, *files: str) -> tuple[dict[str, str], list[str]]:
+    _write(tmp_path, *files)
+    entries = RomCompressor()._files(tmp_path, keep_others=True)
+    names, clashes = RomCompressor._archive_names(entries)
+    return (
+        {str(source.relative_to(tmp_path)): name for source, name in names.items()},
+        [str(source.relative_to(tmp_path)) for source in clashes],
+    )
+
+
+def test_archives_are_named_after_the_stem(tmp_path: Path) -> None:
+    names, clashes = _names(tmp_path, "Tetris.gb", "Zelda.nes", "Zelda.srm")
+    assert names == {"Tetris.gb": "Tetris.zip", "Zelda.nes": "Zelda.zip"}
+    assert clashes == []
+
+
+def test_clashing_stems_keep_their_extension(tmp_path: Path) -> None:
+    names, clashes = _names(tmp_path, "game.nes", "game.fds", "other.nes")
+    assert names == {
+        "game.fds": "game.fds.zip",
+        "game.nes": "game.nes.zip",
+        "other.nes": "other.zip",
+    }
+    assert clashes == []
+
+
+def test_stems_are_compared_without_case(tmp_path: Path) -> None:
+    names, _ = _names(tmp_path, "Game.nes", "GAME.fds")
+    assert names == {"GAME.fds": "GAME.fds.zip", "Game.nes": "Game.nes.zip"}
+
+
+def test_names_only_clash_within_a_directory(tmp_path: Path) -> None:
+    names, _ = _names(tmp_path, "a/game.nes", "b/game.fds")
+    assert names == {"a/game.nes": "game.zip", "b/game.fds": "game.zip"}
+
+
+def test_archive_clashing_with_an_existing_file_is_reported(tmp_path: Path) -> None:
+    # game.nes.zip is another file, not an archive of game.nes, so game.nes has no free name.
+    _write(tmp_path, "game.nes", "game.nes.zip")
+    os.utime(tmp_path / "game.nes.zip", ns=(0, 0))
+    _, clashes = _names(tmp_path, "game.fds")
+    assert clashes == ["game.nes"]
+
+
+def test_archives_from_an_earlier_run_are_not_clashes(tmp_path: Path) -> None:
+    _write(tmp_path, "game.nes", "game.zip")
+    mtime = (tmp_path / "game.nes").stat().st_mtime_ns
+    os.utime(tmp_path / "game.zip", ns=(mtime, mtime))
+    names, clashes = _names(tmp_path)
+    assert names == {"game.nes": "game.zip"}
+    assert clashes == []
+
+
+def test_passthrough_files_are_not_zipped(tmp_path: Path) -> None:
+    names, clashes = _names(tmp_path, "disc.chd", "game.zip", "readme.txt")
+    assert names == {}
+    assert clashes == []
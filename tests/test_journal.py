@@ -0,0 +1,35 @@
+"""Tests for finding where an interrupted rsync run stopped."""
+
+import pytest
+
+from copy_bios_rom_files import TransferJournal
+
+
+@pytest.mark.parametrize(
+    "output, expected",
+    [
+        ("sending incremental file list\nTetris.gb\nZelda.gb\n", "Zelda.gb"),
+        # Progress lines are separated by carriage returns.
+        (
+            "sending incremental file list\nsub/\nsub/Big Game.iso\n"
+            "     32,768   0%    0.00kB/s    0:00:00\r  1,048,576  12%  1.00MB/s    0:00:07\r",
+            "sub/Big Game.iso",
+        ),
+        (
+            "Tetris.gb\nrsync: [receiver] write failed on \"/mnt/sd/Zelda.gb\": "
+            "No space left on device (28)\nrsync error: error in file IO (code 11)\n",
+            "Tetris.gb",
+        ),
+        ("Tetris.gb\n\nsent 1,024 bytes  received 35 bytes\ntotal size is 2,048\n", "Tetris.gb"),
+    ],
+)
+def test_last_file(output: str, expected: str) -> None:
+    assert TransferJournal._last_file(output) == expected
+
+
+@pytest.mark.parametrize(
+    "output",
+    ["", "sending incremental file list\n./\nsub/\n", "rsync error: timeout (code 30)\n"],
+)
+def test_last_file_without_a_file(output: str) -> None:
+    assert TransferJournal._last_file(output) is None
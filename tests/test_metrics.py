@@ -0,0 +1,66 @@
+"""Tests for parsing rsync --stats output."""
+
+from copy_bios_rom_files import Stage, System, TransferMetrics
+
+RSYNC_STATS = """\
+sending incremental file list
+Tetris.gb
+
+Number of files: 1,204 (reg: 1,187, dir: 17)
+Number of created files: 3 (reg: 3)
+Number of deleted files: 0
+Number of regular files transferred: 3
+Total file size: 2,345,678,901 bytes
+Total transferred file size: 12,345,678 bytes
+Literal data: 12,345,678 bytes
+Matched data: 0 bytes
+File list size: 0
+File list generation time: 0.001 seconds
+File list transfer time: 0.000 seconds
+Total bytes sent: 12,350,000 bytes
+Total bytes received: 1,234 bytes
+
+sent 12,350,000 bytes  received 1,234 bytes  8,234,156.00 bytes/sec
+total size is 2,345,678,901  speedup is 189.91
+"""
+
+
+def _metrics(output: str, elapsed: float = 2.0) -> TransferMetrics:
+    return TransferMetrics.from_rsync_stats(
+        Stage.ROMS, "gb", [System.NINTENDO_GAME_BOY], 0, elapsed, output
+    )
+
+
+def test_parses_rsync_stats() -> None:
+    metrics = _metrics(RSYNC_STATS)
+    assert metrics.files_considered == 1187
+    assert metrics.files_transferred == 3
+    assert metrics.bytes_transferred == 12_345_678
+    assert metrics.bytes_sent == 12_350_000
+    assert metrics.bytes_received == 1234
+    assert metrics.megabytes_per_second == 12.345678 / 2
+
+
+def test_parses_stats_without_thousands_separators() -> None:
+    # rsync before 3.1 printed plain numbers and no regular file breakdown.
+    output = (
+        "Number of files: 42\n"
+        "Number of regular files transferred: 7\n"
+        "Total transferred file size: 7000 bytes\n"
+    )
+    metrics = _metrics(output)
+    assert metrics.files_considered == 42
+    assert metrics.files_transferred == 7
+    assert metrics.bytes_transferred == 7000
+
+
+def test_parses_stats_with_dots_as_separators() -> None:
+    metrics = _metrics("Total transferred file size: 1.234.567 bytes\n")
+    assert metrics.bytes_transferred == 1_234_567
+
+
+def test_missing_stats_default_to_zero() -> None:
+    metrics = _metrics("rsync error: some files could not be transferred (code 23)\n", elapsed=0)
+    assert metrics.to_dict()["files_transferred"] == 0
+    assert metrics.bytes_transferred == 0
+    assert metrics.megabytes_per_second == 0.0